@@ -15,6 +15,7 @@
 
 
 import os
+import re
 import logging
 
 import sh
@@ -27,6 +28,8 @@ logger = logging.getLogger('git_helper')
 logger.setLevel(logging.INFO)
 git = sh_bake(sh.git)
 
+GIT_MIRRORS_DIR = 'GIT_MIRRORS_DIR'
+
 
 def clone(url, basedir, branch=None):
 
@@ -36,14 +39,42 @@ def clone(url, basedir, branch=None):
 
     target = path(os.path.join(basedir, 'git', repo_name))
 
-    logger.info("Cloning {0} to {1}".format(url, target))
-    git.clone(url, str(target)).wait()
+    mirror = _mirror_path(url)
+    if mirror:
+        logger.info("Cloning {0} to {1} from git mirror {2}".format(
+            url, target, mirror))
+        git.clone('--shared', mirror, str(target)).wait()
+        with target:
+            git.remote('set-url', 'origin', url).wait()
+    else:
+        logger.info("Cloning {0} to {1}".format(url, target))
+        git.clone(url, str(target)).wait()
     with target:
         logger.info("Checking out to {0} branch".format(branch))
-        git.checkout(branch).wait()
+        try:
+            git.checkout(branch).wait()
+        except sh.ErrorReturnCode:
+            if not mirror:
+                raise
+            logger.info("Branch {0} not found in git mirror, fetching it"
+                        .format(branch))
+            git.fetch('origin').wait()
+            git.checkout(branch).wait()
     return target.abspath()
 
 
+def _mirror_path(url):
+    """Local mirror of a github repository, mounted in suite containers
+    by the suites runner."""
+    mirrors_dir = os.environ.get(GIT_MIRRORS_DIR)
+    match = re.match(r'^https://github\.com/([^/]+)/([^/]+?)(\.git)?/?$', url)
+    if not mirrors_dir or not match:
+        return None
+    mirror = os.path.join(mirrors_dir, match.group(1),
+                          '{0}.git'.format(match.group(2)))
+    return mirror if os.path.isdir(mirror) else None
+
+
 def checkout(repo_path, branch, force=False):
     logger.info('Checking out to {0} branch in repo {1}'
                 .format(branch, repo_path))
@@ -0,0 +1,93 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import os
+import time
+import traceback
+from unittest.case import SkipTest
+
+from nose.plugins import Plugin
+
+
+class ResultsStreamer(Plugin):
+    """Appends a JSON line to a results file when every test starts and
+    when it ends, so results are known while the run goes on and kept
+    if the run is killed.
+
+    Lines are written with a single write to a file opened for appending,
+    several nose processes may stream to the same file.
+    """
+
+    name = 'resultsstreamer'
+
+    def __init__(self):
+        super(ResultsStreamer, self).__init__()
+        self.results_stream_path = None
+        self.results_stream_group = None
+        self._started = {}
+
+    def options(self, parser, env):
+        super(ResultsStreamer, self).options(parser, env)
+        parser.add_option('--results-stream-path', default='results.jsonl')
+        parser.add_option('--results-stream-group',
+                          help='Test group added to every result')
+
+    def configure(self, options, conf):
+        super(ResultsStreamer, self).configure(options, conf)
+        self.results_stream_path = options.results_stream_path
+        self.results_stream_group = options.results_stream_group
+
+    def startTest(self, test):
+        self._started[test.id()] = time.time()
+        self._write(test, 'started')
+
+    def addSuccess(self, test):
+        self._write(test, 'passed')
+
+    def addFailure(self, test, err):
+        self._write(test, 'failed', err)
+
+    def addError(self, test, err):
+        if issubclass(err[0], SkipTest):
+            self._write(test, 'skipped', err)
+        else:
+            self._write(test, 'error', err)
+
+    def _write(self, test, outcome, err=None):
+        now = time.time()
+        result = {
+            'group': self.results_stream_group,
+            'test': test.id(),
+            'outcome': outcome,
+            'time': now
+        }
+        if outcome != 'started':
+            started = self._started.pop(test.id(), now)
+            result['duration'] = now - started
+        if err:
+            result['type'] = err[0].__name__
+            result['message'] = traceback.format_exception_only(
+                err[0], err[1])[-1].strip()
+            if outcome in ('failed', 'error'):
+                result['traceback'] = ''.join(
+                    traceback.format_exception(*err))
+        line = json.dumps(result) + '\n'
+        fd = os.open(self.results_stream_path,
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
@@ -37,10 +37,13 @@ from cosmo_tester.framework.util import (get_blueprint_path,
                                          process_variables,
                                          YamlPatcher,
                                          generate_unique_configurations,
-                                         create_rest_client)
+                                         create_rest_client,
+                                         timed_phase)
 
 from cloudify_rest_client.executions import Execution
 
+from suites.helpers.shards import TEST_ID_SUFFIX
+
 root = logging.getLogger()
 root.setLevel(logging.INFO)
 ch = logging.StreamHandler(sys.stdout)
@@ -209,30 +212,32 @@ class TestEnvironment(object):
             'testenv', self)
         cfy = CfyHelper(cfy_workdir=self._workdir)
 
-        self.handler.before_bootstrap()
-        cfy.bootstrap(
-            self._manager_blueprint_path,
-            inputs_file=self.cloudify_config_path,
-            install_plugins=self.install_plugins,
-            keep_up_on_failure=False,
-            task_retries=task_retries,
-            verbose=True)
-        self._running_env_setup(cfy.get_management_ip())
-        self.handler.after_bootstrap(cfy.get_provider_context())
+        with timed_phase('bootstrap'):
+            self.handler.before_bootstrap()
+            cfy.bootstrap(
+                self._manager_blueprint_path,
+                inputs_file=self.cloudify_config_path,
+                install_plugins=self.install_plugins,
+                keep_up_on_failure=False,
+                task_retries=task_retries,
+                verbose=True)
+            self._running_env_setup(cfy.get_management_ip())
+            self.handler.after_bootstrap(cfy.get_provider_context())
 
     def teardown(self):
         if self._global_cleanup_context is None:
             return
         self.setup()
         cfy = CfyHelper(cfy_workdir=self._workdir)
-        try:
-            cfy.use(self.management_ip)
-            cfy.teardown(verbose=True)
-        finally:
-            self._global_cleanup_context.cleanup()
-            self.handler.after_teardown()
-            if os.path.exists(self._workdir):
-                shutil.rmtree(self._workdir)
+        with timed_phase('teardown'):
+            try:
+                cfy.use(self.management_ip)
+                cfy.teardown(verbose=True)
+            finally:
+                self._global_cleanup_context.cleanup()
+                self.handler.after_teardown()
+                if os.path.exists(self._workdir):
+                    shutil.rmtree(self._workdir)
 
     def _running_env_setup(self, management_ip):
         self.management_ip = management_ip
@@ -346,6 +351,10 @@ class TestCase(unittest.TestCase):
         self.test_id = 'system-test-{0}-{1}'.format(
             self._testMethodName,
             time.strftime("%Y%m%d-%H%M"))
+        # set by the suites runner when tests of a suite run in parallel
+        test_id_suffix = os.environ.get(TEST_ID_SUFFIX)
+        if test_id_suffix:
+            self.test_id = '{0}-{1}'.format(self.test_id, test_id_suffix)
         self.blueprint_yaml = None
         self._test_cleanup_context = self.env.handler.CleanupContext(
             self._testMethodName, self.env)
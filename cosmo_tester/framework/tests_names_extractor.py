@@ -13,9 +13,22 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+import heapq
 import json
+import os
+import sys
+import unittest
 
-from nose.plugins import collect
+from nose.failure import Failure
+from nose.plugins import Plugin
+
+# duration of tests that have no recorded duration when no test has one
+DEFAULT_TEST_DURATION = 60
+# module fixtures run by nose, tests of modules that have one are kept in a
+# single process
+MODULE_FIXTURES = ['setup', 'setup_module', 'setUp', 'setUpModule',
+                   'teardown', 'teardown_module', 'tearDown',
+                   'tearDownModule']
 
 
 def _extract_test_info(test):
@@ -26,30 +39,156 @@ def _extract_test_info(test):
 
 
 def _write_tests_json(tests_summary, test_list_path):
-    with open(test_list_path, 'w') as outfile:
+    tmp_path = '{0}.tmp'.format(test_list_path)
+    with open(tmp_path, 'w') as outfile:
         json.dump(tests_summary, outfile, indent=4)
+    os.rename(tmp_path, test_list_path)
+
+
+def test_name(test_info):
+    """Full name of a test, as used in xunit reports."""
+    return '{0}.{1}.{2}'.format(test_info['test_module'],
+                                test_info['test_class'],
+                                test_info['test_name'])
+
+
+def test_unit(test_info):
+    """Tests that must run in the same process as a test: its class, or its
+    module when the module has fixtures."""
+    module = sys.modules.get(test_info['test_module'])
+    if any(hasattr(module, fixture) for fixture in MODULE_FIXTURES):
+        return test_info['test_module']
+    return '{0}.{1}'.format(test_info['test_module'],
+                            test_info['test_class'])
+
+
+def partition(tests, count, durations=None):
+    """Split test names into count lists of close total durations.
+
+    Longest tests are assigned first, each to the shard with the shortest
+    total duration so far. Tests with no recorded duration are assumed to
+    take the mean recorded duration.
+    """
+    durations = durations or {}
+    recorded = [durations[t] for t in tests if t in durations]
+    default = (float(sum(recorded)) / len(recorded) if recorded
+               else DEFAULT_TEST_DURATION)
+    shards = [[] for _ in range(count)]
+    loads = [(0, index) for index in range(count)]
+    for test in sorted(set(tests),
+                       key=lambda t: (-durations.get(t, default), t)):
+        load, index = heapq.heappop(loads)
+        shards[index].append(test)
+        heapq.heappush(loads, (load + durations.get(test, default), index))
+    return shards
 
 
-class TestsNamesExtractor(collect.CollectOnly):
+def _collect(suite, keep=None):
+    """Load all tests of a suite and return them in running order.
+
+    nose suites load their tests lazily, from generators that can only be
+    iterated once, so the loaded tests are put back into every suite. When
+    keep is given, tests it returns False for are left out of the suites.
+    """
+    if not isinstance(suite, unittest.TestSuite):
+        return [suite]
+    children = []
+    tests = []
+    for child in suite:
+        child_tests = _collect(child, keep)
+        if keep and not isinstance(child, unittest.TestSuite) and \
+                not keep(child):
+            continue
+        children.append(child)
+        tests += child_tests
+    suite._tests = children
+    return tests
+
+
+def _select(suite, tests_info, index, count, durations, unit):
+    """Keep the tests of the index-th of count parts of the tests in the
+    suite, splitting units of tests by their durations."""
+    unit_durations = {}
+    for test_info in tests_info:
+        duration = durations.get(test_name(test_info))
+        if duration is not None:
+            key = unit(test_info)
+            unit_durations[key] = unit_durations.get(key, 0) + duration
+    selected = set(partition([unit(t) for t in tests_info],
+                             count,
+                             unit_durations)[index])
+    _collect(suite, keep=lambda t: isinstance(t.test, Failure) or
+             unit(_extract_test_info(t)) in selected)
+    return [t for t in tests_info if unit(t) in selected]
+
+
+class TestsNamesExtractor(Plugin):
+    """Writes the tests of a run to a JSON file once they are collected,
+    before any of them runs.
+
+    Tests that did not run, because the run crashed or was killed, are
+    told apart from the tests in the xunit report of the run using this
+    file. Given a shard index and count, only the tests of the shard are
+    kept, tests are split between shards by their durations. Given a
+    process index and count as well, the tests of the shard are split
+    between processes that run them against the same manager, keeping
+    tests of a class together.
+    """
 
     name = 'testnameextractor'
     enableOpt = 'test_name_extractor'
 
     def __init__(self):
         super(TestsNamesExtractor, self).__init__()
-        self.accumulated_tests = []
         self.tests_list_path = None
+        self.shard_index = None
+        self.shard_count = None
+        self.test_durations_path = None
+        self.process_index = None
+        self.process_count = None
 
     def options(self, parser, env):
-        super(collect.CollectOnly, self).options(parser, env)
+        super(TestsNamesExtractor, self).options(parser, env)
         parser.add_option('--tests-list-path', default='nose.cfy')
+        parser.add_option('--shard-index', type='int',
+                          help='Index of the shard to run, from 0')
+        parser.add_option('--shard-count', type='int')
+        parser.add_option('--test-durations-path',
+                          help='JSON file of test durations by test name, '
+                               'used to balance shards')
+        parser.add_option('--process-index', type='int',
+                          help='Index of the process running the tests, '
+                               'from 0')
+        parser.add_option('--process-count', type='int')
 
     def configure(self, options, conf):
         super(TestsNamesExtractor, self).configure(options, conf)
         self.tests_list_path = options.tests_list_path
+        self.shard_index = options.shard_index
+        self.shard_count = options.shard_count
+        self.test_durations_path = options.test_durations_path
+        self.process_index = options.process_index
+        self.process_count = options.process_count
 
-    def addSuccess(self, test):
-        self.accumulated_tests.append(_extract_test_info(test))
-
-    def finalize(self, result):
-        _write_tests_json(self.accumulated_tests, self.tests_list_path)
+    def prepareTest(self, test):
+        tests = _collect(test)
+        # load failures are not tests, they are always run and reported
+        tests_info = [_extract_test_info(t) for t in tests
+                      if not isinstance(t.test, Failure)]
+        durations = {}
+        if self.test_durations_path:
+            with open(self.test_durations_path) as f:
+                durations = json.load(f)
+        if self.shard_count:
+            tests_info = _select(test, tests_info,
+                                 self.shard_index,
+                                 self.shard_count,
+                                 durations,
+                                 unit=test_name)
+        if self.process_count:
+            tests_info = _select(test, tests_info,
+                                 self.process_index,
+                                 self.process_count,
+                                 durations,
+                                 unit=test_unit)
+        _write_tests_json(tests_info, self.tests_list_path)
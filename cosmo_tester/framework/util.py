@@ -23,6 +23,7 @@ import shutil
 import string
 import random
 import tempfile
+from contextlib import contextmanager
 
 import jinja2
 import yaml
@@ -37,6 +38,8 @@ from cosmo_tester import resources
 
 CLOUDIFY_AUTHORIZATION_HEADER = 'Authorization'
 CLOUDIFY_AUTH_TOKEN_HEADER = 'Authentication-Token'
+# set by the suites runner, see suites/helpers/timeline.py
+SUITE_TIMELINE_PATH = 'SUITE_TIMELINE_PATH'
 
 
 def process_variables(suites_yaml, unprocessed_dict):
@@ -288,3 +291,19 @@ class YamlPatcher(object):
 def generate_password(length=13):
     chars = string.ascii_letters + string.digits + '!@#$%^&*()'
     return ''.join(random.choice(chars) for _ in range(length))
+
+
+@contextmanager
+def timed_phase(name, **args):
+    """Record a phase of a test suite run by the suites runner in the suite
+    timeline. Does nothing outside of the suites runner."""
+    timeline_path = os.environ.get(SUITE_TIMELINE_PATH)
+    start = time.time()
+    try:
+        yield
+    finally:
+        if timeline_path:
+            phase = {'name': name, 'start': start, 'end': time.time(),
+                     'args': args}
+            with open(timeline_path, 'a') as f:
+                f.write(json.dumps(phase) + '\n')
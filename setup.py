@@ -46,6 +46,8 @@ setup(
         'nose.plugins.0.10': [
             'testnameextractor = cosmo_tester.framework'
             '.tests_names_extractor:TestsNamesExtractor',
+            'resultsstreamer = cosmo_tester.framework'
+            '.results_streamer:ResultsStreamer',
             ]
     },
 
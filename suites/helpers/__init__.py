@@ -24,7 +24,7 @@ def _write(stream, s):
     stream.write(s)
 
 
-def sh_bake(command):
+def sh_bake(command, output_prefix=''):
     return command.bake(
-        _out=lambda line: _write(sys.stdout, line),
-        _err=lambda line: _write(sys.stderr, line))
+        _out=lambda line: _write(sys.stdout, output_prefix + line),
+        _err=lambda line: _write(sys.stderr, output_prefix + line))
@@ -0,0 +1,418 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Selection of the system tests affected by a change.
+
+The impact index maps every test module under cosmo_tester/test_suites to
+the modules it imports, directly or through other modules of the
+repository, and to the resources (blueprints, plugins, scripts) it or these
+modules reference with copy_blueprint, get_blueprint_path, get_plugin_path
+and get_resource_path. Paths in the index are relative to the repository.
+
+Changes to suites.yaml are compared entry by entry, so that only the suites
+and test groups whose definitions changed are run for them.
+"""
+
+import ast
+import os
+import re
+
+SYSTEM_TESTS_GROUP = 'cloudify-system-tests'
+PACKAGE_DIR = 'cosmo_tester'
+TEST_SUITES_DIR = 'cosmo_tester/test_suites'
+FRAMEWORK_DIR = 'cosmo_tester/framework'
+RESOURCES_DIR = 'cosmo_tester/resources'
+# resources dir referenced by the first argument of these functions
+RESOURCE_FUNCTIONS = {
+    'copy_blueprint': 'cosmo_tester/resources/blueprints',
+    'get_blueprint_path': 'cosmo_tester/resources/blueprints',
+    'get_plugin_path': 'cosmo_tester/resources/plugins',
+    'get_resource_path': 'cosmo_tester/resources'
+}
+# default nose testMatch, modules of tests
+TEST_MODULE_PATTERN = re.compile(r'(?:^|[\b_\.-])[Tt]est')
+SUITES_YAML = 'suites/suites/suites.yaml'
+# handler configuration inputs files
+CONFIGURATIONS_DIR = 'suites/configurations'
+# suites.yaml entries compared by name, the others run all suites if changed
+SUITES_YAML_ENTRIES = ['variables', 'handler_properties',
+                       'handler_configurations', 'tests', 'test_suites']
+# anchors merged into the entries using them when suites.yaml is loaded
+SUITES_YAML_TEMPLATES = 'templates'
+VARIABLE_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+# changes to the code running the suites may affect any test
+GLOBAL_PATHS = [
+    'suites/suites_runner.py',
+    'suites/suites_runner.sh',
+    'suites/suite_runner.py',
+    'suites/suite_runner.sh',
+    'suites/helpers/',
+    'suites/Dockerfile',
+    'suites/Vagrantfile.template',
+    'suites/requirements.txt',
+    'suites/wheel-requirements.txt',
+    'suites/xunit-template.xml',
+    'setup.py',
+    'test-requirements.txt'
+]
+
+
+class ImpactIndex(object):
+    """Dependencies of the python modules of the system tests repository.
+
+    :param repo_dir: root of the repository.
+    """
+
+    def __init__(self, repo_dir):
+        self.repo_dir = repo_dir
+        # module -> modules it imports, module -> resources it references
+        self.imports = {}
+        self.resources = {}
+        self._dependencies = {}
+
+    def build(self):
+        package_dir = os.path.join(self.repo_dir, PACKAGE_DIR)
+        for root, dirs, files in os.walk(package_dir):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.endswith('.py'):
+                    module = os.path.relpath(os.path.join(root, file_name),
+                                             self.repo_dir)
+                    self._index_module(module)
+        return self
+
+    @property
+    def test_modules(self):
+        return sorted(m for m in self.imports
+                      if _is_under(m, TEST_SUITES_DIR) and
+                      TEST_MODULE_PATTERN.search(os.path.basename(m)))
+
+    def dependencies(self, module):
+        """Modules imported by a module, directly or not, and resources
+        referenced by all of them."""
+        if module not in self._dependencies:
+            modules = set()
+            pending = [module]
+            while pending:
+                current = pending.pop()
+                if current in modules:
+                    continue
+                modules.add(current)
+                pending.extend(self.imports.get(current, ()))
+            resources = set()
+            for current in modules:
+                resources.update(self.resources.get(current, ()))
+            self._dependencies[module] = (modules, resources)
+        return self._dependencies[module]
+
+    def affected_tests(self, changed_files):
+        """Test modules affected by changed files.
+
+        :return: the affected test modules and the reason all tests are
+                 affected, if they are.
+        """
+        for changed_file in changed_files:
+            reason = self._global_change(changed_file)
+            if reason:
+                return set(self.test_modules), reason
+        affected = set()
+        for test_module in self.test_modules:
+            modules, resources = self.dependencies(test_module)
+            for changed_file in changed_files:
+                if changed_file in modules or any(
+                        _is_under(changed_file, r) for r in resources):
+                    affected.add(test_module)
+                    break
+        return affected, None
+
+    def framework_changed(self, changed_files):
+        """Whether tests of other repositories, which use the test
+        framework, may be affected by changed files."""
+        return any(_is_under(f, FRAMEWORK_DIR) or
+                   f == os.path.join(PACKAGE_DIR, '__init__.py')
+                   for f in changed_files)
+
+    def _global_change(self, changed_file):
+        for global_path in GLOBAL_PATHS:
+            if changed_file == global_path or changed_file.startswith(
+                    global_path):
+                return 'changed: {0}'.format(changed_file)
+        if (_is_under(changed_file, PACKAGE_DIR) and
+                not changed_file.endswith('.py') and
+                not _is_under(changed_file, RESOURCES_DIR)):
+            return 'changed: {0}'.format(changed_file)
+        return None
+
+    def _index_module(self, module):
+        with open(os.path.join(self.repo_dir, module)) as f:
+            tree = ast.parse(f.read(), module)
+        # packages of a module are imported with it
+        imports = self._resolve(module, os.path.dirname(module).replace(
+            '/', '.'))
+        resources = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    imports.update(self._resolve(module, alias.name))
+            elif isinstance(node, ast.ImportFrom):
+                base = node.module or ''
+                if node.level:
+                    package = os.path.dirname(module).split('/')
+                    package = package[:len(package) - node.level + 1]
+                    base = '.'.join(package + ([base] if base else []))
+                for alias in node.names:
+                    resolved = self._resolve(
+                        module, '{0}.{1}'.format(base, alias.name)
+                        if base else alias.name)
+                    imports.update(resolved or self._resolve(module, base))
+            elif isinstance(node, ast.Call):
+                resource = _resource_reference(node)
+                # the framework passes on resource names given by tests
+                if resource in RESOURCE_FUNCTIONS.values() and not \
+                        _is_under(module, TEST_SUITES_DIR):
+                    continue
+                if resource:
+                    resources.add(resource)
+        self.imports[module] = imports
+        self.resources[module] = resources
+
+    def _resolve(self, module, name):
+        """Repository files of an imported module and of its packages."""
+        if not name:
+            return set()
+        parts = name.split('.')
+        # implicit relative imports of modules of the same package
+        candidates = [os.path.dirname(module).split('/') + parts, parts]
+        for candidate in candidates:
+            files = set()
+            for i in range(1, len(candidate)):
+                package_init = '/'.join(candidate[:i] + ['__init__.py'])
+                if self._exists(package_init):
+                    files.add(package_init)
+            module_file = '/'.join(candidate) + '.py'
+            package_init = '/'.join(candidate + ['__init__.py'])
+            if self._exists(module_file):
+                return files | set([module_file])
+            if self._exists(package_init):
+                return files | set([package_init])
+        return set()
+
+    def _exists(self, relative_path):
+        return os.path.isfile(os.path.join(self.repo_dir, relative_path))
+
+
+def _resource_reference(call):
+    func = call.func
+    name = (func.attr if isinstance(func, ast.Attribute) else
+            func.id if isinstance(func, ast.Name) else None)
+    if name not in RESOURCE_FUNCTIONS or not call.args:
+        return None
+    resources_dir = RESOURCE_FUNCTIONS[name]
+    argument = call.args[0]
+    if isinstance(argument, ast.Str):
+        return '{0}/{1}'.format(resources_dir, argument.s.strip('/'))
+    # '...{0}'.format(...) references resources under the constant prefix
+    if (isinstance(argument, ast.Call) and
+            isinstance(argument.func, ast.Attribute) and
+            argument.func.attr == 'format' and
+            isinstance(argument.func.value, ast.Str)):
+        prefix = argument.func.value.s.split('{')[0]
+        prefix = prefix[:prefix.rfind('/') + 1].strip('/')
+        return '{0}/{1}'.format(resources_dir, prefix).rstrip('/')
+    return resources_dir
+
+
+def _is_under(file_path, directory):
+    return file_path == directory or file_path.startswith(directory + '/')
+
+
+def test_spec_modules(spec, test_modules):
+    """Test modules run by a nose test spec of the system tests group, e.g.
+    'cosmo_tester/test_suites/test_blueprints -e puppet'."""
+    target = spec.split()[0].split(':')[0].rstrip('/')
+    if target.endswith('.py'):
+        return set([target]) & set(test_modules)
+    return set(m for m in test_modules if _is_under(m, target))
+
+
+def suites_yaml_changes(old_suites_yaml, new_suites_yaml):
+    """Entries of suites.yaml added or changed between two versions of it.
+
+    Entries referencing changed variables are changed, and so are handler
+    configurations of changed handler properties.
+
+    :return: the names of the changed handler_configurations, tests and
+             test_suites, and the reason all suites are affected
+             (full_run_reason), if they are.
+    """
+    old_suites_yaml = old_suites_yaml or {}
+    new_suites_yaml = new_suites_yaml or {}
+    changes = {'full_run_reason': None}
+    for key in SUITES_YAML_ENTRIES:
+        old_entries = old_suites_yaml.get(key) or {}
+        changes[key] = set(
+            name for name, entry in (new_suites_yaml.get(key) or {}).items()
+            if old_entries.get(name) != entry)
+    variables = changes.pop('variables')
+    for key in SUITES_YAML_ENTRIES[1:]:
+        for name, entry in (new_suites_yaml.get(key) or {}).items():
+            if _references(entry, variables):
+                changes[key].add(name)
+    properties = changes.pop('handler_properties')
+    for name, configuration in (new_suites_yaml.get(
+            'handler_configurations') or {}).items():
+        if configuration.get('properties') in properties:
+            changes['handler_configurations'].add(name)
+    for key in sorted(set(old_suites_yaml) | set(new_suites_yaml)):
+        if key in SUITES_YAML_ENTRIES or key == SUITES_YAML_TEMPLATES:
+            continue
+        if old_suites_yaml.get(key) != new_suites_yaml.get(key) or \
+                _references(new_suites_yaml.get(key), variables):
+            changes['full_run_reason'] = 'changed: {0} {1}'.format(
+                SUITES_YAML, key)
+            break
+    return changes
+
+
+def _references(value, variables):
+    if isinstance(value, dict):
+        return any(_references(v, variables) for v in value.values())
+    if isinstance(value, list):
+        return any(_references(v, variables) for v in value)
+    if isinstance(value, basestring):
+        return any(v in variables for v in VARIABLE_PATTERN.findall(value))
+    return False
+
+
+def _changed_configurations(suites_yaml, changed_files, yaml_changes):
+    """Handler configurations changed in suites.yaml or by their inputs
+    files."""
+    configurations = set(yaml_changes['handler_configurations'])
+    for name, configuration in suites_yaml['handler_configurations'].items():
+        inputs = configuration.get('inputs')
+        if inputs and os.path.join(CONFIGURATIONS_DIR,
+                                   inputs) in changed_files:
+            configurations.add(name)
+    return configurations
+
+
+def _suite_changed(suites_yaml, suite_name, suite_def, configurations,
+                   yaml_changes):
+    """Whether a suite changed or may run on a changed handler
+    configuration."""
+    if suite_name in yaml_changes['test_suites']:
+        return True
+    if suite_def.get('handler_configuration'):
+        return suite_def['handler_configuration'] in configurations
+    requires = set(suite_def.get('requires') or [])
+    return any(requires <= set(suites_yaml['handler_configurations'][
+        name].get('tags') or []) for name in configurations
+        if name in suites_yaml['handler_configurations'])
+
+
+def narrow_test_suites(suites_yaml, index, changed_files, yaml_changes=None):
+    """Suite definitions narrowed to the tests affected by changed files.
+
+    Test specs of the system tests group are narrowed to the affected test
+    modules, keeping their nose arguments. Test groups of other
+    repositories are kept if the test framework changed. Suites and test
+    groups changed in suites.yaml, as given by suites_yaml_changes, and
+    suites running on changed handler configurations are kept whole.
+    Suites with no affected tests are removed.
+    """
+    yaml_changes = yaml_changes or suites_yaml_changes(None, None)
+    affected, reason = index.affected_tests(changed_files)
+    if reason or yaml_changes['full_run_reason']:
+        return dict(suites_yaml['test_suites'])
+    framework_changed = index.framework_changed(changed_files)
+    configurations = _changed_configurations(suites_yaml, changed_files,
+                                             yaml_changes)
+    test_modules = index.test_modules
+    test_suites = {}
+    for suite_name, suite_def in suites_yaml['test_suites'].items():
+        if _suite_changed(suites_yaml, suite_name, suite_def,
+                          configurations, yaml_changes):
+            test_suites[suite_name] = suite_def
+            continue
+        tests = []
+        for test in suite_def['tests']:
+            if isinstance(test, basestring) and \
+                    test in yaml_changes['tests']:
+                tests.append(test)
+                continue
+            if isinstance(test, basestring):
+                test = suites_yaml.get('tests', {}).get(test, test)
+            if isinstance(test, basestring):
+                test = {'tests': [test]}
+            if 'external' in test:
+                if framework_changed:
+                    tests.append(test)
+                continue
+            specs = []
+            for spec in test['tests']:
+                modules = sorted(test_spec_modules(spec, test_modules) &
+                                 affected)
+                if not modules:
+                    continue
+                if spec.split()[0].split(':')[0].endswith('.py'):
+                    specs.append(spec)
+                else:
+                    specs.append(' '.join(modules + spec.split()[1:]))
+            if specs:
+                tests.append(dict(test, tests=specs))
+        if tests:
+            narrowed = dict(suite_def, tests=tests)
+            narrowed.pop('shards', None)
+            test_suites[suite_name] = narrowed
+    return test_suites
+
+
+def impact_report(suites_yaml, index, changed_files, yaml_changes=None):
+    """Affected test modules and suites, the suites.yaml tests and suites
+    each affected test module belongs to, and the changed entries of
+    suites.yaml."""
+    yaml_changes = yaml_changes or suites_yaml_changes(None, None)
+    affected, reason = index.affected_tests(changed_files)
+    test_modules = index.test_modules
+    entries = dict((m, {'tests': [], 'test_suites': []}) for m in affected)
+    for name, test in sorted(suites_yaml.get('tests', {}).items()):
+        if 'external' in test:
+            continue
+        for spec in test['tests']:
+            for module in test_spec_modules(spec, test_modules) & affected:
+                entries[module]['tests'].append(name)
+    narrowed = narrow_test_suites(suites_yaml, index, changed_files,
+                                  yaml_changes)
+    for suite_name, suite_def in sorted(narrowed.items()):
+        for test in suite_def['tests']:
+            if isinstance(test, basestring):
+                test = suites_yaml.get('tests', {}).get(test, test)
+            if isinstance(test, basestring):
+                test = {'tests': [test]}
+            for spec in test['tests']:
+                for module in (test_spec_modules(spec, test_modules) &
+                               affected):
+                    if suite_name not in entries[module]['test_suites']:
+                        entries[module]['test_suites'].append(suite_name)
+    return {
+        'changed_files': sorted(changed_files),
+        'full_run_reason': reason or yaml_changes['full_run_reason'],
+        'framework_changed': index.framework_changed(changed_files),
+        'affected_tests': entries,
+        'changed_suites_yaml_entries': dict(
+            (key, sorted(yaml_changes[key])) for key in
+            ['handler_configurations', 'tests', 'test_suites']),
+        'test_suites': sorted(narrowed)
+    }
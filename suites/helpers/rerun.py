@@ -0,0 +1,141 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Rerun of the tests that did not pass in a previous suites run.
+
+Tests are found in the xunit reports of the previous run, which are named
+<suite>-<test group>-report.xml. Failed, errored and missing tests of a
+suite are rerun by a suite with the same name, handler configuration or
+requirements, and only these tests. Suites that failed before their tests
+ran are rerun entirely.
+"""
+
+import copy
+import os
+import shutil
+
+from path import path
+
+import xunit_reports
+
+# test group of the tests of the system tests repository
+SYSTEM_TESTS_GROUP = 'cloudify-system-tests'
+# test group of reports written for suites that failed before tests ran
+CONTAINER_GROUP = 'docker-container'
+REPORT_SUFFIX = '-report.xml'
+
+
+def parse_report_name(report_name, suite_names):
+    """Suite name and test group of a report, None if the report is not
+    of one of the suites."""
+    if not report_name.endswith(REPORT_SUFFIX):
+        return None
+    # suite names may be prefixes of other suite names
+    for suite_name in sorted(suite_names, key=len, reverse=True):
+        if report_name.startswith('{0}-'.format(suite_name)):
+            return (suite_name,
+                    report_name[len(suite_name) + 1:-len(REPORT_SUFFIX)])
+    return None
+
+
+def failed_tests(reports_dir, suite_names):
+    """Tests to rerun by suite and test group.
+
+    Tests are given as nose test names, a suite maps to None when it should
+    be rerun entirely.
+    """
+    failed = {}
+    for report in path(reports_dir).files('*{0}'.format(REPORT_SUFFIX)):
+        parsed = parse_report_name(report.name, suite_names)
+        if not parsed:
+            continue
+        suite_name, group = parsed
+        if group == CONTAINER_GROUP:
+            failed[suite_name] = None
+            continue
+        for testcase in xunit_reports.testcases(report):
+            outcome = xunit_reports.test_outcome(testcase)
+            if outcome == 'skip' and testcase.find('skipped').get(
+                    'message') != xunit_reports.MISSING_TEST_MESSAGE:
+                continue
+            if outcome and failed.get(suite_name, {}) is not None:
+                classname, name = xunit_reports.test_key(testcase)
+                module, class_name = classname.rsplit('.', 1)
+                test = '{0}:{1}.{2}'.format(module, class_name, name)
+                failed.setdefault(suite_name, {}).setdefault(
+                    group, []).append(test)
+    return failed
+
+
+def rerun_test_suites(suites_yaml, failed):
+    """Suite definitions that rerun the failed tests of suites."""
+    test_suites = {}
+    for suite_name, groups in failed.items():
+        suite_def = copy.deepcopy(suites_yaml['test_suites'][suite_name])
+        if groups is not None:
+            tests = _rerun_tests(suites_yaml, suite_def, groups)
+            if tests is not None:
+                suite_def['tests'] = tests
+                # few tests are rerun, sharding would only add setup time
+                suite_def.pop('shards', None)
+        test_suites[suite_name] = suite_def
+    return test_suites
+
+
+def _rerun_tests(suites_yaml, suite_def, groups):
+    externals = {}
+    for test in suite_def['tests']:
+        if isinstance(test, basestring):
+            test = suites_yaml.get('tests', {}).get(test, test)
+        if isinstance(test, dict) and 'external' in test:
+            externals[test['external']['repo']] = test['external']
+    tests = []
+    for group, group_tests in sorted(groups.items()):
+        if group == SYSTEM_TESTS_GROUP:
+            tests.append({'tests': group_tests})
+        elif group in externals:
+            tests.append({'external': externals[group],
+                          'tests': group_tests})
+        else:
+            # the repository name is only known after variables processing
+            return None
+    return tests
+
+
+def merge_rerun_reports(previous_reports_dir, reports_dir, suite_names,
+                        rerun):
+    """Merge the reports of a rerun into the reports of the previous run.
+
+    Test cases of rerun tests replace the previous ones, the reports of
+    suites rerun entirely replace all previous reports of these suites.
+    Merged reports are written to reports_dir.
+    """
+    for report in path(previous_reports_dir).files():
+        parsed = parse_report_name(report.name, suite_names)
+        suite_name = parsed[0] if parsed else None
+        if suite_name in rerun and rerun[suite_name] is None:
+            continue
+        rerun_report = path(reports_dir) / report.name
+        if not rerun_report.exists():
+            shutil.copy(report, rerun_report)
+            continue
+        replacements = dict(
+            (xunit_reports.test_key(testcase), copy.deepcopy(testcase))
+            for testcase in xunit_reports.testcases(rerun_report))
+        merged_report = '{0}.merged'.format(rerun_report)
+        xunit_reports.merge_reports([report], merged_report,
+                                    name=suite_name or report.namebase,
+                                    replacements=replacements)
+        os.rename(merged_report, rerun_report)
@@ -0,0 +1,86 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test results streamed from suite containers.
+
+The results streamer nose plugin of the test framework appends a JSON line
+to the results file of a suite, in the suite reports dir, when every test
+starts and ends. The suites runner tails the file while the suite runs and
+writes xunit reports from the results of test groups that were killed
+before writing their own reports.
+"""
+
+import json
+import os
+
+from lxml import etree
+
+import xunit_reports
+
+# results file, kept in the suite reports dir
+SUITE_RESULTS_FILE = 'results.jsonl'
+# outcomes of results, the started outcome is streamed when a test starts
+OUTCOME_ELEMENTS = {'failed': 'failure', 'error': 'error',
+                    'skipped': 'skipped'}
+
+
+def read_results(results_path, offset=0):
+    """Results appended to a results file after offset, and the offset
+    following the last complete line read."""
+    if not os.path.isfile(results_path):
+        return [], offset
+    with open(results_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    # a line may be partially written
+    end = data.rfind('\n') + 1
+    results = [json.loads(line) for line in data[:end].splitlines()
+               if line.strip()]
+    return results, offset + end
+
+
+def write_report(results, report_path, name):
+    """Write an xunit report of streamed results.
+
+    Tests that started and did not end are reported as errors, they were
+    running when the run was killed.
+    """
+    ended = {}
+    started = {}
+    for result in results:
+        if result['outcome'] == 'started':
+            started[result['test']] = result
+        else:
+            ended[result['test']] = result
+    testcases = []
+    for test in sorted(set(started) | set(ended)):
+        result = ended.get(test)
+        classname, _, test_name = test.rpartition('.')
+        testcase = etree.Element('testcase', classname=classname,
+                                 name=test_name)
+        if result is None:
+            etree.SubElement(testcase, 'error', type='TestKilled',
+                             message='Test did not end, the run was killed')
+        else:
+            testcase.set('time', str(result.get('duration', 0)))
+            if result['outcome'] in OUTCOME_ELEMENTS:
+                element = etree.SubElement(
+                    testcase, OUTCOME_ELEMENTS[result['outcome']],
+                    type=result.get('type', ''),
+                    message=result.get('message', ''))
+                element.text = etree.CDATA(result.get('traceback', ''))
+        testcases.append(testcase)
+    return xunit_reports.merge_reports([], report_path, name=name,
+                                       additional_testcases=testcases)
@@ -0,0 +1,30 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Splitting of the tests of a suite into shards.
+
+Every shard of a suite runs in its own suite container and runs the test
+groups of the suite with the tests names extractor nose plugin, which
+collects the full test list of every group and keeps its own part of the
+partition. Shards never communicate, so the partition only depends on the
+collected tests and the recorded test durations which are the same in all
+shards.
+"""
+
+# environment variable appended to test ids of sharded suites so shards
+# sharing an environment never use the same blueprint and deployment ids
+TEST_ID_SUFFIX = 'CFY_TEST_ID_SUFFIX'
+# test durations of a sharded suite, written to the suite work dir
+TEST_DURATIONS_FILE = 'test-durations.json'
@@ -0,0 +1,101 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+from contextlib import contextmanager
+
+import fasteners
+
+MAX_RECORDS = 5
+
+
+class SuitesHistory(object):
+    """Recorded running times of test suites, keyed by suite name and
+    descriptor. The history file is shared by all suites runners on a host
+    so every update is done under an inter-process lock.
+    """
+
+    def __init__(self, history_path, max_records=MAX_RECORDS):
+        self._history_path = history_path
+        self._history_lock = fasteners.InterProcessLock(
+            '{}.lock'.format(history_path))
+        self._max_records = max_records
+        self._history = self._load()
+
+    @staticmethod
+    def key(suite):
+        return '{0}:{1}'.format(suite.suite_name, suite.descriptor)
+
+    @staticmethod
+    def tests_key(suite):
+        # all shards of a suite share the durations of the suite tests
+        return '{0}:{1}'.format(suite.unsharded_name, suite.descriptor)
+
+    def running_times(self, suite):
+        return self._history.get(self.key(suite), {}).get('running_times', [])
+
+    def estimate(self, suite, default=None):
+        running_times = self.running_times(suite)
+        if not running_times:
+            return default
+        return sum(running_times) / len(running_times)
+
+    def test_durations(self, suite):
+        """Mean recorded running times of the tests of a suite by test
+        name."""
+        tests = self._history.get(self.tests_key(suite), {}).get(
+            'test_durations', {})
+        return dict((test, sum(times) / len(times))
+                    for test, times in tests.items())
+
+    def record_test_durations(self, suite, durations):
+        key = self.tests_key(suite)
+        with self._update() as history:
+            tests = history.setdefault(key, {}).setdefault(
+                'test_durations', {})
+            for test, duration in durations.items():
+                times = tests.get(test, [])
+                times.append(duration)
+                tests[test] = times[-self._max_records:]
+            self._history = history
+
+    def record(self, suite):
+        key = self.key(suite)
+        with self._update() as history:
+            entry = history.setdefault(key, {})
+            running_times = entry.get('running_times', [])
+            running_times.append(suite.running_time)
+            entry['running_times'] = running_times[-self._max_records:]
+            self._history = history
+
+    def _load(self):
+        if not os.path.exists(self._history_path):
+            return {}
+        with self._history_lock:
+            with open(self._history_path) as f:
+                return json.load(f)
+
+    @contextmanager
+    def _update(self):
+        with self._history_lock:
+            if os.path.exists(self._history_path):
+                with open(self._history_path) as f:
+                    history = json.load(f)
+            else:
+                history = {}
+            yield history
+            with open(self._history_path, 'w') as f:
+                json.dump(history, f, indent=2)
@@ -0,0 +1,166 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timing of the phases of test suites.
+
+Phases are recorded by the suites runner on the host and by the suite
+runner and test framework inside suite containers. Container phases are
+appended as JSON lines to the file named by the SUITE_TIMELINE_PATH
+environment variable and merged into the suite timeline when the suite
+ends.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+SUITE_TIMELINE_PATH = 'SUITE_TIMELINE_PATH'
+# container phases file, kept in the suite reports dir
+SUITE_TIMELINE_FILE = 'timeline.jsonl'
+
+
+class Timeline(object):
+    """Phases of a single suite.
+
+    :param name: suite name.
+    :param phases_path: when set, every phase is also appended to this file
+                        as a JSON line so phases of a crashed process are
+                        kept.
+    """
+
+    def __init__(self, name, phases_path=None):
+        self.name = name
+        self.env = None
+        self.phases = []
+        self._phases_path = phases_path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name, **args):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.time(), **args)
+
+    def add(self, name, start, end, **args):
+        phase = {'name': name, 'start': start, 'end': end, 'args': args}
+        with self._lock:
+            self.phases.append(phase)
+            if self._phases_path:
+                with open(self._phases_path, 'a') as f:
+                    f.write(json.dumps(phase) + '\n')
+
+    def load(self, phases_path):
+        """Add phases recorded in a JSON lines file by another process."""
+        if not os.path.isfile(phases_path):
+            return
+        with open(phases_path) as f:
+            phases = [json.loads(line) for line in f if line.strip()]
+        with self._lock:
+            self.phases.extend(phases)
+
+    def to_dict(self):
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: (p['start'],
+                                                        -p['end']))
+        return {'suite': self.name, 'env': self.env, 'phases': [
+            dict(p, duration=p['end'] - p['start']) for p in phases]}
+
+    def write(self, timeline_path):
+        with open(timeline_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def run_summary(timelines):
+    """Aggregate timelines of a run by phase and by suite."""
+    timelines = [t.to_dict() for t in timelines]
+    phases = {}
+    suites = {}
+    starts = []
+    ends = []
+    for timeline in timelines:
+        if not timeline['phases']:
+            continue
+        suite_start = min(p['start'] for p in timeline['phases'])
+        suite_end = max(p['end'] for p in timeline['phases'])
+        starts.append(suite_start)
+        ends.append(suite_end)
+        # phases such as pip_install may be recorded more than once
+        suite_phases = {}
+        for phase in timeline['phases']:
+            suite_phases[phase['name']] = suite_phases.get(
+                phase['name'], 0) + phase['duration']
+        suites[timeline['suite']] = {
+            'env': timeline['env'],
+            'duration': suite_end - suite_start,
+            'phases': suite_phases
+        }
+        for phase in timeline['phases']:
+            stats = phases.setdefault(phase['name'], {
+                'count': 0, 'total': 0, 'max': 0, 'slowest_suite': None})
+            stats['count'] += 1
+            stats['total'] += phase['duration']
+            if phase['duration'] >= stats['max']:
+                stats['max'] = phase['duration']
+                stats['slowest_suite'] = timeline['suite']
+    for stats in phases.values():
+        stats['mean'] = stats['total'] / stats['count']
+    return {
+        'start': min(starts) if starts else None,
+        'end': max(ends) if ends else None,
+        'duration': max(ends) - min(starts) if starts else 0,
+        'phases': phases,
+        'suites': suites
+    }
+
+
+def chrome_trace(timelines):
+    """Timelines in the Chrome trace event format, viewable in
+    chrome://tracing. Each environment is shown as a process with a thread
+    per suite that ran on it."""
+    events = []
+    envs = {}
+    for tid, timeline in enumerate(
+            (t.to_dict() for t in timelines), start=1):
+        env = timeline['env'] or 'unassigned'
+        if env not in envs:
+            envs[env] = len(envs) + 1
+            events.append({'name': 'process_name', 'ph': 'M',
+                           'pid': envs[env], 'tid': 0,
+                           'args': {'name': env}})
+        events.append({'name': 'thread_name', 'ph': 'M',
+                       'pid': envs[env], 'tid': tid,
+                       'args': {'name': timeline['suite']}})
+        for phase in timeline['phases']:
+            events.append({'name': phase['name'],
+                           'cat': 'suite',
+                           'ph': 'X',
+                           'ts': int(phase['start'] * 1000000),
+                           'dur': int(phase['duration'] * 1000000),
+                           'pid': envs[env],
+                           'tid': tid,
+                           'args': phase['args']})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write_run_timelines(timelines, timelines_dir):
+    """Write the run summary and chrome trace of timelines."""
+    with open(os.path.join(timelines_dir, 'summary.json'), 'w') as f:
+        json.dump(run_summary(timelines), f, indent=2)
+    with open(os.path.join(timelines_dir, 'trace.json'), 'w') as f:
+        json.dump(chrome_trace(timelines), f)
@@ -0,0 +1,263 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""HTTP protocol between a suites runner coordinator and suites workers.
+
+A worker exposes the following JSON endpoints for each suite it runs:
+
+    POST   /suites/<name>            start a suite (suite_def, variables,
+                                     run_id, repos, files), returns once
+                                     the suite is started
+    GET    /suites/<name>?timeout=N  wait up to N seconds for the suite to
+                                     exit, returns its running state
+    POST   /suites/<name>/stop       stop a running suite
+    GET    /suites/<name>/exit-code  exit code of an exited suite
+    GET    /suites/<name>/logs       suite container logs
+    GET    /suites/<name>/reports    xunit reports of the suite by file name
+    DELETE /suites/<name>            remove the suite container and files,
+                                     a suite still starting is removed once
+                                     its start ends
+
+Requests must carry the token shared by the coordinator and the worker in
+the X-Worker-Token header. Suite variables include credentials, workers
+that are not only reachable from their host should be served over https.
+
+Any object with the methods of WorkerClient can be used by the coordinator
+in place of a remote worker.
+"""
+
+import hmac
+import json
+import logging
+import re
+import ssl
+import threading
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import requests
+
+# extra time given to a wait request on top of its long poll timeout
+REQUEST_TIMEOUT_MARGIN = 30
+# the first start of a run on a worker refreshes the git mirrors of the
+# worker and builds the suite image, other starts of the run wait for it
+START_REQUEST_TIMEOUT = 60 * 60
+# environment variable of the token shared by the coordinator and workers
+WORKER_TOKEN = 'SUITES_WORKER_TOKEN'
+TOKEN_HEADER = 'X-Worker-Token'
+SUITE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+logger = logging.getLogger('suites_workers')
+
+
+class WorkerError(Exception):
+    pass
+
+
+def is_valid_suite_name(suite_name):
+    """Whether a suite name may be used as the name of a directory of the
+    worker, and in urls."""
+    return (SUITE_NAME_PATTERN.match(suite_name) is not None and
+            suite_name not in ('.', '..'))
+
+
+class WorkerClient(object):
+    """Client of a suites worker listening on url."""
+
+    def __init__(self, url, token, timeout=60):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def __str__(self):
+        return self.url
+
+    def start(self, suite_name, suite_def, variables, run_id=None,
+              repos=None, files=None):
+        self._request('post', suite_name, data={'suite_def': suite_def,
+                                                'variables': variables,
+                                                'run_id': run_id,
+                                                'repos': repos,
+                                                'files': files},
+                      timeout=START_REQUEST_TIMEOUT)
+
+    def wait(self, suite_name, timeout):
+        return self._request('get', suite_name,
+                             params={'timeout': timeout},
+                             timeout=timeout + REQUEST_TIMEOUT_MARGIN)
+
+    def stop(self, suite_name):
+        self._request('post', suite_name, 'stop')
+
+    def exit_code(self, suite_name):
+        return self._request('get', suite_name, 'exit-code')['exit_code']
+
+    def logs(self, suite_name):
+        return self._request('get', suite_name, 'logs')['logs']
+
+    def reports(self, suite_name):
+        return self._request('get', suite_name, 'reports')['reports']
+
+    def results(self, suite_name, offset):
+        body = self._request('get', suite_name, 'results',
+                             params={'offset': offset})
+        return body['results'], body['offset']
+
+    def remove(self, suite_name):
+        self._request('delete', suite_name)
+
+    def _request(self, method, suite_name, action=None, data=None,
+                 params=None, timeout=None):
+        url = '{0}/suites/{1}'.format(self.url, suite_name)
+        if action:
+            url = '{0}/{1}'.format(url, action)
+        response = requests.request(
+            method, url,
+            data=json.dumps(data) if data is not None else None,
+            params=params,
+            headers={TOKEN_HEADER: self.token},
+            timeout=timeout or self.timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.status_code != 200:
+            raise WorkerError('{0} {1} failed on worker {2} [status={3}, '
+                              'error={4}]'.format(method.upper(), url,
+                                                  self.url,
+                                                  response.status_code,
+                                                  body.get('error')))
+        return body
+
+
+class WorkerRequestHandler(BaseHTTPRequestHandler):
+    """Maps the worker endpoints to methods of the server's worker."""
+
+    _path_pattern = re.compile(r'^/suites/([^/]+)(?:/([a-z-]+))?$')
+
+    def do_POST(self):
+        self._handle({
+            None: lambda name: self.server.worker.start(
+                name, **self._read_body()),
+            'stop': self.server.worker.stop
+        })
+
+    def do_GET(self):
+        self._handle({
+            None: lambda name: self.server.worker.wait(
+                name, timeout=float(self._query().get('timeout', 0))),
+            'exit-code': lambda name: {
+                'exit_code': self.server.worker.exit_code(name)},
+            'logs': lambda name: {'logs': self.server.worker.logs(name)},
+            'reports': lambda name: {
+                'reports': self.server.worker.reports(name)},
+            'results': lambda name: dict(zip(
+                ['results', 'offset'], self.server.worker.results(
+                    name, offset=int(self._query().get('offset', 0)))))
+        })
+
+    def do_DELETE(self):
+        self._handle({None: self.server.worker.remove})
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _handle(self, actions):
+        token = self.headers.getheader(TOKEN_HEADER) or ''
+        if not hmac.compare_digest(token, self.server.token):
+            self._respond(401, {'error': 'Invalid worker token'})
+            return
+        url = urlparse.urlparse(self.path)
+        match = self._path_pattern.match(url.path)
+        if not match or match.group(2) not in actions:
+            self._respond(404, {'error': 'Not found: {0}'.format(url.path)})
+            return
+        suite_name, action = match.groups()
+        if not is_valid_suite_name(suite_name):
+            self._respond(400, {'error': 'Invalid suite name: {0}'.format(
+                suite_name)})
+            return
+        try:
+            result = actions[action](suite_name)
+        except KeyError:
+            self._respond(404, {'error': 'Unknown suite: {0}'.format(
+                suite_name)})
+        except Exception as e:
+            logger.exception('Worker request failed: {0} {1}'.format(
+                self.command, self.path))
+            self._respond(500, {'error': str(e)})
+        else:
+            self._respond(200, result or {})
+
+    def _query(self):
+        query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        return dict((key, values[0]) for key, values in query.items())
+
+    def _read_body(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _respond(self, status, body):
+        content = json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class WorkerServer(ThreadingMixIn, HTTPServer):
+    """Serves a worker, each request is handled in its own thread so long
+    polling waits do not block other requests.
+
+    :param token: token requests must carry.
+    :param certfile: certificate of the worker, the worker is served over
+                     https when given.
+    :param keyfile: private key of the certificate.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, worker, host, port, token, certfile=None,
+                 keyfile=None):
+        if not token:
+            raise ValueError('Worker token is required')
+        HTTPServer.__init__(self, (host, port), WorkerRequestHandler)
+        self.worker = worker
+        self.token = token
+        self.secure = certfile is not None
+        if self.secure:
+            self.socket = ssl.wrap_socket(self.socket,
+                                          certfile=certfile,
+                                          keyfile=keyfile,
+                                          server_side=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return '{0}://{1}:{2}'.format('https' if self.secure else 'http',
+                                      host, port)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
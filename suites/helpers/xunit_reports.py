@@ -0,0 +1,298 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streaming processing of xunit reports.
+
+Reports are handled one testsuite child element at a time so reports with
+large captured output are never fully loaded into memory.
+"""
+
+import copy
+import os
+import shutil
+import threading
+from xml.sax.saxutils import quoteattr
+
+from lxml import etree
+
+COPY_BUFFER_SIZE = 1024 * 1024
+# message of the skipped test cases added for tests that did not run
+MISSING_TEST_MESSAGE = 'Test should have run, but did not'
+
+
+def _iterparse(report):
+    return etree.iterparse(report,
+                           events=('start', 'end'),
+                           strip_cdata=False,
+                           huge_tree=True)
+
+
+def rewrite_report(source, destination, suite_name):
+    """Write the report at source to destination with the suite name
+    appended to the name of every test case."""
+    events = _iterparse(source)
+    _, root = next(events)
+    with etree.xmlfile(destination, encoding='utf-8') as xf:
+        xf.write_declaration()
+        with xf.element(root.tag, dict(root.attrib)):
+            depth = 1
+            for event, element in events:
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                if element.tag == 'testcase':
+                    element.set('name', '{0} @ {1}'.format(
+                        element.get('name'), suite_name))
+                xf.write('\n')
+                xf.write(element, with_tail=False)
+                _release(element)
+            xf.write('\n')
+
+
+def report_stats(report):
+    """Test, error, failure and skip counts of a report."""
+    stats = {'tests': 0, 'errors': 0, 'failures': 0, 'skip': 0}
+    for event, element in _iterparse(report):
+        if event != 'end':
+            continue
+        if element.tag == 'testcase':
+            stats['tests'] += 1
+            _release(element)
+        elif element.tag == 'error':
+            stats['errors'] += 1
+        elif element.tag == 'failure':
+            stats['failures'] += 1
+        elif element.tag == 'skipped':
+            stats['skip'] += 1
+    return stats
+
+
+def test_durations(report):
+    """Running times of the passed tests of a report by test name, names of
+    test cases rewritten by rewrite_report are given without the suite name.
+
+    Failed, errored and skipped tests may end early, their running times do
+    not predict the next runs."""
+    durations = {}
+    for event, element in _iterparse(report):
+        if event != 'end' or element.tag != 'testcase':
+            continue
+        if element.get('time') is not None and \
+                test_outcome(element) is None:
+            name = element.get('name').split(' @ ')[0]
+            durations['{0}.{1}'.format(element.get('classname'),
+                                       name)] = float(element.get('time'))
+        _release(element)
+    return durations
+
+
+def test_key(testcase):
+    """Class name and name of a test case, without the suite name appended
+    by rewrite_report."""
+    return testcase.get('classname'), testcase.get('name').split(' @ ')[0]
+
+
+def test_outcome(testcase):
+    """errors, failures or skip for a test case that did not pass."""
+    for child in testcase:
+        if child.tag == 'error':
+            return 'errors'
+        elif child.tag == 'failure':
+            return 'failures'
+        elif child.tag == 'skipped':
+            return 'skip'
+    return None
+
+
+def testcases(report):
+    """Test cases of a testsuite report. Test cases are released once the
+    next one is read so they should be copied to be kept."""
+    for element in _children(report):
+        if element.tag == 'testcase':
+            yield element
+
+
+def merge_reports(reports, destination, name, replacements=None,
+                  additional_testcases=None):
+    """Write the test cases of reports as a single testsuite.
+
+    Reports are read once, test cases are written to a body file as they
+    are counted and the body is copied under a testsuite element with the
+    counts.
+
+    :param replacements: test cases by test_key, replacing the test cases
+                         of the reports with the same key.
+    :param additional_testcases: test cases written after the test cases of
+                                 the reports.
+    """
+    replacements = replacements or {}
+    additional_testcases = additional_testcases or []
+
+    def merged_testcases():
+        for report in reports:
+            for testcase in testcases(report):
+                replacement = replacements.get(test_key(testcase))
+                if replacement is not None:
+                    replacement = copy.deepcopy(replacement)
+                    replacement.set('name', testcase.get('name'))
+                    yield replacement
+                else:
+                    yield testcase
+        for testcase in additional_testcases:
+            yield testcase
+
+    stats = {'tests': 0, 'errors': 0, 'failures': 0, 'skip': 0}
+    body_path = '{0}.body'.format(destination)
+    tmp_path = '{0}.tmp'.format(destination)
+    try:
+        with open(body_path, 'wb') as body:
+            for testcase in merged_testcases():
+                stats['tests'] += 1
+                outcome = test_outcome(testcase)
+                if outcome:
+                    stats[outcome] += 1
+                body.write('\n')
+                body.write(etree.tostring(testcase,
+                                          encoding='utf-8',
+                                          xml_declaration=False,
+                                          with_tail=False))
+        with open(tmp_path, 'wb') as f:
+            f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+            f.write('<testsuite name={0} {1}>'.format(
+                quoteattr(name),
+                ' '.join('{0}="{1}"'.format(k, v) for k, v in
+                         sorted(stats.items()))))
+            with open(body_path, 'rb') as body:
+                shutil.copyfileobj(body, f, COPY_BUFFER_SIZE)
+            f.write('\n</testsuite>\n')
+    finally:
+        if os.path.exists(body_path):
+            os.remove(body_path)
+    os.rename(tmp_path, destination)
+    return stats
+
+
+def add_missing_tests(report, expected_tests, name):
+    """Add a skipped test case to a report for every expected test that is
+    not in it.
+
+    The report is read once to find the missing tests, and only when tests
+    are missing it is rewritten, once and atomically. It is written with
+    the missing tests only when the run did not write it, e.g. when the
+    run crashed.
+
+    :param expected_tests: (classname, name) of the expected tests.
+    :return: the missing tests.
+    """
+    reports = [report] if os.path.isfile(report) else []
+    run_tests = set(test_key(testcase) for r in reports
+                    for testcase in testcases(r))
+    missing_tests = sorted(set(expected_tests) - run_tests)
+    if not missing_tests and reports:
+        return missing_tests
+    missing_testcases = []
+    for classname, test_name in missing_tests:
+        testcase = etree.Element('testcase', classname=classname,
+                                 name=test_name)
+        etree.SubElement(testcase, 'skipped', message=MISSING_TEST_MESSAGE)
+        missing_testcases.append(testcase)
+    merge_reports(reports, report, name=name,
+                  additional_testcases=missing_testcases)
+    return missing_tests
+
+
+def _children(report):
+    events = _iterparse(report)
+    next(events)
+    depth = 1
+    for event, element in events:
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield element
+            _release(element)
+
+
+def _release(element):
+    # drop processed elements, including already processed siblings
+    element.clear()
+    parent = element.getparent()
+    while element.getprevious() is not None:
+        del parent[0]
+
+
+class MergedReport(object):
+    """A single xunit report of a suites run, made of the reports of all
+    suites.
+
+    Reports are appended as testsuite elements of a parts file as suites
+    finish, finalize wraps them in a testsuites element with the run totals.
+    The report is written by the first finalize only.
+    """
+
+    def __init__(self, report_path, name='suites'):
+        self.report_path = report_path
+        self.name = name
+        self._parts_path = '{0}.parts'.format(report_path)
+        self._stats = {'tests': 0, 'errors': 0, 'failures': 0, 'skip': 0}
+        self._lock = threading.Lock()
+        self._finalized = False
+        if os.path.exists(self._parts_path):
+            os.remove(self._parts_path)
+
+    def append(self, report):
+        stats = report_stats(report)
+        with self._lock:
+            with open(self._parts_path, 'ab') as parts:
+                with open(report, 'rb') as f:
+                    _skip_declaration(f)
+                    shutil.copyfileobj(f, parts, COPY_BUFFER_SIZE)
+                parts.write('\n')
+            for key, value in stats.items():
+                self._stats[key] += value
+
+    def finalize(self):
+        with self._lock:
+            if self._finalized:
+                return dict(self._stats)
+            tmp_path = '{0}.tmp'.format(self.report_path)
+            with open(tmp_path, 'wb') as f:
+                f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+                f.write('<testsuites name={0} {1}>\n'.format(
+                    quoteattr(self.name),
+                    ' '.join('{0}="{1}"'.format(k, v) for k, v in
+                             sorted(self._stats.items()))))
+                if os.path.exists(self._parts_path):
+                    with open(self._parts_path, 'rb') as parts:
+                        shutil.copyfileobj(parts, f, COPY_BUFFER_SIZE)
+                    os.remove(self._parts_path)
+                f.write('</testsuites>\n')
+            os.rename(tmp_path, self.report_path)
+            self._finalized = True
+            return dict(self._stats)
+
+
+def _skip_declaration(f):
+    start = f.read(5)
+    if start != '<?xml':
+        f.seek(0)
+        return
+    while f.read(1) not in ('>', ''):
+        pass
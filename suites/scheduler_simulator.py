@@ -0,0 +1,372 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+"""Discrete-event simulation of SuitesScheduler runs.
+
+Simulated suites run on a simulated clock so a run of hundreds of suites
+that would take hours takes seconds, while the real scheduler logic decides
+when and where each suite runs. Used to compare scheduling strategies, e.g.:
+
+    python scheduler_simulator.py --suites 500 --pools openstack:6,aws:2:3
+    python scheduler_simulator.py --suites 500 --no-optimize
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import math
+import random
+import time
+
+from path import path
+
+from suites_runner import SuitesScheduler, TestSuite, logger
+
+DURATIONS = {
+    'constant': lambda rng, mean: mean,
+    'uniform': lambda rng, mean: rng.uniform(mean * 0.5, mean * 1.5),
+    'exponential': lambda rng, mean: rng.expovariate(1.0 / mean),
+    # sigma of 0.5 with mu chosen so the distribution mean is mean
+    'lognormal': lambda rng, mean: rng.lognormvariate(
+        math.log(mean) - 0.125, 0.5)
+}
+
+
+class SimulatedClock(object):
+    """Clock of a simulation, time only advances when the scheduler waits.
+
+    Callbacks scheduled with call_at are invoked when the clock passes
+    their time, which is how simulated suites exit.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self._callbacks = []
+        self._sequence = itertools.count()
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback):
+        heapq.heappush(self._callbacks,
+                       (when, next(self._sequence), callback))
+
+    def sleep(self, seconds):
+        self._advance(self.now + seconds)
+
+    def wait(self, events, timeout):
+        if events.empty():
+            deadline = self.now + timeout
+            if self._callbacks and self._callbacks[0][0] <= deadline:
+                # wake up as soon as the next callback posts an event
+                self._advance(self._callbacks[0][0])
+            else:
+                self._advance(deadline)
+        while not events.empty():
+            events.get_nowait()
+
+    def _advance(self, until):
+        while self._callbacks and self._callbacks[0][0] <= until:
+            when, _, callback = heapq.heappop(self._callbacks)
+            self.now = max(self.now, when)
+            callback()
+        self.now = max(self.now, until)
+
+
+class SimulatedTestSuite(TestSuite):
+    """Suite that runs for a given duration of a simulated clock."""
+
+    def __init__(self, suite_name, suite_def, clock, duration,
+                 estimate=None, fails_at=None):
+        super(SimulatedTestSuite, self).__init__(
+            suite_name=suite_name,
+            suite_def=suite_def,
+            suite_work_dir=path(suite_name),
+            variables={})
+        self.clock = clock
+        self.duration = duration
+        self.estimate = estimate if estimate is not None else duration
+        # fraction of the duration after which the suite fails, if it does
+        self.fails_at = fails_at
+        self._running = False
+
+    @property
+    def running_time(self):
+        if self.terminated is not None:
+            return self.terminated - self.started
+        elif self.started is not None:
+            return self.clock.time() - self.started
+        else:
+            return 0
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def run(self):
+        self._running = True
+        duration = self.duration
+        if self.fails_at is not None:
+            duration *= self.fails_at
+        self.clock.call_at(self.clock.time() + duration, self._exit)
+
+    def terminate(self):
+        self._running = False
+
+    def _exit(self):
+        if not self._running:
+            return
+        self._running = False
+        if self.fails_at is not None:
+            self.failed = True
+            self.exit_code = 1
+        self._notify_exit()
+
+
+class SimulatedHistory(object):
+    """Running time estimates of simulated suites."""
+
+    def estimate(self, suite, default=None):
+        return suite.estimate
+
+    def record(self, suite):
+        pass
+
+
+def parse_pools(pools):
+    """Parse pools given as tag:envs[:capacity],... into a dict of
+    tag -> (envs, capacity)."""
+    result = {}
+    for pool in pools.split(','):
+        parts = pool.strip().split(':')
+        capacity = int(parts[2]) if len(parts) > 2 else 1
+        result[parts[0]] = (int(parts[1]), capacity)
+    return result
+
+
+def generate_workload(suites_count=500,
+                      pools=None,
+                      distribution='lognormal',
+                      mean_duration=30 * 60,
+                      failure_rate=0.05,
+                      estimate_noise=0.2,
+                      pinned_ratio=0.1,
+                      exclusive_ratio=0.0,
+                      seed=0):
+    """Generate handler configurations and suite specifications.
+
+    Each pool is a group of environments sharing a tag, every suite
+    requires the tag of a random pool or is pinned to a random handler
+    configuration of the pool.
+    """
+    rng = random.Random(seed)
+    pools = pools or {'openstack': (6, 1), 'aws': (2, 2)}
+    handler_configurations = {}
+    pool_configurations = {}
+    for tag, (envs, capacity) in sorted(pools.items()):
+        pool_configurations[tag] = []
+        for i in range(envs):
+            name = '{0}_{1}'.format(tag, i)
+            handler_configurations[name] = {
+                'env': '{0}_env_{1}'.format(tag, i),
+                'tags': [tag],
+                'capacity': capacity}
+            pool_configurations[tag].append(name)
+    suites = []
+    for i in range(suites_count):
+        tag = rng.choice(sorted(pools))
+        suite_def = {'descriptor': 'suite_{0}'.format(i)}
+        if rng.random() < pinned_ratio:
+            suite_def['handler_configuration'] = rng.choice(
+                pool_configurations[tag])
+        else:
+            suite_def['requires'] = [tag]
+        if rng.random() < exclusive_ratio:
+            suite_def['exclusive'] = True
+        duration = DURATIONS[distribution](rng, mean_duration)
+        suites.append({
+            'suite_name': 'suite_{0}'.format(i),
+            'suite_def': suite_def,
+            'duration': duration,
+            'estimate': duration * rng.lognormvariate(0, estimate_noise),
+            'fails_at': (rng.uniform(0.05, 1)
+                         if rng.random() < failure_rate else None)
+        })
+    return handler_configurations, suites
+
+
+def simulate(handler_configurations,
+             suites,
+             optimize=True,
+             event_driven=True,
+             scheduling_interval=30,
+             suite_timeout=-1):
+    """Run the scheduler over simulated suites and return run metrics."""
+    clock = SimulatedClock()
+    test_suites = [SimulatedTestSuite(suite_name=s['suite_name'],
+                                      suite_def=dict(s['suite_def']),
+                                      clock=clock,
+                                      duration=s['duration'],
+                                      estimate=s.get('estimate'),
+                                      fails_at=s.get('fails_at'))
+                   for s in suites]
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+    started = time.time()
+    try:
+        scheduler = SuitesScheduler(test_suites,
+                                    handler_configurations,
+                                    scheduling_interval=scheduling_interval,
+                                    optimize=optimize,
+                                    after_suite_callback=_after_suite,
+                                    suite_timeout=suite_timeout,
+                                    event_driven=event_driven,
+                                    history=SimulatedHistory(),
+                                    clock=clock)
+        scheduler.run()
+    finally:
+        logger.setLevel(level)
+    metrics = run_metrics(test_suites, handler_configurations)
+    metrics.update({
+        'failed_suites': len(scheduler.failed_suites),
+        'timed_out_suites': len(scheduler.timed_out_suites),
+        'simulation_time': time.time() - started
+    })
+    return metrics
+
+
+def _after_suite(suite):
+    if suite.timed_out or suite.cancelled:
+        suite.terminate()
+
+
+def run_metrics(test_suites, handler_configurations):
+    """Total run time, environment utilization and queue wait statistics
+    of suites that all became ready at time 0."""
+    capacities = SuitesScheduler._env_capacities(handler_configurations)
+    makespan = max(s.terminated for s in test_suites) if test_suites else 0
+    busy = dict((env, 0.0) for env in capacities)
+    pool_work = {}
+    for suite in test_suites:
+        env = handler_configurations[suite.handler_configuration]['env']
+        slots = capacities[env] if suite.exclusive else 1
+        busy[env] += slots * suite.running_time
+        tags = tuple(sorted(
+            handler_configurations[suite.handler_configuration]['tags']))
+        pool_work[tags] = pool_work.get(tags, 0) + slots * suite.running_time
+    pool_slots = {}
+    for configuration in handler_configurations.values():
+        tags = tuple(sorted(configuration['tags']))
+        pool_slots.setdefault(tags, {})[configuration['env']] = capacities[
+            configuration['env']]
+    # no schedule can finish before the busiest pool does its work or
+    # before the longest suite ends
+    lower_bound = max(
+        [float(work) / sum(pool_slots[pool].values())
+         for pool, work in pool_work.items()] +
+        [s.running_time for s in test_suites] + [0])
+    utilization = dict(
+        (env, busy[env] / (capacities[env] * makespan) if makespan else 0.0)
+        for env in capacities)
+    waits = sorted(s.started for s in test_suites)
+    return {
+        'suites': len(test_suites),
+        'makespan': makespan,
+        'lower_bound': lower_bound,
+        'efficiency': float(lower_bound) / makespan if makespan else 1,
+        'utilization': (sum(busy.values()) /
+                        (sum(capacities.values()) * makespan)
+                        if makespan else 0),
+        'env_utilization': utilization,
+        'queue_wait': {
+            'mean': float(sum(waits)) / len(waits) if waits else 0,
+            'median': _percentile(waits, 50),
+            'p90': _percentile(waits, 90),
+            'max': waits[-1] if waits else 0
+        }
+    }
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0
+    index = int(math.ceil(percent / 100.0 * len(sorted_values))) - 1
+    return sorted_values[max(0, index)]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--suites', type=int, default=500,
+                        help='Number of simulated suites')
+    parser.add_argument('--pools', default='openstack:6,aws:2:2',
+                        help='Environment pools as tag:envs[:capacity],...')
+    parser.add_argument('--distribution', choices=sorted(DURATIONS),
+                        default='lognormal',
+                        help='Distribution of suite durations')
+    parser.add_argument('--mean-duration', type=float, default=30 * 60,
+                        help='Mean suite duration in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.05,
+                        help='Fraction of suites that fail before their end')
+    parser.add_argument('--estimate-noise', type=float, default=0.2,
+                        help='Log-normal sigma of running time estimates')
+    parser.add_argument('--pinned-ratio', type=float, default=0.1,
+                        help='Fraction of suites with a fixed handler '
+                             'configuration')
+    parser.add_argument('--exclusive-ratio', type=float, default=0.0,
+                        help='Fraction of exclusive suites')
+    parser.add_argument('--suite-timeout', type=float, default=-1)
+    parser.add_argument('--scheduling-interval', type=float, default=30.0)
+    parser.add_argument('--polling', action='store_true',
+                        help='Simulate the polling scheduler instead of '
+                             'the event driven one')
+    parser.add_argument('--no-optimize', action='store_true',
+                        help='Keep the suites order instead of starting the '
+                             'longest suites first')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output',
+                        help='File to append the run metrics to as a JSON '
+                             'line, to track scheduler quality over time')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    handler_configurations, suites = generate_workload(
+        suites_count=args.suites,
+        pools=parse_pools(args.pools),
+        distribution=args.distribution,
+        mean_duration=args.mean_duration,
+        failure_rate=args.failure_rate,
+        estimate_noise=args.estimate_noise,
+        pinned_ratio=args.pinned_ratio,
+        exclusive_ratio=args.exclusive_ratio,
+        seed=args.seed)
+    metrics = simulate(handler_configurations,
+                       suites,
+                       optimize=not args.no_optimize,
+                       event_driven=not args.polling,
+                       scheduling_interval=args.scheduling_interval,
+                       suite_timeout=args.suite_timeout)
+    metrics['arguments'] = vars(args)
+    print json.dumps(metrics, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(metrics, sort_keys=True) + '\n')
+
+
+if __name__ == '__main__':
+    main()
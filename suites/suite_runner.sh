@@ -2,18 +2,40 @@
 
 setenv()
 {
+	export SUITE_CONTAINER_STARTED="$(date +%s.%N)"
 	export PYTHONUNBUFFERED="true"
 	export BASE_HOST_DIR="/vagrant"
 	export WORK_DIR="${PWD}/env"
+	export PREBAKED_VIRTUALENV="/suite-env"
 }
 
-create_activate_and_cd_virtualenv()
+requirements_hash()
+{
+	cat ${BASE_HOST_DIR}/requirements.txt ${BASE_HOST_DIR}/wheel-requirements.txt | sha256sum | cut -d' ' -f1
+}
+
+install_requirements()
 {
-	echo "### Creating virtualenv"
-	virtualenv env
-	source env/bin/activate
 	pip install -r ${BASE_HOST_DIR}/requirements.txt
 	pip install --no-index --find-links=/wheels -r ${BASE_HOST_DIR}/wheel-requirements.txt
+}
+
+create_activate_and_cd_virtualenv()
+{
+	if [[ -d ${PREBAKED_VIRTUALENV} ]]; then
+		echo "### Activating pre-baked virtualenv"
+		source ${PREBAKED_VIRTUALENV}/bin/activate
+		if [[ "$(cat ${PREBAKED_VIRTUALENV}/.requirements-sha256)" != "$(requirements_hash)" ]]; then
+			echo "### Requirements changed since image build, updating virtualenv"
+			install_requirements
+		fi
+		mkdir -p env
+	else
+		echo "### Creating virtualenv"
+		virtualenv env
+		source env/bin/activate
+		install_requirements
+	fi
 	cd env
 }
 
@@ -15,17 +15,28 @@
 
 import os
 import sys
+import base64
 import signal
 import logging
+import re
 import json
-import random
+import hashlib
+import argparse
 import shutil
 import time
-import tempfile
+import socket
+import sqlite3
+import tarfile
+import threading
+import uuid
+import Queue
+from StringIO import StringIO
 from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 import fasteners
 import jinja2
+import requests
 import yaml
 import sh
 from path import path
@@ -33,6 +44,18 @@ from nose.plugins import xunit
 
 from helpers import sh_bake
 from helpers.suites_builder import build_suites_yaml
+from helpers.suites_history import SuitesHistory
+from helpers.workers import (WorkerClient,
+                             WorkerError,
+                             WORKER_TOKEN,
+                             is_valid_suite_name)
+from helpers import xunit_reports
+from helpers import rerun
+from helpers import impact
+from helpers import results_stream
+from helpers.timeline import (Timeline,
+                              SUITE_TIMELINE_FILE,
+                              write_run_timelines)
 
 logging.basicConfig()
 
@@ -47,31 +70,468 @@ try:
     vagrant = sh_bake(sh.vagrant)
 except sh.CommandNotFound:
     vagrant = None
+try:
+    git = sh_bake(sh.git)
+except sh.CommandNotFound:
+    git = None
 
 reports_dir = path(__file__).dirname() / 'xunit-reports'
+timelines_dir = path(__file__).dirname() / 'timelines'
+# results of all suites of a run, appended while suites run
+live_results_path = path(__file__).dirname() / 'live-results.jsonl'
+repo_dir = path(__file__).dirname().dirname()
 
 TEST_SUITES_PATH = 'TEST_SUITES_PATH'
 DOCKER_REPOSITORY = 'cloudify/test'
 DOCKER_TAG = 'env'
 SUITE_ENVS_DIR = 'suite-envs'
+PREVIOUS_REPORTS_DIR = 'previous-xunit-reports'
+WORKER_SUITE_ENVS_DIR = 'worker-suite-envs'
+WORKER_RUNS_DIR = 'worker-runs'
+WORKER_PORT = 8090
+# containers labeled with pids of these processes are not pruned
+SUITES_RUNNER_PROCESS_NAMES = ['suites_runner', 'suites_worker']
+LABEL_RUNNER_PID = 'cloudify.suites.runner-pid'
+LABEL_RUN_ID = 'cloudify.suites.run-id'
+LABEL_SUITE = 'cloudify.suites.suite'
 SCHEDULER_INTERVAL = 30
+LAUNCH_WORKERS = 8
+DEFAULT_SUITE_DURATION = 60 * 60
+# suites that must end before the failure ratio policy may cancel a run
+FAILURE_RATIO_MIN_SUITES = 5
+CONTAINER_POLL_INTERVAL = 10
+# consecutive failed requests after which a worker's suite is considered
+# exited
+WORKER_REQUEST_RETRIES = 5
+RESULTS_POLL_INTERVAL = 10
+# files of the suites directory copied to suite work dirs
+SUITE_FILES = [
+    'Dockerfile',
+    'suite_runner.py',
+    'suite_runner.sh',
+    'requirements.txt',
+    'wheel-requirements.txt',
+    'suites',
+    'helpers',
+    'configurations']
+IMAGE_BUILD_INPUTS = [
+    'Dockerfile',
+    'requirements.txt',
+    'wheel-requirements.txt']
+MAX_CACHED_IMAGES = 3
+LEASE_TTL = 5 * 60
+LEASE_HEARTBEAT_INTERVAL = 30
+GIT_MIRRORS_DIR = 'GIT_MIRRORS_DIR'
+CONTAINER_GIT_MIRRORS_DIR = '/git-mirrors'
+WHEELHOUSE_DIR = 'WHEELHOUSE_DIR'
+CONTAINER_WHEELHOUSE_DIR = '/wheelhouse'
+# repositories cloned by suite containers and tests in addition to the
+# external repositories configured in suites.yaml
+MIRRORED_REPOS = [
+    'cloudify-system-tests',
+    'cloudify-cli',
+    'cloudify-manager-blueprints',
+    'cloudify-hello-world-example',
+    'cloudify-nodecellar-example',
+    'cloudify-nodecellar-docker-example'
+]
+
+
+class Launcher(object):
+    """Starts suite containers.
+
+    :param mounts: list of (host_path, container_path, mode) volumes that
+                   are mounted in addition to the suite work dir.
+    :param environment: additional container environment variables.
+    :param run_id: id of the suites run, containers are labeled with it.
+    """
+
+    name = None
+    # whether suite containers run on the local docker daemon
+    local = True
+
+    def __init__(self, mounts=None, environment=None, run_id=None):
+        self.mounts = mounts or []
+        self.environment = environment or {}
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        # content hash tagged image of suite containers, set once built
+        self.image = '{0}:{1}'.format(DOCKER_REPOSITORY, DOCKER_TAG)
+
+    def prepare(self, suite):
+        suite.create_env()
+
+    def start(self, suite):
+        raise NotImplementedError()
+
+    def stop(self, suite):
+        docker.stop(suite.container_name).wait()
+
+    def exit_code(self, suite):
+        return int(sh.docker.wait(suite.container_name).strip())
+
+    def logs(self, suite):
+        return sh.docker.logs(suite.container_name, _err_to_out=True).strip()
+
+    def collect_reports(self, suite):
+        pass
+
+    def results(self, suite, offset):
+        """Test results streamed by a suite after offset, and the offset
+        of the next results."""
+        return results_stream.read_results(
+            suite.suite_reports_dir / results_stream.SUITE_RESULTS_FILE,
+            offset)
+
+    def remove(self, suite):
+        kill_container(suite.container_name)
+
+    def close(self):
+        pass
+
+    def _volumes(self):
+        return ['{0}:{1}:{2}'.format(host_path, container_path, mode)
+                for host_path, container_path, mode in self.mounts]
+
+    def _labels(self, suite):
+        return ['{0}={1}'.format(key, value) for key, value in [
+            (LABEL_RUNNER_PID, os.getpid()),
+            (LABEL_RUN_ID, self.run_id),
+            (LABEL_SUITE, suite.suite_name)]]
+
+
+class VagrantLauncher(Launcher):
+    """Starts suite containers through vagrant's docker provider."""
+
+    name = 'vagrant'
+
+    def prepare(self, suite):
+        super(VagrantLauncher, self).prepare(suite)
+        vagrant_file_template = path('Vagrantfile.template').text()
+        vagrant_file_content = jinja2.Template(vagrant_file_template).render({
+            'suite_name': suite.suite_name,
+            'container_name': suite.container_name,
+            'suite': json.dumps(suite.suite_def),
+            'variables': json.dumps(suite.variables),
+            'volumes': self._volumes(),
+            'labels': self._labels(suite),
+            'image': suite.image or self.image,
+            'environment': self.environment
+        })
+        path(suite.suite_work_dir / 'Vagrantfile').write_text(
+            vagrant_file_content)
+
+    def start(self, suite):
+        # suites may be launched concurrently so the working directory
+        # is only changed for the spawned vagrant processes
+        vagrant.up(_cwd=suite.suite_work_dir).wait()
+        return vagrant('docker-logs', f=True, _bg=True,
+                       _cwd=suite.suite_work_dir).process
+
+
+class DockerLauncher(Launcher):
+    """Starts suite containers directly with docker run.
+
+    Containers get the same environment variables and /vagrant mount the
+    vagrant launcher provides. Exits of all containers are tracked by a
+    single docker events stream instead of a process per suite.
+    """
+
+    name = 'docker'
+
+    def __init__(self, *args, **kwargs):
+        super(DockerLauncher, self).__init__(*args, **kwargs)
+        self._events = ContainerEvents()
+
+    def start(self, suite):
+        self._events.start()
+        environment = {
+            'TEST_SUITE_NAME': suite.suite_name,
+            'TEST_SUITE': json.dumps(suite.suite_def),
+            'TEST_SUITES_VARIABLES': json.dumps(suite.variables)
+        }
+        environment.update(self.environment)
+        self._events.discard(suite.container_name)
+        args = ['-d',
+                '--name', suite.container_name,
+                '-v', '{0}:/vagrant'.format(suite.suite_work_dir.abspath())]
+        for volume in self._volumes():
+            args += ['-v', volume]
+        for label in self._labels(suite):
+            args += ['--label', label]
+        for key, value in environment.items():
+            args += ['-e', '{0}={1}'.format(key, value)]
+        docker.run(*(args + [suite.image or self.image,
+                             '/vagrant/suite_runner.sh'])).wait()
+        return ContainerProcess(suite.container_name, self._events)
+
+    def close(self):
+        self._events.stop()
+
+
+class ContainerEvents(object):
+    """Tracks container exits using a single docker events stream."""
+
+    _name_pattern = re.compile(r'name=([^,)\s]+)')
+
+    def __init__(self):
+        self._process = None
+        self._exited = set()
+        self._condition = threading.Condition()
+
+    @property
+    def is_alive(self):
+        return (self._process is not None and
+                self._process.process.is_alive())
+
+    def start(self):
+        with self._condition:
+            if self._process is None:
+                self._process = sh.docker.events(filter='event=die',
+                                                 _out=self._on_event,
+                                                 _bg=True)
+
+    def stop(self):
+        with self._condition:
+            if self.is_alive:
+                try:
+                    self._process.terminate()
+                except OSError:
+                    pass
+            self._process = None
+
+    def has_exited(self, container_name):
+        with self._condition:
+            return container_name in self._exited
+
+    def discard(self, container_name):
+        """Forgets a previous exit of a container about to be started."""
+        with self._condition:
+            self._exited.discard(container_name)
+
+    def wait(self, container_name, timeout):
+        with self._condition:
+            if container_name not in self._exited:
+                self._condition.wait(timeout)
+            return container_name in self._exited
+
+    def _on_event(self, line):
+        match = self._name_pattern.search(line)
+        if not match:
+            return
+        with self._condition:
+            self._exited.add(match.group(1))
+            self._condition.notify_all()
+
+
+class ContainerProcess(object):
+    """Process-like handle of a suite container started by DockerLauncher.
+
+    Exits reported by the shared events stream are taken as is, otherwise
+    the container state is read with docker inspect, so that exits missed
+    by the stream are still noticed on the next check.
+    """
+
+    def __init__(self, container_name, events):
+        self._container_name = container_name
+        self._events = events
+
+    def is_alive(self):
+        if self._events.has_exited(self._container_name):
+            return False
+        return self._inspect_running()
+
+    def wait(self):
+        while self.is_alive():
+            self._events.wait(self._container_name,
+                              timeout=CONTAINER_POLL_INTERVAL)
+
+    def _inspect_running(self):
+        try:
+            return sh.docker.inspect(
+                '-f', '{{.State.Running}}',
+                self._container_name).stdout.strip() == 'true'
+        except sh.ErrorReturnCode:
+            return False
+
+
+class RemoteLauncher(Launcher):
+    """Starts suites on suites workers, possibly running on other hosts.
+
+    Suites are started on the worker running the least suites of this
+    launcher. Exit codes, logs and xunit reports of suites are read back
+    from the worker that runs them.
+
+    :param workers: worker clients, see helpers.workers.WorkerClient.
+    """
+
+    name = 'remote'
+    local = False
+
+    def __init__(self, workers, *args, **kwargs):
+        super(RemoteLauncher, self).__init__(*args, **kwargs)
+        if not workers:
+            raise ValueError('Remote launcher requires at least one worker')
+        self._workers = workers
+        self._assignments = {}
+        self._lock = threading.Lock()
+        # repositories workers refresh their git mirrors of once per run
+        self.repos = []
+        self._suite_files = None
+
+    def prepare(self, suite):
+        # the suite environment is created by the worker, only reports
+        # are copied back to the coordinator
+        suite.suite_reports_dir.makedirs_p()
+
+    def start(self, suite):
+        with self._lock:
+            loads = dict((id(w), 0) for w in self._workers)
+            for assigned in self._assignments.values():
+                loads[id(assigned)] += 1
+            worker = min(self._workers, key=lambda w: loads[id(w)])
+            self._assignments[suite.suite_name] = worker
+            # workers run suites with the suite files of the coordinator
+            if self._suite_files is None:
+                self._suite_files = archive_suite_files()
+        logger.info('Starting suite: {0} on worker: {1}'.format(
+            suite.suite_name, worker))
+        worker.start(suite.suite_name, suite.suite_def, suite.variables,
+                     run_id=self.run_id,
+                     repos=self.repos,
+                     files=self._suite_files)
+        return RemoteProcess(worker, suite.suite_name)
+
+    def stop(self, suite):
+        self._worker(suite).stop(suite.suite_name)
+
+    def exit_code(self, suite):
+        return self._worker(suite).exit_code(suite.suite_name)
+
+    def logs(self, suite):
+        return self._worker(suite).logs(suite.suite_name)
+
+    def results(self, suite, offset):
+        return self._worker(suite).results(suite.suite_name, offset)
+
+    def collect_reports(self, suite):
+        reports = self._worker(suite).reports(suite.suite_name)
+        for report_name, content in reports.items():
+            (suite.suite_reports_dir / path(report_name).name).write_text(
+                content, encoding='utf-8')
+
+    def remove(self, suite):
+        try:
+            self._worker(suite).remove(suite.suite_name)
+        finally:
+            with self._lock:
+                self._assignments.pop(suite.suite_name, None)
+
+    def close(self):
+        """Remove the suites of the run still on workers."""
+        with self._lock:
+            assignments = self._assignments.items()
+            self._assignments.clear()
+        for suite_name, worker in assignments:
+            logger.info('Removing suite: {0} from worker: {1}'.format(
+                suite_name, worker))
+            try:
+                worker.remove(suite_name)
+            except Exception as e:
+                logger.error('Failed removing suite: {0} from worker: {1} - '
+                             'error: {2}'.format(suite_name, worker, str(e)))
+
+    def _worker(self, suite):
+        with self._lock:
+            return self._assignments[suite.suite_name]
+
+
+class RemoteProcess(object):
+    """Process-like handle of a suite started by RemoteLauncher.
+
+    A suite is considered running while requests to its worker fail, until
+    WORKER_REQUEST_RETRIES requests failed in a row.
+    """
+
+    def __init__(self, worker, suite_name,
+                 retry_interval=CONTAINER_POLL_INTERVAL):
+        self._worker = worker
+        self._suite_name = suite_name
+        self._retry_interval = retry_interval
+        self._running = True
+        self._failures = 0
+
+    def is_alive(self):
+        if self._running:
+            self._running = self._wait(timeout=0)
+        return self._running
+
+    def wait(self):
+        while self._running:
+            self._running = self._wait(timeout=CONTAINER_POLL_INTERVAL,
+                                       retry_interval=self._retry_interval)
+
+    def _wait(self, timeout, retry_interval=0):
+        try:
+            running = self._worker.wait(self._suite_name,
+                                        timeout=timeout)['running']
+        except (requests.RequestException, WorkerError) as e:
+            self._failures += 1
+            if self._failures >= WORKER_REQUEST_RETRIES:
+                logger.error('Suite: {0} is considered exited, worker: {1} '
+                             'failed {2} requests in a row - error: {3}'
+                             .format(self._suite_name, self._worker,
+                                     self._failures, str(e)))
+                return False
+            logger.warn('Failed reading state of suite: {0} from worker: '
+                        '{1} - error: {2}'.format(self._suite_name,
+                                                  self._worker, str(e)))
+            time.sleep(retry_interval)
+            return True
+        self._failures = 0
+        return running
 
 
 class TestSuite(object):
-    def __init__(self, suite_name, suite_def, suite_work_dir, variables):
+    def __init__(self,
+                 suite_name,
+                 suite_def,
+                 suite_work_dir,
+                 variables,
+                 launcher=None):
         self.suite_name = suite_name
         self.container_name = '{0}_{1}'.format(os.getpid(), self.suite_name)
         self.suite_def = suite_def
         self.suite_work_dir = suite_work_dir
         self.suite_reports_dir = suite_work_dir / 'xunit-reports'
         self.variables = variables
+        self.launcher = launcher or VagrantLauncher()
         self._handler_configuration_def = None
         self.process = None
         self.started = None
         self.terminated = None
+        self.starting = False
+        self.launch_error = None
         self.timed_out = False
         self.failed = False
         self.exit_code = None
+        self.exit_callback = None
+        self.xunit_reports = []
+        # reason the suite was cancelled by a cancellation policy
+        self.cancelled = None
+        self.failed_before_tests = False
+        # test results streamed by the suite so far
+        self.results = []
+        self._results_offset = 0
+        self._results_lock = threading.Lock()
+        # suite files sent by a coordinator, see archive_suite_files, the
+        # files of the suites directory are used when not given
+        self.suite_files = None
+        # image of the suite container, the launcher's image when not given
+        self.image = None
+        self.timeline = Timeline(suite_name)
+        self.created = time.time()
+        self.exited = None
+        self._running_since = None
 
     @property
     def descriptor(self):
@@ -85,16 +545,33 @@ class TestSuite(object):
     def handler_configuration(self, (config_name, config_def)):
         self.suite_def['handler_configuration'] = config_name
         self._handler_configuration_def = config_def
+        if config_def.get('capacity', 1) > 1 and not self.exclusive:
+            # other suites may run on the environment at the same time, the
+            # resources of the suite are told apart by their prefix
+            self.suite_def.setdefault('resources_prefix', 's{0}-'.format(
+                uuid.uuid4().hex[:6]))
 
     @property
     def requires(self):
         return self.suite_def.get('requires', [])
 
+    @property
+    def exclusive(self):
+        return self.suite_def.get('exclusive', False)
+
+    @property
+    def shard(self):
+        return self.suite_def.get('shard')
+
+    @property
+    def unsharded_name(self):
+        return self.shard['suite'] if self.shard else self.suite_name
+
     @property
     def running_time(self):
-        if self.terminated:
+        if self.terminated is not None:
             return self.terminated - self.started
-        elif self.started:
+        elif self.started is not None:
             return time.time() - self.started
         else:
             return 0
@@ -102,25 +579,10 @@ class TestSuite(object):
     def create_env(self):
         self.suite_work_dir.makedirs()
         self.suite_reports_dir.makedirs()
-        vagrant_file_template = path('Vagrantfile.template').text()
-        vagrant_file_content = jinja2.Template(vagrant_file_template).render({
-            'suite_name': self.suite_name,
-            'container_name': self.container_name,
-            'suite': json.dumps(self.suite_def),
-            'variables': json.dumps(self.variables)
-        })
-        path(self.suite_work_dir / 'Vagrantfile').write_text(
-            vagrant_file_content)
-        files_to_copy = [
-            'Dockerfile',
-            'suite_runner.py',
-            'suite_runner.sh',
-            'requirements.txt',
-            'wheel-requirements.txt',
-            'suites',
-            'helpers',
-            'configurations']
-        for file_name in files_to_copy:
+        if self.suite_files:
+            extract_suite_files(self.suite_files, self.suite_work_dir)
+            return
+        for file_name in SUITE_FILES:
             if os.path.isdir(file_name):
                 shutil.copytree(file_name, os.path.join(self.suite_work_dir,
                                                         file_name))
@@ -133,25 +595,42 @@ class TestSuite(object):
         return self.process is not None and self.process.is_alive()
 
     def run(self):
+        self.timeline.add('queued', self.created, time.time())
         logger.info('Creating environment for suite: {0}'.format(
             self.suite_name))
-        self.create_env()
-        logger.info('Starting suite in docker container: {0}'.format(
-            self.suite_name))
-        cwd = path.getcwd()
-        try:
-            os.chdir(self.suite_work_dir)
-            vagrant.up().wait()
-            self.process = vagrant('docker-logs', f=True, _bg=True).process
-        finally:
-            os.chdir(cwd)
+        with self.timeline.phase('prepare'):
+            self.launcher.prepare(self)
+        logger.info('Starting suite in docker container: {0} [launcher={1}]'
+                    .format(self.suite_name, self.launcher.name))
+        with self.timeline.phase('start', launcher=self.launcher.name):
+            self.process = self.launcher.start(self)
+        self._running_since = time.time()
+        self._watch_exit()
+
+    def _watch_exit(self):
+        process = self.process
+
+        def wait_for_exit():
+            try:
+                process.wait()
+            except Exception:
+                pass
+            self.exited = time.time()
+            self._notify_exit()
+        thread = threading.Thread(target=wait_for_exit)
+        thread.daemon = True
+        thread.start()
+
+    def _notify_exit(self):
+        if self.exit_callback:
+            self.exit_callback(self)
 
     def terminate(self):
         logger.warn('Terminating suite: {0}'.format(self.suite_name))
         try:
             logger.info('Stopping docker container: {0}'.format(
                 self.container_name))
-            docker.stop(self.container_name).wait()
+            self.launcher.stop(self)
             logger.info('Docker container stopped: {0}'.format(
                 self.container_name))
         except Exception as e:
@@ -160,72 +639,178 @@ class TestSuite(object):
 
     def kill(self):
         try:
-            kill_container(self.container_name)
+            self.launcher.remove(self)
         except Exception as e:
             logger.error('Error on suite kill [suite={0}, error'
                          '={1}]'.format(self.container_name, str(e)))
 
     @staticmethod
     def after_suite(suite):
-        # timeout out, need to terminate
-        if suite.timed_out:
-            suite.terminate()
+        timeline = suite.timeline
+        if suite.process is None and suite.cancelled:
+            # cancelled before it was launched
+            suite.xunit_reports = suite.copy_xunit_reports()
+            suite.write_timeline()
+            return
+        if suite._running_since:
+            timeline.add('running', suite._running_since,
+                         suite.exited or time.time())
+        # timeout out or cancelled, need to terminate
+        if suite.timed_out or suite.cancelled:
+            with timeline.phase('terminate'):
+                suite.terminate()
+        elif suite.launch_error:
+            suite.failed = True
         else:
-            suite.exit_code = int(
-                sh.docker.wait(suite.container_name).strip())
+            try:
+                with timeline.phase('exit_code'):
+                    suite.exit_code = suite.launcher.exit_code(suite)
+            except Exception as e:
+                logger.error('Error reading exit code [suite={0}, error'
+                             '={1}]'.format(suite.suite_name, str(e)))
+                suite.failed = True
             if suite.exit_code:
                 suite.failed = True
-        suite.copy_xunit_reports()
-        # kill removes the container so it should be called after exit code
-        # is extracted and xunit reports are generated
-        suite.kill()
+        try:
+            with timeline.phase('collect_reports'):
+                suite.launcher.collect_reports(suite)
+        except Exception as e:
+            logger.error('Error collecting xunit reports [suite={0}, error'
+                         '={1}]'.format(suite.suite_name, str(e)))
+        try:
+            with timeline.phase('copy_xunit_reports'):
+                suite.xunit_reports = suite.copy_xunit_reports()
+        finally:
+            # kill removes the container so it should be called after exit
+            # code is extracted and xunit reports are generated
+            with timeline.phase('remove'):
+                suite.kill()
+        suite.write_timeline()
+
+    def poll_results(self):
+        """Read the test results streamed by the suite since the last poll
+        and return them."""
+        with self._results_lock:
+            try:
+                results, self._results_offset = self.launcher.results(
+                    self, self._results_offset)
+            except Exception as e:
+                logger.warn('Failed reading results of suite: {0} - '
+                            'error: {1}'.format(self.suite_name, str(e)))
+                return []
+            self.results += results
+            return results
+
+    def write_timeline(self):
+        """Write the suite timeline, including the phases recorded in the
+        suite container, to the timelines dir."""
+        if self._handler_configuration_def:
+            self.timeline.env = self._handler_configuration_def['env']
+        self.timeline.load(self.suite_reports_dir / SUITE_TIMELINE_FILE)
+        if timelines_dir.isdir():
+            self.timeline.write(timelines_dir / '{0}.json'.format(
+                self.suite_name))
 
     def copy_xunit_reports(self):
+        """Copy the suite reports to the reports dir and return the paths
+        of the copies."""
+        if self.cancelled:
+            reports = []
+            if self.process is not None:
+                # reports of the tests that ran before the suite was
+                # cancelled are kept, as for timed out suites
+                report_files = self.suite_reports_dir.files('*.xml')
+                reports = self._copy_reports(
+                    report_files + self._write_streamed_reports(report_files))
+            return reports + self._generate_custom_xunit_report(
+                'Suite {0} was cancelled: {1}'.format(self.descriptor,
+                                                      self.cancelled),
+                error_type='TestSuiteCancelled',
+                error_message=self.cancelled,
+                fetch_logs=self.process is not None,
+                skipped=True)
+        if self.launch_error:
+            # the suite container may not exist, it has no logs to read
+            return self._generate_custom_xunit_report(
+                'Suite {0} failed to launch: {1}'.format(self.descriptor,
+                                                         self.launch_error),
+                error_type='TestSuiteLaunchError',
+                error_message='Test suite failed to launch',
+                fetch_logs=False)
         report_files = self.suite_reports_dir.files('*.xml')
+        if self.timed_out or not report_files:
+            report_files += self._write_streamed_reports(report_files)
         if self.timed_out:
-            self._generate_custom_xunit_report(
-                'Suite {0} timed out after {1} seconds.'.format(
+            return self._copy_reports(report_files) + \
+                self._generate_custom_xunit_report(
+                    'Suite {0} timed out after {1} seconds.'.format(
                         self.descriptor, self.running_time),
-                error_type='TestSuiteTimeout',
-                error_message='Test suite timed out')
+                    error_type='TestSuiteTimeout',
+                    error_message='Test suite timed out')
         elif not report_files:
-            self._generate_custom_xunit_report(
+            self.failed_before_tests = True
+            return self._generate_custom_xunit_report(
                 'Suite {0} has encountered an error before tests ran.'.format(
                         self.descriptor),
                 error_type='TestSuiteSkipped',
                 error_message='Test suite skipped')
         else:
-            import lxml.etree as et
-            logger.info('Suite [{0}] reports: {1}'.format(
-                    self.suite_name, [r.name for r in report_files]))
-            # adding suite name as a prefix to each test in each report
-            parser = et.XMLParser(strip_cdata=False)
-            for report in report_files:
-                root = et.parse(report.realpath(), parser)
-                test_elements = root.findall('testcase')
-                for test in test_elements:
-                    test_name = test.get('name')
-                    test.set('name', '{0} @ {1}'.format(test_name,
-                                                        self.suite_name))
-                tmp_file = tempfile.NamedTemporaryFile()
-                tmp_file.write(et.tostring(root, pretty_print=True))
-                # flushing remaining text in buffer before closing the file
-                tmp_file.flush()
-                shutil.copy(tmp_file.name, reports_dir / report.name)
-                tmp_file.close()
+            return self._copy_reports(report_files)
+
+    def _copy_reports(self, report_files):
+        logger.info('Suite [{0}] reports: {1}'.format(
+                self.suite_name, [r.name for r in report_files]))
+        copies = []
+        # adding suite name as a suffix to each test in each report
+        for report in report_files:
+            copy = reports_dir / report.name
+            xunit_reports.rewrite_report(report.realpath(),
+                                         copy,
+                                         self.suite_name)
+            copies.append(copy)
+        return copies
+
+    def _write_streamed_reports(self, report_files):
+        """Write reports of the test groups that streamed results but were
+        killed before writing their reports, and return their paths."""
+        self.poll_results()
+        # processes of a test group may have written their own reports
+        run_tests = set(xunit_reports.test_key(testcase)
+                        for report in report_files
+                        for testcase in xunit_reports.testcases(report))
+        groups = {}
+        for result in self.results:
+            classname, _, name = result['test'].rpartition('.')
+            if (classname, name) not in run_tests:
+                groups.setdefault(result['group'], []).append(result)
+        existing = set(r.name for r in report_files)
+        reports = []
+        for group, results in sorted(groups.items()):
+            report = self.suite_reports_dir / '{0}-{1}-report.xml'.format(
+                self.suite_name, group)
+            if report.name in existing:
+                continue
+            logger.info('Writing report of streamed results of suite: {0}, '
+                        'test group: {1}'.format(self.suite_name, group))
+            results_stream.write_report(results, report, self.suite_name)
+            reports.append(report)
+        return reports
 
     def _generate_custom_xunit_report(self,
                                       text,
                                       error_type,
                                       error_message,
-                                      fetch_logs=True):
+                                      fetch_logs=True,
+                                      skipped=False):
         logger.info('Getting docker logs for container: {0}'.format(
             self.container_name))
+        logs = ''
         if fetch_logs:
-            logs = xunit.xml_safe(sh.docker.logs(
-                self.container_name, _err_to_out=True).strip())
-        else:
-            logs = ''
+            try:
+                logs = xunit.xml_safe(self.launcher.logs(self))
+            except Exception as e:
+                logger.error('Error reading suite logs [suite={0}, error'
+                             '={1}]'.format(self.suite_name, str(e)))
         if self._handler_configuration_def:
             env_id = self._handler_configuration_def['env']
             config = {
@@ -254,6 +839,7 @@ Handler configuration:
             'time': self.running_time,
             'error_type': error_type,
             'error_message': error_message,
+            'skipped': skipped,
             'system_out': logs,
             'system_err': err
         })
@@ -262,33 +848,98 @@ Handler configuration:
         logger.info('Writing xunit report file to: {0}'.format(
             report_file.abspath()))
         report_file.write_text(xunit_file_content, encoding='utf-8')
+        return [report_file]
+
+
+class SuiteShards(object):
+    """Shards of a suite, each shard is a suite that runs part of the suite
+    tests. The xunit reports of all shards are merged into reports of the
+    suite, one for each test group, once every shard has run."""
+
+    def __init__(self, suite_name, count):
+        self.suite_name = suite_name
+        self.count = count
+        self._done = []
+
+    @staticmethod
+    def shard_name(suite_name, index):
+        return '{0}_shard_{1}'.format(suite_name, index + 1)
+
+    def create_shards(self, suite_def, envs_dir, variables, launcher):
+        shards = []
+        for index in range(self.count):
+            shard_def = dict(suite_def, shard={'suite': self.suite_name,
+                                               'index': index,
+                                               'count': self.count,
+                                               'durations': {}})
+            shard_def.pop('shards')
+            shard_name = self.shard_name(self.suite_name, index)
+            shards.append(TestSuite(suite_name=shard_name,
+                                    suite_def=shard_def,
+                                    suite_work_dir=envs_dir / shard_name,
+                                    variables=variables,
+                                    launcher=launcher))
+        return shards
+
+    def shard_done(self, suite):
+        self._done.append(suite)
+        if len(self._done) < self.count:
+            return
+        # shard reports are named <shard name>-<test group>-report.xml
+        groups = {}
+        for shard in self._done:
+            for shard_report in shard.xunit_reports:
+                report_name = path(shard_report).name[
+                    len(shard.suite_name) + 1:]
+                groups.setdefault(report_name, []).append(shard_report)
+        for report_name, shard_reports in sorted(groups.items()):
+            report_path = reports_dir / '{0}-{1}'.format(self.suite_name,
+                                                         report_name)
+            logger.info('Merging xunit reports of {0} shards into: {1}'
+                        .format(self.suite_name, report_path))
+            xunit_reports.merge_reports(shard_reports, report_path,
+                                        name=self.suite_name)
+            for shard_report in shard_reports:
+                path(shard_report).remove_p()
 
 
 class Environments(object):
+    """Environment locks counted in slots.
+
+    An environment with a capacity of N slots can host up to N suites at
+    the same time. A suite that requires an environment exclusively locks
+    all of its slots.
+    """
 
-    def lock(self, env_id):
+    def lock(self, env_id, slots=1, capacity=1):
         raise NotImplementedError()
 
-    def release(self, env_id):
+    def release(self, env_id, slots=1):
         raise NotImplementedError()
 
     def prune(self, include_self=False):
         pass
 
+    def close(self):
+        pass
+
 
 class InMemoryEnvironments(Environments):
 
     def __init__(self):
-        self._locked_envs = set()
+        self._locked_slots = {}
 
-    def lock(self, env_id):
-        if env_id in self._locked_envs:
+    def lock(self, env_id, slots=1, capacity=1):
+        locked_slots = self._locked_slots.get(env_id, 0)
+        if locked_slots + slots > capacity:
             return False
-        self._locked_envs.add(env_id)
+        self._locked_slots[env_id] = locked_slots + slots
         return True
 
-    def release(self, env_id):
-        self._locked_envs.remove(env_id)
+    def release(self, env_id, slots=1):
+        self._locked_slots[env_id] -= slots
+        if self._locked_slots[env_id] <= 0:
+            del self._locked_slots[env_id]
 
 
 class FileEnvironments(Environments):
@@ -298,24 +949,32 @@ class FileEnvironments(Environments):
         self._locked_environments_lock = fasteners.InterProcessLock(
             '{}.lock'.format(locked_environments_path))
 
-    def lock(self, env_id):
+    def lock(self, env_id, slots=1, capacity=1):
         with self._update() as locked_environments:
-            if env_id in locked_environments:
+            pids = locked_environments.get(env_id, [])
+            if len(pids) + slots > capacity:
                 return False
-            locked_environments[env_id] = os.getpid()
+            locked_environments[env_id] = pids + [os.getpid()] * slots
             return True
 
-    def release(self, env_id):
+    def release(self, env_id, slots=1):
         with self._update() as locked_environments:
-            del locked_environments[env_id]
+            pids = locked_environments[env_id]
+            for _ in range(slots):
+                pids.remove(os.getpid())
+            if not pids:
+                del locked_environments[env_id]
 
     def prune(self, include_self=False):
         with self._update() as locked_environments:
             current_pid = os.getpid()
             for k in locked_environments.keys():
-                pid = locked_environments[k]
-                if ((include_self and current_pid == pid) or
-                        not is_pid_of_suites_runner(pid)):
+                pids = [pid for pid in locked_environments[k]
+                        if not ((include_self and current_pid == pid) or
+                                not is_pid_of_suites_runner(pid))]
+                if pids:
+                    locked_environments[k] = pids
+                else:
                     del locked_environments[k]
 
     @contextmanager
@@ -326,11 +985,386 @@ class FileEnvironments(Environments):
                     locked_environments = json.load(f)
             else:
                 locked_environments = {}
+            # environments used to be locked by a single pid
+            for k, v in locked_environments.items():
+                if not isinstance(v, list):
+                    locked_environments[k] = [v]
             yield locked_environments
             with open(self._locked_environments_path, 'w') as f:
                 json.dump(locked_environments, f)
 
 
+class SqliteEnvironments(Environments):
+    """Environment locks stored as leases in an SQLite database, one lease
+    per locked slot of an environment.
+
+    A lease expires unless its owner renews it, which a heartbeat thread
+    does for all leases of this process, so environments of a crashed
+    runner become available once its leases expire. Every lock and release
+    is recorded in a lease history table.
+    """
+
+    def __init__(self,
+                 db_path,
+                 lease_ttl=LEASE_TTL,
+                 heartbeat_interval=LEASE_HEARTBEAT_INTERVAL):
+        self._db_path = db_path
+        self._lease_ttl = lease_ttl
+        self._heartbeat_interval = heartbeat_interval
+        self._hostname = socket.gethostname()
+        self._heartbeat_thread = None
+        self._heartbeat_stopped = threading.Event()
+        with self._transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS leases ('
+                         'env_id TEXT NOT NULL, '
+                         'slot INTEGER NOT NULL, '
+                         'owner TEXT NOT NULL, '
+                         'hostname TEXT NOT NULL, '
+                         'pid INTEGER NOT NULL, '
+                         'acquired REAL NOT NULL, '
+                         'expires REAL NOT NULL, '
+                         'PRIMARY KEY (env_id, slot))')
+            conn.execute('CREATE TABLE IF NOT EXISTS lease_history ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'env_id TEXT NOT NULL, '
+                         'owner TEXT NOT NULL, '
+                         'event TEXT NOT NULL, '
+                         'timestamp REAL NOT NULL)')
+
+    @property
+    def owner(self):
+        # evaluated lazily so forked processes get their own identity
+        return '{0}:{1}'.format(self._hostname, os.getpid())
+
+    def lock(self, env_id, slots=1, capacity=1):
+        now = time.time()
+        with self._transaction() as conn:
+            taken = set(row[0] for row in conn.execute(
+                'SELECT slot FROM leases WHERE env_id = ? AND expires > ?',
+                (env_id, now)).fetchall())
+            free = [slot for slot in range(capacity) if slot not in taken]
+            locked = len(taken) + slots <= capacity
+            if locked:
+                # expired leases of free slots are replaced
+                conn.executemany(
+                    'INSERT OR REPLACE INTO leases '
+                    '(env_id, slot, owner, hostname, pid, acquired, expires) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(env_id, slot, self.owner, self._hostname, os.getpid(),
+                      now, now + self._lease_ttl) for slot in free[:slots]])
+                self._record(conn, env_id, self.owner, 'lock', now)
+        if locked:
+            self._start_heartbeat()
+        return locked
+
+    def release(self, env_id, slots=1):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'DELETE FROM leases WHERE rowid IN ('
+                'SELECT rowid FROM leases WHERE env_id = ? AND owner = ? '
+                'ORDER BY slot DESC LIMIT ?)',
+                (env_id, self.owner, slots))
+            if cursor.rowcount:
+                self._record(conn, env_id, self.owner, 'release')
+
+    def prune(self, include_self=False):
+        now = time.time()
+        with self._transaction() as conn:
+            leases = conn.execute(
+                'SELECT env_id, slot, owner, hostname, pid, expires '
+                'FROM leases').fetchall()
+            for env_id, slot, owner, hostname, pid, expires in leases:
+                if expires <= now:
+                    event = 'expire'
+                elif include_self and owner == self.owner:
+                    event = 'prune'
+                elif hostname == self._hostname and not _is_pid_alive(pid):
+                    event = 'prune'
+                else:
+                    continue
+                conn.execute('DELETE FROM leases WHERE env_id = ? AND '
+                             'slot = ?', (env_id, slot))
+                self._record(conn, env_id, owner, event, now)
+
+    def heartbeat(self):
+        with self._transaction() as conn:
+            conn.execute('UPDATE leases SET expires = ? WHERE owner = ?',
+                         (time.time() + self._lease_ttl, self.owner))
+
+    def history(self, env_id=None, limit=100):
+        query = 'SELECT env_id, owner, event, timestamp FROM lease_history'
+        params = []
+        if env_id:
+            query += ' WHERE env_id = ?'
+            params.append(env_id)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        conn = self._connect()
+        try:
+            return [dict(zip(('env_id', 'owner', 'event', 'timestamp'), row))
+                    for row in conn.execute(query, params).fetchall()]
+        finally:
+            conn.close()
+
+    def close(self):
+        self._heartbeat_stopped.set()
+
+    def _start_heartbeat(self):
+        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+            return
+
+        def heartbeat_loop():
+            while not self._heartbeat_stopped.wait(self._heartbeat_interval):
+                try:
+                    self.heartbeat()
+                except sqlite3.Error as e:
+                    logger.error('Environments heartbeat failed: {0}'
+                                 .format(str(e)))
+        self._heartbeat_thread = threading.Thread(target=heartbeat_loop)
+        self._heartbeat_thread.daemon = True
+        self._heartbeat_thread.start()
+
+    @staticmethod
+    def _record(conn, env_id, owner, event, timestamp=None):
+        conn.execute('INSERT INTO lease_history '
+                     '(env_id, owner, event, timestamp) VALUES (?, ?, ?, ?)',
+                     (env_id, owner, event, timestamp or time.time()))
+
+    def _connect(self):
+        # autocommit mode, transactions are started explicitly
+        return sqlite3.connect(self._db_path, timeout=60,
+                               isolation_level=None)
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+
+class ImageCache(object):
+    """Last use times of content hash tagged docker images, shared by all
+    suites runners on a host. Used to evict the least recently used images.
+    """
+
+    def __init__(self, images_path, max_images=MAX_CACHED_IMAGES):
+        self._images_path = images_path
+        self._images_lock = fasteners.InterProcessLock(
+            '{}.lock'.format(images_path))
+        self._max_images = max_images
+
+    def touch(self, tag, in_use=None):
+        """Mark tag as used and return the tags that should be evicted.
+
+        :param in_use: function telling whether a tag is used by containers,
+                       tags in use are kept until they are no longer used.
+        """
+        with self._update() as images:
+            images[tag] = time.time()
+            tags = sorted(images, key=lambda x: images[x], reverse=True)
+            evicted = [t for t in tags[self._max_images:]
+                       if not (in_use and in_use(t))]
+            for evicted_tag in evicted:
+                del images[evicted_tag]
+        return evicted
+
+    @contextmanager
+    def _update(self):
+        with self._images_lock:
+            if os.path.exists(self._images_path):
+                with open(self._images_path, 'r') as f:
+                    images = json.load(f)
+            else:
+                images = {}
+            yield images
+            with open(self._images_path, 'w') as f:
+                json.dump(images, f)
+
+
+class GitMirrors(object):
+    """Bare mirrors of git repositories that suite containers clone from.
+
+    Mirrors are laid out as <mirrors_dir>/<organization>/<repo>.git and are
+    shared by all suites runners on a host.
+    """
+
+    def __init__(self, mirrors_dir):
+        self.mirrors_dir = path(mirrors_dir)
+
+    def mirror_path(self, organization, repo):
+        return self.mirrors_dir / organization / '{0}.git'.format(repo)
+
+    def refresh(self, repos):
+        for organization, repo in sorted(set(repos)):
+            mirror = self.mirror_path(organization, repo)
+            url = 'https://github.com/{0}/{1}'.format(organization, repo)
+            mirror.dirname().makedirs_p()
+            try:
+                with fasteners.InterProcessLock('{0}.lock'.format(mirror)):
+                    if mirror.isdir():
+                        logger.info('Updating git mirror: {0}'.format(mirror))
+                        git('--git-dir', mirror, 'remote', 'update',
+                            '--prune').wait()
+                    else:
+                        logger.info('Creating git mirror of {0}: {1}'.format(
+                            url, mirror))
+                        git.clone('--mirror', url, mirror).wait()
+                        # containers use the mirror objects directly so they
+                        # should never be garbage collected
+                        git('--git-dir', mirror, 'config', 'gc.auto',
+                            '0').wait()
+            except sh.ErrorReturnCode as e:
+                logger.warn('Failed refreshing git mirror of {0}, suites '
+                            'will clone it from the network - error: {1}'
+                            .format(url, e.stderr.strip()))
+                if mirror.isdir() and not (mirror / 'HEAD').isfile():
+                    mirror.rmtree_p()
+
+
+class ResultsMonitor(object):
+    """Polls the test results streamed by running suites, logs them and
+    appends them to the live results file of the run."""
+
+    def __init__(self, test_suites, results_path,
+                 poll_interval=RESULTS_POLL_INTERVAL):
+        self._test_suites = test_suites
+        self._results_path = results_path
+        self._poll_interval = poll_interval
+        self._thread = None
+        self._stopped = threading.Event()
+        self._write_lock = threading.Lock()
+
+    def start(self):
+        def poll_loop():
+            while not self._stopped.wait(self._poll_interval):
+                for suite in self._test_suites:
+                    if suite.process is not None and \
+                            suite.terminated is None and not suite.starting:
+                        self.poll(suite)
+        self._thread = threading.Thread(target=poll_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def poll(self, suite):
+        results = suite.poll_results()
+        for result in results:
+            if result['outcome'] == 'started':
+                continue
+            message = 'Suite [{0}] test {1}: {2} ({3:.1f} seconds)'.format(
+                suite.suite_name, result['test'], result['outcome'],
+                result.get('duration', 0))
+            if result['outcome'] in ('failed', 'error'):
+                logger.warn(message)
+            else:
+                logger.info(message)
+        if results:
+            with self._write_lock:
+                with open(self._results_path, 'a') as f:
+                    for result in results:
+                        f.write(json.dumps(dict(result,
+                                                suite=suite.suite_name)))
+                        f.write('\n')
+        return results
+
+
+class Clock(object):
+    """Time source of the scheduler, replaced by a simulated clock when
+    scheduling is simulated."""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, events, timeout):
+        """Wait up to timeout seconds for events and consume all of them."""
+        try:
+            events.get(timeout=timeout)
+            while True:
+                events.get_nowait()
+        except Queue.Empty:
+            pass
+
+
+class CancellationPolicy(object):
+    """Decides when remaining suites of a run are cancelled.
+
+    Policies are notified of every suite that ends and asked whether each
+    remaining suite should be cancelled. Waiting suites are cancelled before
+    they lock an environment, running suites are only cancelled by policies
+    that terminate running suites.
+    """
+
+    terminates_running = False
+
+    def suite_ended(self, suite):
+        pass
+
+    def cancel_reason(self, suite, configurations):
+        """Reason to cancel a suite that may use the given handler
+        configurations, None if it should run."""
+        return None
+
+
+class HandlerBootstrapFailures(CancellationPolicy):
+    """Cancel the suites of a handler after max_failures suites using the
+    handler failed before their tests ran, usually on bootstrap."""
+
+    def __init__(self, max_failures):
+        self.max_failures = max_failures
+        self._failures = {}
+
+    def suite_ended(self, suite):
+        if suite.failed_before_tests and suite._handler_configuration_def:
+            handler = suite._handler_configuration_def.get('handler')
+            self._failures[handler] = self._failures.get(handler, 0) + 1
+
+    def cancel_reason(self, suite, configurations):
+        handlers = set(c.get('handler') for c in configurations.values())
+        if handlers and all(self._failures.get(h, 0) >= self.max_failures
+                            for h in handlers):
+            return '{0} suites of handler {1} failed before tests ran'.format(
+                self.max_failures, ', '.join(sorted(handlers)))
+        return None
+
+
+class FailureRatio(CancellationPolicy):
+    """Cancel the run, including running suites, once more than max_ratio
+    of at least min_suites ended suites failed."""
+
+    terminates_running = True
+
+    def __init__(self, max_ratio, min_suites=FAILURE_RATIO_MIN_SUITES):
+        self.max_ratio = max_ratio
+        self.min_suites = min_suites
+        self._ended = 0
+        self._failed = 0
+
+    def suite_ended(self, suite):
+        self._ended += 1
+        if suite.failed or suite.timed_out:
+            self._failed += 1
+
+    def cancel_reason(self, suite, configurations):
+        if (self._ended >= self.min_suites and
+                float(self._failed) / self._ended > self.max_ratio):
+            return '{0} of {1} ended suites failed'.format(self._failed,
+                                                           self._ended)
+        return None
+
+
 class SuitesScheduler(object):
     def __init__(self,
                  test_suites,
@@ -339,27 +1373,101 @@ class SuitesScheduler(object):
                  optimize=False,
                  after_suite_callback=None,
                  suite_timeout=-1,
-                 environments=None):
+                 environments=None,
+                 event_driven=False,
+                 launch_workers=None,
+                 history=None,
+                 default_duration=DEFAULT_SUITE_DURATION,
+                 clock=None,
+                 policies=None):
+        self._clock = clock or Clock()
+        self._policies = policies or []
+        self._history = history
+        self._default_duration = default_duration
         self._test_suites = test_suites
         if optimize:
+            # suites with a fixed handler configuration go first and
+            # within each group the longest suites are started first
             self._test_suites = sorted(
                 test_suites,
-                key=lambda x: x.handler_configuration is None)
+                key=lambda x: (x.handler_configuration is None,
+                               -self._estimate(x)))
         self._handler_configurations = handler_configurations
+        self._capacities = self._env_capacities(handler_configurations)
+        self._suite_matches = {}
         self._environments = environments or InMemoryEnvironments()
         self._scheduling_interval = scheduling_interval
         self._after_suite_callback = after_suite_callback
         self._suite_timeout = suite_timeout
+        # when event driven, suites wake the scheduler up as soon as they
+        # exit and the scheduling interval only serves as a safety net
+        self._event_driven = event_driven
+        self._events = Queue.Queue()
+        # when set, suites are launched by a bounded pool of workers so a
+        # slow launch does not block the scheduling loop
+        self._launch_workers = launch_workers
+        self._launch_pool = None
         self._validate()
         self._log_test_suites()
+        if optimize:
+            self._log_predicted_schedule()
         self.timed_out_suites = []
         self.failed_suites = []
+        self.cancelled_suites = []
 
     def _log_test_suites(self):
         output = {x.suite_name: x.suite_def for x in self._test_suites}
         logger.info('SuitesScheduler initialized with the following suites'
                     ':\n{0}'.format(json.dumps(output, indent=2)))
 
+    def _estimate(self, suite):
+        if not self._history:
+            return self._default_duration
+        return self._history.estimate(suite, default=self._default_duration)
+
+    @staticmethod
+    def _env_capacities(handler_configurations):
+        capacities = {}
+        for configuration in handler_configurations.values():
+            env = configuration['env']
+            capacities[env] = max(capacities.get(env, 1),
+                                  configuration.get('capacity', 1))
+        return capacities
+
+    def _slots(self, suite, env):
+        return self._capacities[env] if suite.exclusive else 1
+
+    def _log_predicted_schedule(self):
+        # each slot of an environment is available at its own time
+        slots_available_at = {}
+        lines = []
+        for suite in self._test_suites:
+            envs = self._envs(self._find_matching_handler_configurations(
+                suite))
+            for e in envs:
+                slots_available_at.setdefault(e, [0] * self._capacities[e])
+
+            def available_at(e):
+                if suite.exclusive:
+                    return max(slots_available_at[e])
+                return min(slots_available_at[e])
+            env = min(envs, key=lambda e: (available_at(e), e))
+            estimate = self._estimate(suite)
+            start = available_at(env)
+            slots = slots_available_at[env]
+            if suite.exclusive:
+                slots[:] = [start + estimate] * len(slots)
+            else:
+                slots[slots.index(start)] = start + estimate
+            lines.append('\n\t{0} [env={1}, estimate={2}s, start=+{3}s, '
+                         'finish=+{4}s]'.format(suite.suite_name,
+                                                env,
+                                                int(estimate),
+                                                int(start),
+                                                int(start + estimate)))
+        logger.info('Predicted test suites schedule:{0}'.format(
+            ''.join(lines)))
+
     def _validate(self):
         for suite in self._test_suites:
             if not self._find_matching_handler_configurations(suite):
@@ -369,42 +1477,45 @@ class SuitesScheduler(object):
 
     def run(self):
         logger.info('Test suites scheduler started')
+        if self._launch_workers:
+            self._launch_pool = ThreadPool(self._launch_workers)
+        try:
+            self._run()
+        finally:
+            if self._launch_pool:
+                self._launch_pool.close()
+                self._launch_pool.join()
+                self._launch_pool = None
+        logger.info('Test suites scheduler stopped')
+
+    def _run(self):
         suites_list = self._test_suites
         while len(suites_list) > 0:
-            logger.info('Current suites in scheduler: {0}'.format(
-                ', '.join(
-                    ['{0} [started={1}]'.format(
-                        s.suite_name,
-                        s.started is not None) for s in suites_list])))
+            if logger.isEnabledFor(logging.INFO):
+                logger.info('Current suites in scheduler: {0}'.format(
+                    ', '.join(
+                        ['{0} [started={1}, starting={2}]'.format(
+                            s.suite_name,
+                            s.started is not None,
+                            s.starting) for s in suites_list])))
             remaining_suites = []
+            waiting_suites = []
             for suite in suites_list:
                 logger.info('Processing suite: {0}'.format(suite.suite_name))
-                # Run suite
-                if not suite.started:
-                    matches = self._find_matching_handler_configurations(suite)
-                    config_names = matches.keys()
-                    random.shuffle(config_names)
-                    logger.info(
-                        'Matching handler configurations for {0} are: {1}'
-                        .format(suite.suite_name, ', '.join(config_names)))
-                    for name in config_names:
-                        configuration = matches[name]
-                        if self._environments.lock(configuration['env']):
-                            suite.handler_configuration = (name,
-                                                           configuration)
-                            suite.started = time.time()
-                            logger.info(
-                                'Suite {0} will run using handler '
-                                'configuration: {1}'.format(
-                                        suite.suite_name,
-                                        suite.handler_configuration))
-                            suite.run()
-                            break
-                    else:
-                        logger.info(
-                            'All matching handler configurations for {0} '
-                            'are currently taken'.format(suite.suite_name))
+                # Suite is waiting for a handler configuration
+                if suite.started is None:
+                    waiting_suites.append(suite)
                     remaining_suites.append(suite)
+                # Suite is being launched, it is handled once launch ends
+                # even if it timed out, so its environment is not released
+                # while the launch may still start tests on it
+                elif suite.starting:
+                    if not suite.timed_out and self._timed_out(suite):
+                        self._time_out(suite)
+                    remaining_suites.append(suite)
+                # Suite timed out while being launched
+                elif suite.timed_out:
+                    self._after_suite(suite)
                 # Suite terminated
                 elif not suite.is_running:
                     logger.info(
@@ -413,28 +1524,219 @@ class SuitesScheduler(object):
                     if suite.failed:
                         self.failed_suites.append(suite)
                 # Suite timed out
-                elif self._suite_timeout != -1 \
-                        and suite.running_time > self._suite_timeout:
-                    self.timed_out_suites.append(suite)
-                    suite.timed_out = True
-                    config = self._handler_configurations[
-                        suite.handler_configuration]
-                    logger.warn(
-                        'Suite timed out: {0} [handler_configuration={1}, '
-                        'suite_running_time={2}s]'.format(
-                            suite.suite_name,
-                            config,
-                            int(suite.running_time)))
+                elif self._timed_out(suite):
+                    self._time_out(suite)
                     self._after_suite(suite)
                 # Suite is running
                 else:
                     remaining_suites.append(suite)
+            if self._policies:
+                for suite in self._cancel_suites(remaining_suites):
+                    remaining_suites.remove(suite)
+                    if suite in waiting_suites:
+                        waiting_suites.remove(suite)
+            # Run suites, environments released above are already available
+            for suite, name, configuration in self._assign(waiting_suites):
+                suite.handler_configuration = (name, configuration)
+                suite.started = self._clock.time()
+                if self._event_driven:
+                    suite.exit_callback = self._on_suite_exit
+                logger.info(
+                    'Suite {0} will run using handler '
+                    'configuration: {1}'.format(
+                            suite.suite_name,
+                            suite.handler_configuration))
+                self._launch(suite)
             suites_list = remaining_suites
-            time.sleep(self._scheduling_interval)
-        logger.info('Test suites scheduler stopped')
+            if suites_list:
+                self._wait(suites_list)
+
+    def _timed_out(self, suite):
+        return (self._suite_timeout != -1 and
+                suite.running_time >= self._suite_timeout)
+
+    def _time_out(self, suite):
+        self.timed_out_suites.append(suite)
+        suite.timed_out = True
+        config = self._handler_configurations[suite.handler_configuration]
+        logger.warn(
+            'Suite timed out: {0} [handler_configuration={1}, '
+            'suite_running_time={2}s, starting={3}]'.format(
+                suite.suite_name,
+                config,
+                int(suite.running_time),
+                suite.starting))
+
+    def _cancel_suites(self, suites_list):
+        """Cancel suites according to the cancellation policies and return
+        the cancelled suites."""
+        cancelled = []
+        for suite in suites_list:
+            if suite.starting:
+                continue
+            for policy in self._policies:
+                if suite.started is not None and \
+                        not policy.terminates_running:
+                    continue
+                reason = policy.cancel_reason(suite, self._matches(suite)[0])
+                if reason:
+                    self._cancel(suite, reason)
+                    cancelled.append(suite)
+                    break
+        return cancelled
+
+    def _cancel(self, suite, reason):
+        logger.warn('Cancelling suite: {0} - {1}'.format(suite.suite_name,
+                                                         reason))
+        suite.cancelled = reason
+        self.cancelled_suites.append(suite)
+        if suite.started is None:
+            # no environment was locked for the suite
+            suite.started = suite.terminated = self._clock.time()
+            self._invoke_after_suite_callback(suite)
+        else:
+            self._after_suite(suite)
+
+    def _assign(self, waiting_suites):
+        """Lock environments for as many waiting suites as possible.
+
+        Suites that can use the fewest environments are assigned first and
+        each suite prefers the environments that the fewest other waiting
+        suites can use, so broad suites do not take the only environment a
+        narrow suite can run on.
+
+        Exclusive suites lock all slots of an environment and are assigned
+        before other suites. An environment preferred by a waiting exclusive
+        suite is drained, no other suites are assigned to it until the
+        exclusive suite gets it.
+        """
+        demand = {}
+        for suite in waiting_suites:
+            for env in self._matches(suite)[1]:
+                demand[env] = demand.get(env, 0) + 1
+
+        assignments = []
+        draining = set()
+        # environments that failed to lock a single slot this round
+        full = set()
+        # sorted is stable so suites with the same choice keep their order
+        for suite in sorted(waiting_suites,
+                            key=lambda x: (not x.exclusive,
+                                           len(self._matches(x)[1]))):
+            if full.issuperset(self._capacities):
+                logger.info('All environments are currently taken')
+                break
+            suite_matches, suite_envs = self._matches(suite)
+            if not suite.exclusive and full.issuperset(suite_envs):
+                for env in suite_envs:
+                    demand[env] -= 1
+                continue
+            config_names = sorted(
+                suite_matches,
+                key=lambda x: (demand[suite_matches[x]['env']], x))
+            logger.info(
+                'Matching handler configurations for {0} are: {1}'
+                .format(suite.suite_name, ', '.join(config_names)))
+            for name in config_names:
+                configuration = suite_matches[name]
+                env = configuration['env']
+                if env in draining or env in full:
+                    continue
+                slots = self._slots(suite, env)
+                if self._environments.lock(env,
+                                           slots=slots,
+                                           capacity=self._capacities[env]):
+                    assignments.append((suite, name, configuration))
+                    break
+                elif slots == 1:
+                    full.add(env)
+            else:
+                available = [n for n in config_names
+                             if suite_matches[n]['env'] not in draining]
+                if suite.exclusive and available:
+                    env = suite_matches[available[0]]['env']
+                    draining.add(env)
+                    logger.info('Draining environment {0} for exclusive '
+                                'suite {1}'.format(env, suite.suite_name))
+                logger.info(
+                    'All matching handler configurations for {0} '
+                    'are currently taken'.format(suite.suite_name))
+            for env in suite_envs:
+                demand[env] -= 1
+        return assignments
+
+    def _matches(self, suite):
+        """Matching handler configurations of a waiting suite and their
+        environments. Suites wait for many rounds so these are cached."""
+        if suite not in self._suite_matches:
+            matches = self._find_matching_handler_configurations(suite)
+            self._suite_matches[suite] = (matches, self._envs(matches))
+        return self._suite_matches[suite]
+
+    @staticmethod
+    def _envs(configurations):
+        return set(c['env'] for c in configurations.values())
+
+    def _launch(self, suite):
+        if not self._launch_pool:
+            suite.run()
+            return
+        suite.starting = True
+        self._launch_pool.apply_async(self._launch_suite, (suite,))
+
+    def _launch_suite(self, suite):
+        try:
+            suite.run()
+        except Exception as e:
+            logger.error('Failed launching suite: {0} - error: {1}'.format(
+                suite.suite_name, str(e)))
+            suite.launch_error = e
+        finally:
+            suite.starting = False
+            self._events.put(suite)
+
+    def _wait(self, suites_list):
+        if not self._event_driven:
+            self._clock.sleep(self._scheduling_interval)
+            return
+        timeout = self._scheduling_interval
+        if self._suite_timeout != -1:
+            # wake up in time to enforce the closest suite timeout
+            for suite in suites_list:
+                if suite.started is not None and not suite.timed_out:
+                    timeout = min(timeout, max(
+                        0, self._suite_timeout - suite.running_time))
+        self._clock.wait(self._events, timeout)
+
+    def _on_suite_exit(self, suite):
+        logger.info('Suite exited: {0}'.format(suite.suite_name))
+        self._events.put(suite)
 
     def _after_suite(self, suite):
-        suite.terminated = time.time()
+        suite.terminated = self._clock.time()
+        # the callback reads the exit code of the suite
+        self._invoke_after_suite_callback(suite)
+        # running times of suites that did not run to a successful end do
+        # not predict the next runs
+        if self._history and not (suite.launch_error or suite.cancelled or
+                                  suite.timed_out or suite.failed):
+            try:
+                self._history.record(suite)
+            except Exception as e:
+                logger.error(
+                    'Failed recording running time of suite: {0} - '
+                    'error: {1}'.format(suite.suite_name, str(e)))
+        if not suite.cancelled:
+            for policy in self._policies:
+                policy.suite_ended(suite)
+        config = self._handler_configurations.get(suite.handler_configuration)
+        if config:
+            self._environments.release(
+                config['env'], slots=self._slots(suite, config['env']))
+            # a released env may be claimed by a waiting suite right away
+            self._events.put(None)
+
+    def _invoke_after_suite_callback(self, suite):
         try:
             if self._after_suite_callback:
                 logger.info(
@@ -445,9 +1747,6 @@ class SuitesScheduler(object):
             logger.error(
                 'After suite callback failed for suite: {0} - '
                 'error: {1}'.format(suite.suite_name, str(e)))
-        config = self._handler_configurations.get(suite.handler_configuration)
-        if config:
-            self._environments.release(config['env'])
 
     def _find_matching_handler_configurations(self, suite):
         if suite.handler_configuration:
@@ -467,23 +1766,227 @@ class SuitesScheduler(object):
         }
 
 
+class SuitesWorker(object):
+    """Runs suites started by a coordinator's RemoteLauncher on this host.
+
+    Worker methods are exposed over HTTP by helpers.workers.WorkerServer.
+    A suite removed while it is starting, e.g. after the coordinator gave up
+    on its start, is not run or is removed as soon as its start ends.
+
+    :param prepare_run: function called with the run id, repositories and
+                        suite files of the first suite of each run, returns
+                        the image suites of the run are started with.
+    """
+
+    def __init__(self, envs_dir, launcher, suite_class=None,
+                 prepare_run=None):
+        self.envs_dir = path(envs_dir)
+        self.launcher = launcher
+        self._suite_class = suite_class or TestSuite
+        self._prepare_run = prepare_run
+        self._suites = {}
+        self._exited = {}
+        self._run_images = {}
+        # names of suites being started, and of those removed meanwhile
+        self._starting = set()
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._prepare_lock = threading.Lock()
+
+    def start(self, suite_name, suite_def, variables, run_id=None,
+              repos=None, files=None):
+        if not is_valid_suite_name(suite_name):
+            raise ValueError('Invalid suite name: {0}'.format(suite_name))
+        if run_id and not is_valid_suite_name(run_id):
+            raise ValueError('Invalid run id: {0}'.format(run_id))
+        suite_work_dir = self.envs_dir / suite_name
+        suite = self._suite_class(suite_name=suite_name,
+                                  suite_def=suite_def,
+                                  suite_work_dir=suite_work_dir,
+                                  variables=variables,
+                                  launcher=self.launcher)
+        suite.suite_files = files
+        exited = threading.Event()
+        suite.exit_callback = lambda _: exited.set()
+        with self._lock:
+            if suite_name in self._suites:
+                raise RuntimeError('Suite already started: {0}'.format(
+                    suite_name))
+            self._suites[suite_name] = suite
+            self._exited[suite_name] = exited
+            self._starting.add(suite_name)
+        started = False
+        try:
+            if run_id and self._prepare_run:
+                suite.image = self._prepare(run_id, repos or [], files)
+            with self._lock:
+                removed = suite_name in self._removed
+            if not removed:
+                suite_work_dir.rmtree_p()
+                logger.info('Starting suite: {0}'.format(suite_name))
+                suite.run()
+                started = True
+        finally:
+            with self._lock:
+                self._starting.discard(suite_name)
+                removed = suite_name in self._removed
+                self._removed.discard(suite_name)
+            if removed or not started:
+                self.remove(suite_name)
+        if removed:
+            raise RuntimeError('Suite removed while starting: {0}'.format(
+                suite_name))
+
+    def wait(self, suite_name, timeout):
+        suite = self._suite(suite_name)
+        if timeout > 0:
+            self._exited[suite_name].wait(timeout)
+        return {'running': suite.is_running}
+
+    def stop(self, suite_name):
+        self.launcher.stop(self._suite(suite_name))
+
+    def exit_code(self, suite_name):
+        return self.launcher.exit_code(self._suite(suite_name))
+
+    def logs(self, suite_name):
+        return self.launcher.logs(self._suite(suite_name))
+
+    def results(self, suite_name, offset):
+        return self.launcher.results(self._suite(suite_name), offset)
+
+    def reports(self, suite_name):
+        suite = self._suite(suite_name)
+        if not suite.suite_reports_dir.isdir():
+            return {}
+        reports = suite.suite_reports_dir.files('*.xml')
+        reports += suite.suite_reports_dir.files(SUITE_TIMELINE_FILE)
+        return dict((report.name, report.text(encoding='utf-8'))
+                    for report in reports)
+
+    def remove(self, suite_name):
+        with self._lock:
+            if suite_name in self._starting:
+                logger.info('Suite: {0} will be removed once started'.format(
+                    suite_name))
+                self._removed.add(suite_name)
+                return
+            suite = self._suites.pop(suite_name)
+            self._exited.pop(suite_name)
+        logger.info('Removing suite: {0}'.format(suite_name))
+        suite.kill()
+        suite.suite_work_dir.rmtree_p()
+
+    def close(self):
+        for suite_name in list(self._suites):
+            self.remove(suite_name)
+        self.launcher.close()
+
+    def _suite(self, suite_name):
+        with self._lock:
+            return self._suites[suite_name]
+
+    def _prepare(self, run_id, repos, files):
+        # suites of a run are started concurrently, the run is prepared
+        # by the first of them while the others wait
+        with self._prepare_lock:
+            if run_id not in self._run_images:
+                logger.info('Preparing run: {0}'.format(run_id))
+                self._run_images[run_id] = self._prepare_run(
+                    run_id, [tuple(r) for r in repos], files)
+            return self._run_images[run_id]
+
+
 class SuitesRunner(object):
 
-    def __init__(self, variables_path, descriptor):
+    def __init__(self,
+                 variables_path,
+                 descriptor,
+                 history_path=None,
+                 default_suite_duration=DEFAULT_SUITE_DURATION,
+                 launcher=DockerLauncher.name,
+                 git_mirrors_dir=None,
+                 wheelhouse_dir=None,
+                 environments_backend='sqlite',
+                 workers=None,
+                 worker_token=None,
+                 merged_report_path=None,
+                 rerun_reports_dir=None,
+                 changed_since=None,
+                 max_bootstrap_failures=None,
+                 max_failure_ratio=None):
         self.descriptor = descriptor
+        self.environments_backend = environments_backend
+        self.merged_report_path = merged_report_path
         self.variables_path = variables_path
+        self.history_path = history_path or os.path.join(
+            sys.prefix, 'suites-history.json')
+        self.default_suite_duration = default_suite_duration
+        self.git_mirrors = GitMirrors(git_mirrors_dir or os.path.join(
+            sys.prefix, 'git-mirrors'))
+        self.wheelhouse_dir = path(wheelhouse_dir or os.path.join(
+            sys.prefix, 'wheelhouse')).abspath()
+        if workers:
+            self.launcher = RemoteLauncher(
+                workers=[WorkerClient(url, worker_token) for url in workers])
+        else:
+            self.launcher = LAUNCHERS[launcher](
+                mounts=[(self.git_mirrors.mirrors_dir.abspath(),
+                         CONTAINER_GIT_MIRRORS_DIR,
+                         'ro'),
+                        (self.wheelhouse_dir, CONTAINER_WHEELHOUSE_DIR, 'rw')],
+                environment={GIT_MIRRORS_DIR: CONTAINER_GIT_MIRRORS_DIR,
+                             WHEELHOUSE_DIR: CONTAINER_WHEELHOUSE_DIR})
         self.suites_yaml = None
         self.envs_dir = path.getcwd() / SUITE_ENVS_DIR
+        self.rerun_reports_dir = rerun_reports_dir
+        self.previous_reports_dir = path.getcwd() / PREVIOUS_REPORTS_DIR
+        self.rerun_tests = None
+        self.suite_names = None
+        self.changed_since = changed_since
+        self.max_bootstrap_failures = max_bootstrap_failures
+        self.max_failure_ratio = max_failure_ratio
 
     def setenv(self):
         if os.path.exists(self.envs_dir):
             shutil.rmtree(self.envs_dir)
 
+        if self.rerun_reports_dir:
+            # the reports dir of the previous run may be reports_dir
+            logger.info('Copying reports of the previous run from: {0}'
+                        .format(self.rerun_reports_dir))
+            self.previous_reports_dir.rmtree_p()
+            path(self.rerun_reports_dir).copytree(self.previous_reports_dir)
+
         if not reports_dir.exists():
             reports_dir.mkdir()
         for report in reports_dir.files():
             report.remove()
-
+        timelines_dir.rmtree_p()
+        timelines_dir.mkdir()
+        live_results_path.remove_p()
+
+        self.load_suites_yaml()
+        if self.changed_since:
+            index = impact.ImpactIndex(repo_dir).build()
+            changed_files = self.changed_files()
+            yaml_changes = self.suites_yaml_changes(changed_files)
+            logger.info('Tests affected by changes since {0}: {1}'.format(
+                self.changed_since, json.dumps(impact.impact_report(
+                    self.suites_yaml, index, changed_files, yaml_changes),
+                    indent=2)))
+            self.suites_yaml['test_suites'] = impact.narrow_test_suites(
+                self.suites_yaml, index, changed_files, yaml_changes)
+        if self.rerun_reports_dir:
+            self.rerun_tests = rerun.failed_tests(self.previous_reports_dir,
+                                                  self.suite_names)
+            logger.info('Rerunning tests of the previous run that did not '
+                        'pass: {0}'.format(json.dumps(self.rerun_tests,
+                                                      indent=2)))
+            self.suites_yaml['test_suites'] = rerun.rerun_test_suites(
+                self.suites_yaml, self.rerun_tests)
+
+    def load_suites_yaml(self):
         logger.info('Generating suites yaml:\n'
                     '\descriptor={}'.format(self.descriptor))
         test_suites_path = build_suites_yaml('suites/suites.yaml',
@@ -492,6 +1995,53 @@ class SuitesRunner(object):
         os.environ[TEST_SUITES_PATH] = test_suites_path
         with open(test_suites_path) as f:
             self.suites_yaml = yaml.safe_load(f)
+        self.suite_names = self.suites_yaml['test_suites'].keys()
+
+    def changed_files(self):
+        """Files of the repository changed since it branched off the
+        changed_since git revision, including uncommitted changes and
+        untracked files.
+
+        Changes made to the changed_since revision after the branch point
+        are not changes of the tested tree.
+        """
+        git = self._git()
+        merge_base = self._merge_base()
+        output = git.diff('--name-only', merge_base).stdout
+        output += git('ls-files', '--others', '--exclude-standard').stdout
+        return sorted(set(line.strip() for line in output.splitlines()
+                          if line.strip()))
+
+    def suites_yaml_changes(self, changed_files):
+        """Entries of suites.yaml changed since it branched off the
+        changed_since git revision."""
+        if impact.SUITES_YAML not in changed_files:
+            return None
+        try:
+            old_suites_yaml = yaml.safe_load(self._git().show(
+                '{0}:{1}'.format(self._merge_base(),
+                                 impact.SUITES_YAML)).stdout)
+        except sh.ErrorReturnCode:
+            # added since the branch point
+            old_suites_yaml = None
+        with open(repo_dir / impact.SUITES_YAML) as f:
+            new_suites_yaml = yaml.safe_load(f)
+        return impact.suites_yaml_changes(old_suites_yaml, new_suites_yaml)
+
+    def impact_report(self):
+        changed_files = self.changed_files()
+        return impact.impact_report(self.suites_yaml,
+                                    impact.ImpactIndex(repo_dir).build(),
+                                    changed_files,
+                                    self.suites_yaml_changes(changed_files))
+
+    def _git(self):
+        # without a tty git output is neither paged nor colored
+        return sh.git.bake(_cwd=repo_dir, _tty_out=False)
+
+    def _merge_base(self):
+        return self._git()('merge-base', self.changed_since,
+                           'HEAD').stdout.strip()
 
     def validate(self):
         for suite_name, suite in self.suites_yaml['test_suites'].items():
@@ -505,33 +2055,97 @@ class SuitesRunner(object):
                 raise AssertionError(
                     'Suite: {0} does not have "requires" or '
                     '""handler_configuration" specified'.format(suite_name))
+            shards = suite.get('shards', 1)
+            if not isinstance(shards, int) or shards < 1:
+                raise AssertionError(
+                    'Suite: {0} shards should be a positive '
+                    'integer'.format(suite_name))
+            for key in ['max_parallel_groups', 'test_processes']:
+                value = suite.get(key, 1)
+                if not isinstance(value, int) or value < 1:
+                    raise AssertionError(
+                        'Suite: {0} {1} should be a positive '
+                        'integer'.format(suite_name, key))
         for name, configuration in self.suites_yaml[
                 'handler_configurations'].iteritems():
             if 'env' not in configuration:
                 raise AssertionError(
                     '"{0}" handler configuration does not contain an env '
                     'property'.format(name))
+            capacity = configuration.get('capacity', 1)
+            if not isinstance(capacity, int) or capacity < 1:
+                raise AssertionError(
+                    '"{0}" handler configuration capacity should be a '
+                    'positive integer'.format(name))
+            # cleanup of handlers deletes the resources created since it
+            # started, including the resources of other suites
+            if capacity > 1 and not configuration.get('skip_cleanup'):
+                raise AssertionError(
+                    '"{0}" handler configuration with a capacity above 1 '
+                    'should set skip_cleanup'.format(name))
+        if self.max_bootstrap_failures is not None and \
+                self.max_bootstrap_failures < 1:
+            raise AssertionError(
+                'max bootstrap failures should be a positive integer')
+        if self.max_failure_ratio is not None and \
+                not 0 <= self.max_failure_ratio < 1:
+            raise AssertionError(
+                'max failure ratio should be between 0 and 1')
+
+    def cancellation_policies(self):
+        policies = []
+        if self.max_bootstrap_failures:
+            policies.append(HandlerBootstrapFailures(
+                self.max_bootstrap_failures))
+        if self.max_failure_ratio is not None:
+            policies.append(FailureRatio(
+                self.max_failure_ratio, min_suites=FAILURE_RATIO_MIN_SUITES))
+        return policies
 
     def run_suites(self):
-        self.build_docker_image()
-        variables = self.suites_yaml.get('variables', {})
-        test_suites = [
-            TestSuite(suite_name=suite_name,
-                      suite_def=suite_def,
-                      suite_work_dir=self.envs_dir / suite_name,
-                      variables=variables) for suite_name, suite_def in
-            self.suites_yaml['test_suites'].iteritems()]
-        environments_path = os.path.join(sys.prefix, 'environments.json')
-        environments = FileEnvironments(
-            locked_environments_path=environments_path)
+        logger.info('Suites run id: {0}'.format(self.launcher.run_id))
+        # images, mirrors and wheels of remote suites are prepared by the
+        # workers that run them
+        if self.launcher.local:
+            self.prepare_host()
+        else:
+            self.launcher.repos = self._suites_repos()
+        history = SuitesHistory(self.history_path)
+        test_suites, suite_shards = self._create_test_suites(history)
+        environments = self._create_environments()
         logger.info('Pruning environments before suites run')
         environments.prune()
+        merged_report = None
+        if self.merged_report_path:
+            merged_report = xunit_reports.MergedReport(
+                self.merged_report_path, name=self.descriptor)
+
+        results_monitor = ResultsMonitor(test_suites, live_results_path)
+
+        def after_suite_callback(suite):
+            # results streamed after the last poll of the monitor
+            results_monitor.poll(suite)
+            TestSuite.after_suite(suite)
+            self._record_test_durations(history, suite)
+            if merged_report:
+                for report in suite.xunit_reports:
+                    merged_report.append(report)
+            if suite.shard:
+                suite_shards[suite.shard['suite']].shard_done(suite)
 
         def sigterm_handler(num, frame):
             logger.info('Pruning environments on sigterm')
             environments.prune(include_self=True)
-            logger.info('Pruning containers on sigterm')
-            self.prune_containers(include_self=True)
+            if self.launcher.local:
+                logger.info('Pruning containers on sigterm')
+                self.prune_containers(include_self=True)
+            else:
+                logger.info('Removing suites from workers on sigterm')
+            results_monitor.stop()
+            self.launcher.close()
+            environments.close()
+            # the merged report is written once by the finally clause of
+            # the run, the lock of its appends may be held right now
             sys.exit(1)
         signal.signal(signal.SIGTERM, sigterm_handler)
 
@@ -540,11 +2154,44 @@ class SuitesRunner(object):
             handler_configurations=self.suites_yaml['handler_configurations'],
             scheduling_interval=SCHEDULER_INTERVAL,
             optimize=True,
-            after_suite_callback=TestSuite.after_suite,
+            after_suite_callback=after_suite_callback,
             suite_timeout=60 * 60 * 5,
-            environments=environments)
-        scheduler.run()
-        if scheduler.failed_suites or scheduler.timed_out_suites:
+            environments=environments,
+            event_driven=True,
+            launch_workers=LAUNCH_WORKERS,
+            history=history,
+            default_duration=self.default_suite_duration,
+            policies=self.cancellation_policies())
+        logger.info('Writing live test results to: {0}'.format(
+            live_results_path))
+        results_monitor.start()
+        try:
+            scheduler.run()
+        finally:
+            results_monitor.stop()
+            self.launcher.close()
+            environments.close()
+            if merged_report:
+                logger.info('Writing merged xunit report to: {0}'.format(
+                    self.merged_report_path))
+                merged_report.finalize()
+            logger.info('Writing run timelines to: {0}'.format(
+                timelines_dir))
+            write_run_timelines([s.timeline for s in test_suites],
+                                timelines_dir)
+            if self.rerun_reports_dir:
+                logger.info('Merging rerun reports into the reports of the '
+                            'previous run')
+                rerun.merge_rerun_reports(self.previous_reports_dir,
+                                          reports_dir,
+                                          self.suite_names,
+                                          self.rerun_tests)
+        if scheduler.cancelled_suites:
+            logger.warn('Cancelled test suites: {0}'.format(
+                ''.join(['\n\t{0} ({1})'.format(x.suite_name, x.cancelled)
+                         for x in scheduler.cancelled_suites])))
+        if scheduler.failed_suites or scheduler.timed_out_suites or \
+                scheduler.cancelled_suites:
             logger.warn('Failed test suites: {0}'.format(
                 ''.join(['\n\t{0} (exit_code: {1})'.format(x.suite_name,
                                                            x.exit_code)
@@ -554,39 +2201,161 @@ class SuitesRunner(object):
                          for x in scheduler.timed_out_suites])))
             sys.exit(1)
 
+    def _create_test_suites(self, history):
+        variables = self.suites_yaml.get('variables', {})
+        test_suites = []
+        suite_shards = {}
+        for suite_name, suite_def in self.suites_yaml[
+                'test_suites'].iteritems():
+            shards_count = suite_def.get('shards', 1)
+            if shards_count == 1:
+                test_suites.append(TestSuite(
+                    suite_name=suite_name,
+                    suite_def=suite_def,
+                    suite_work_dir=self.envs_dir / suite_name,
+                    variables=variables,
+                    launcher=self.launcher))
+                continue
+            suite_shards[suite_name] = SuiteShards(suite_name, shards_count)
+            shards = suite_shards[suite_name].create_shards(
+                suite_def, self.envs_dir, variables, self.launcher)
+            # shards are balanced by the durations of the suite tests
+            durations = history.test_durations(shards[0])
+            logger.info('Splitting suite {0} into {1} shards [recorded test '
+                        'durations={2}]'.format(suite_name, shards_count,
+                                                len(durations)))
+            for shard in shards:
+                shard.shard['durations'] = durations
+            test_suites += shards
+        return test_suites, suite_shards
+
     @staticmethod
-    def prune_containers(include_self=False):
-        container_ids = sh.docker.ps(a=True, q=True).stdout.strip()
-        container_ids = [c.strip() for c in container_ids.split(os.linesep)
-                         if c.strip()]
-        for container_id in container_ids:
-            container_name = sh.docker.ps(filter='id={0}'.format(container_id),
-                                          format='{{.Names}}').stdout.strip()
-            split_container_name = container_name.split('_', 1)
-            if len(split_container_name) < 2:
+    def _record_test_durations(history, suite):
+        durations = {}
+        try:
+            for report in suite.xunit_reports:
+                durations.update(xunit_reports.test_durations(report))
+            if durations:
+                history.record_test_durations(suite, durations)
+        except Exception as e:
+            logger.error('Failed recording test durations of suite: {0} - '
+                         'error: {1}'.format(suite.suite_name, str(e)))
+
+    def prepare_host(self, repos=None):
+        self.launcher.image = self.build_docker_image()
+        self.refresh_git_mirrors(repos)
+        self.wheelhouse_dir.makedirs_p()
+
+    def _create_environments(self):
+        if self.environments_backend == 'file':
+            return FileEnvironments(locked_environments_path=os.path.join(
+                sys.prefix, 'environments.json'))
+        return SqliteEnvironments(db_path=os.path.join(
+            sys.prefix, 'environments.db'))
+
+    def refresh_git_mirrors(self, repos=None):
+        if repos is None:
+            repos = self._suites_repos()
+        logger.info('Refreshing git mirrors in: {0}'.format(
+            self.git_mirrors.mirrors_dir))
+        self.git_mirrors.refresh(repos)
+
+    def _suites_repos(self):
+        repos = [('cloudify-cosmo', repo) for repo in MIRRORED_REPOS]
+        if not self.suites_yaml:
+            return repos
+        definitions = (self.suites_yaml['handler_configurations'].values() +
+                       self.suites_yaml.get('tests', {}).values())
+        for definition in definitions:
+            external = definition.get('external')
+            # private repositories are cloned with credentials in suite
+            # containers, repository names should not need processing
+            if (not external or external.get('private') or
+                    '{{' in external['repo']):
                 continue
+            repos.append((external.get('organization', 'cloudify-cosmo'),
+                          external['repo']))
+        return repos
+
+    @staticmethod
+    def prune_containers(include_self=False):
+        """Remove suite containers whose runner process is gone.
+
+        Suite containers are found by their runner pid label in a single
+        listing and removed in a single batch.
+        """
+        containers = sh.docker.ps(
+            a=True,
+            filter='label={0}'.format(LABEL_RUNNER_PID),
+            format='{{{{.ID}}}} {{{{.Label "{0}"}}}}'.format(
+                LABEL_RUNNER_PID)).stdout.strip()
+        current_pid = os.getpid()
+        runners = {}
+        pruned_containers = []
+        for line in containers.splitlines():
             try:
-                pid = int(split_container_name[0])
+                container_id, pid = line.split()
+                pid = int(pid)
             except ValueError:
                 continue
-            current_pid = os.getpid()
-            if ((include_self and pid == current_pid) or
-                    not is_pid_of_suites_runner(pid)):
-                kill_container(container_id)
-
-    def build_docker_image(self):
-        docker.build(
-                ['-t',
-                 '{0}:{1}'.format(DOCKER_REPOSITORY, DOCKER_TAG), '.']).wait()
-        docker_image_id = self._get_docker_image_id()
+            if pid not in runners:
+                runners[pid] = (not (include_self and pid == current_pid) and
+                                is_pid_of_suites_runner(pid))
+            if not runners[pid]:
+                pruned_containers.append(container_id)
+        if pruned_containers:
+            kill_containers(pruned_containers)
+
+    def build_docker_image(self, build_dir='.'):
+        """Build the image of suite containers and return its tag.
+
+        Suites are launched by this content hash tag, a shared tag may be
+        moved by runners of other branches while suites start.
+        """
+        # images are tagged with a hash of their build inputs so the build
+        # is skipped when an image of the same inputs already exists
+        image = '{0}:{1}-{2}'.format(DOCKER_REPOSITORY,
+                                     DOCKER_TAG,
+                                     self._image_inputs_hash(build_dir))
+        if self._get_docker_image_id(image):
+            logger.info('Using existing docker image: {0}'.format(image))
+        else:
+            logger.info('Building docker image: {0}'.format(image))
+            docker.build(['-t', image, build_dir]).wait()
+        docker_image_id = self._get_docker_image_id(image)
         if not docker_image_id:
             raise RuntimeError(
                     'Docker image not found after docker image was built.')
+        images_cache = ImageCache(os.path.join(sys.prefix,
+                                               'docker-images.json'))
+        for evicted_image in images_cache.touch(
+                image, in_use=self._is_docker_image_in_use):
+            logger.info('Removing least recently used docker image: {0}'
+                        .format(evicted_image))
+            try:
+                sh.docker.rmi(evicted_image)
+            except sh.ErrorReturnCode as e:
+                logger.warn('Failed removing docker image: {0} - error: {1}'
+                            .format(evicted_image, e.stderr.strip()))
+        return image
 
     @staticmethod
-    def _get_docker_image_id():
+    def _image_inputs_hash(build_dir='.'):
+        inputs_hash = hashlib.sha256()
+        for file_name in IMAGE_BUILD_INPUTS:
+            inputs_hash.update(file_name)
+            inputs_hash.update((path(build_dir) / file_name).bytes())
+        return inputs_hash.hexdigest()[:12]
+
+    @staticmethod
+    def _is_docker_image_in_use(image):
+        return bool(sh.docker.ps(['-a', '-q', '--filter',
+                                  'ancestor={0}'.format(image)]).strip())
+
+    @staticmethod
+    def _get_docker_image_id(image):
         image_ids = [line for line in sh.docker.images(
-                ['-q', DOCKER_REPOSITORY]).strip().split(os.linesep)
+                ['-q', image]).strip().split(os.linesep)
                  if len(line) > 0]
         if len(image_ids) > 1:
             raise RuntimeError(
@@ -594,30 +2363,181 @@ class SuitesRunner(object):
         return image_ids[0] if image_ids else None
 
 
+LAUNCHERS = {
+    DockerLauncher.name: DockerLauncher,
+    VagrantLauncher.name: VagrantLauncher
+}
+
+
+def archive_suite_files(suites_dir=path(__file__).dirname()):
+    """Base64 encoded tar.gz archive of the suite files of the suites
+    directory."""
+    data = StringIO()
+    archive = tarfile.open(fileobj=data, mode='w:gz')
+    try:
+        for file_name in SUITE_FILES:
+            archive.add(path(suites_dir) / file_name, arcname=file_name,
+                        filter=lambda info: None if
+                        info.name.endswith('.pyc') else info)
+    finally:
+        archive.close()
+    return base64.b64encode(data.getvalue())
+
+
+def extract_suite_files(suite_files, target_dir):
+    """Extract an archive of archive_suite_files to target_dir."""
+    archive = tarfile.open(fileobj=StringIO(base64.b64decode(suite_files)),
+                           mode='r:gz')
+    try:
+        for member in archive.getmembers():
+            if (os.path.isabs(member.name) or
+                    '..' in member.name.split('/') or
+                    not (member.isfile() or member.isdir())):
+                raise ValueError('Invalid suite file: {0}'.format(
+                    member.name))
+        archive.extractall(target_dir)
+    finally:
+        archive.close()
+
+
 def kill_container(container_name):
     logger.info('Killing container: {0}'.format(container_name))
     docker.rm('-f', container_name).wait()
 
 
-def is_pid_of_suites_runner(pid):
+def kill_containers(container_names):
+    logger.info('Killing containers: {0}'.format(', '.join(container_names)))
+    docker.rm('-f', *container_names).wait()
+
+
+def _is_pid_alive(pid):
     try:
         os.kill(int(pid), 0)
     except (ValueError, OSError):
         return False
+    return True
+
+
+def is_pid_of_suites_runner(pid):
+    if not _is_pid_alive(pid):
+        return False
+    cmd = _process_cmdline(pid)
+    return cmd is not None and any(name in cmd for name in
+                                   SUITES_RUNNER_PROCESS_NAMES)
+
+
+def _process_cmdline(pid):
+    if os.path.isdir('/proc/self'):
+        try:
+            with open('/proc/{0}/cmdline'.format(int(pid))) as f:
+                return f.read().replace('\0', ' ')
+        except IOError:
+            return None
     try:
-        cmd = sh.ps('h', p=str(pid), o='cmd').stdout.strip()
-        return 'suites_runner' in cmd
+        return sh.ps('h', p=str(pid), o='cmd').stdout.strip()
     except sh.ErrorReturnCode:
-        return False
+        return None
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('variables_path')
+    parser.add_argument('descriptor')
+    parser.add_argument('--history-path')
+    parser.add_argument('--default-suite-duration',
+                        type=int,
+                        default=DEFAULT_SUITE_DURATION,
+                        help='Estimated running time in seconds of suites '
+                             'that have no recorded history')
+    parser.add_argument('--launcher',
+                        choices=sorted(LAUNCHERS),
+                        default=DockerLauncher.name,
+                        help='Backend used to start suite containers')
+    parser.add_argument('--git-mirrors-dir',
+                        help='Directory of the git mirrors suite containers '
+                             'clone repositories from')
+    parser.add_argument('--wheelhouse-dir',
+                        help='Directory of the wheelhouse shared by suite '
+                             'containers')
+    parser.add_argument('--environments-backend',
+                        choices=['sqlite', 'file'],
+                        default='sqlite',
+                        help='Store used to lock environments')
+    parser.add_argument('--merged-report',
+                        help='Path of a single xunit report of all suites, '
+                             'written in addition to the per suite reports')
+    parser.add_argument('--rerun-failed',
+                        metavar='REPORTS_DIR',
+                        help='Only rerun the failed, errored and missing '
+                             'tests found in the xunit reports of a previous '
+                             'run and merge their results into these reports')
+    parser.add_argument('--changed-since',
+                        metavar='REF',
+                        help='Only run the tests affected by the changes to '
+                             'the system tests repository since a git '
+                             'revision')
+    parser.add_argument('--impact-report',
+                        action='store_true',
+                        help='Print the tests and suites affected by the '
+                             'changes since --changed-since and exit')
+    parser.add_argument('--max-bootstrap-failures',
+                        type=int,
+                        metavar='N',
+                        help='Cancel the remaining suites of a handler once '
+                             'N suites using it failed before their tests '
+                             'ran')
+    parser.add_argument('--max-failure-ratio',
+                        type=float,
+                        metavar='RATIO',
+                        help='Cancel the run once the ratio of failed suites '
+                             'exceeds RATIO, after {0} suites '
+                             'ended'.format(FAILURE_RATIO_MIN_SUITES))
+    parser.add_argument('--worker',
+                        dest='workers',
+                        action='append',
+                        metavar='URL',
+                        help='URL of a suites worker to run suites on, may '
+                             'be repeated. Suites run on the local docker '
+                             'daemon if no worker is given. The token shared '
+                             'with workers is read from the {0} environment '
+                             'variable'.format(WORKER_TOKEN))
+    return parser.parse_args()
 
 
 def main():
-    suites_runner = SuitesRunner(variables_path=sys.argv[1],
-                                 descriptor=sys.argv[2])
+    args = parse_arguments()
+    worker_token = os.environ.get(WORKER_TOKEN)
+    if args.workers and not worker_token:
+        raise AssertionError('--worker requires the {0} environment '
+                             'variable'.format(WORKER_TOKEN))
+    suites_runner = SuitesRunner(
+        variables_path=args.variables_path,
+        descriptor=args.descriptor,
+        history_path=args.history_path,
+        default_suite_duration=args.default_suite_duration,
+        launcher=args.launcher,
+        git_mirrors_dir=args.git_mirrors_dir,
+        wheelhouse_dir=args.wheelhouse_dir,
+        environments_backend=args.environments_backend,
+        workers=args.workers,
+        worker_token=worker_token,
+        merged_report_path=args.merged_report,
+        rerun_reports_dir=args.rerun_failed,
+        changed_since=args.changed_since,
+        max_bootstrap_failures=args.max_bootstrap_failures,
+        max_failure_ratio=args.max_failure_ratio)
+    if args.impact_report:
+        if not args.changed_since:
+            raise AssertionError('--impact-report requires --changed-since')
+        suites_runner.load_suites_yaml()
+        print json.dumps(suites_runner.impact_report(), indent=2,
+                         sort_keys=True)
+        return
     suites_runner.setenv()
     suites_runner.validate()
-    logger.info('Pruning containers before suites run')
-    suites_runner.prune_containers()
+    if suites_runner.launcher.local:
+        logger.info('Pruning containers before suites run')
+        suites_runner.prune_containers()
     suites_runner.run_suites()
 
 if __name__ == '__main__':
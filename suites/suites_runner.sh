@@ -29,7 +29,11 @@ suites_runner()
         --jenkins-parameters-path="${EXPORT_PARAMS_FILE}" \
         --gpg-secret-key-path="${SYSTEM_TESTS_SECRET_KEY_PATH}"
     rm "${SYSTEM_TESTS_SECRET_KEY_PATH}"
-    exec python suites_runner.py "${variables_yaml_path}" "${SYSTEM_TESTS_DESCRIPTOR}"
+    local worker_args=()
+    for worker_url in ${SYSTEM_TESTS_WORKERS}; do
+        worker_args+=(--worker "${worker_url}")
+    done
+    exec python suites_runner.py "${variables_yaml_path}" "${SYSTEM_TESTS_DESCRIPTOR}" "${worker_args[@]}"
 }
 
 main()
@@ -0,0 +1,124 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+"""Runs suites on behalf of a suites runner coordinator started with
+--worker pointing at this host. Should be started from the suites directory,
+like suites_runner.py, with the token shared with the coordinator in the
+SUITES_WORKER_TOKEN environment variable.
+"""
+
+import argparse
+import os
+import signal
+import sys
+
+from path import path
+
+from helpers.workers import WorkerServer, WORKER_TOKEN
+from suites_runner import (DockerLauncher,
+                           LAUNCHERS,
+                           SuitesRunner,
+                           SuitesWorker,
+                           WORKER_PORT,
+                           WORKER_RUNS_DIR,
+                           WORKER_SUITE_ENVS_DIR,
+                           extract_suite_files,
+                           logger)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host',
+                        default='127.0.0.1',
+                        help='Address the worker listens on')
+    parser.add_argument('--port',
+                        type=int,
+                        default=WORKER_PORT,
+                        help='Port the worker listens on')
+    parser.add_argument('--certfile',
+                        help='Certificate the worker is served with over '
+                             'https, should be given when the worker '
+                             'listens on an external address')
+    parser.add_argument('--keyfile',
+                        help='Private key of the certificate')
+    parser.add_argument('--launcher',
+                        choices=sorted(LAUNCHERS),
+                        default=DockerLauncher.name,
+                        help='Backend used to start suite containers')
+    parser.add_argument('--git-mirrors-dir',
+                        help='Directory of the git mirrors suite containers '
+                             'clone repositories from')
+    parser.add_argument('--wheelhouse-dir',
+                        help='Directory of the wheelhouse shared by suite '
+                             'containers')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    token = os.environ.get(WORKER_TOKEN)
+    if not token:
+        raise AssertionError('{0} environment variable is not set'.format(
+            WORKER_TOKEN))
+    suites_runner = SuitesRunner(variables_path=None,
+                                 descriptor=None,
+                                 launcher=args.launcher,
+                                 git_mirrors_dir=args.git_mirrors_dir,
+                                 wheelhouse_dir=args.wheelhouse_dir)
+    logger.info('Pruning containers before serving suites')
+    suites_runner.prune_containers()
+    suites_runner.prepare_host()
+    envs_dir = path.getcwd() / WORKER_SUITE_ENVS_DIR
+    envs_dir.rmtree_p()
+    runs_dir = path.getcwd() / WORKER_RUNS_DIR
+    runs_dir.rmtree_p()
+
+    def prepare_run(run_id, repos, files):
+        # git mirrors are refreshed and the image is built from the suite
+        # files of the coordinator for every run
+        suites_runner.refresh_git_mirrors(repos)
+        if not files:
+            return suites_runner.launcher.image
+        run_dir = runs_dir / run_id
+        run_dir.makedirs_p()
+        try:
+            extract_suite_files(files, run_dir)
+            return suites_runner.build_docker_image(build_dir=run_dir)
+        finally:
+            run_dir.rmtree_p()
+    worker = SuitesWorker(envs_dir, suites_runner.launcher,
+                          prepare_run=prepare_run)
+    server = WorkerServer(worker, args.host, args.port, token,
+                          certfile=args.certfile,
+                          keyfile=args.keyfile)
+    if not server.secure and args.host not in ('127.0.0.1', 'localhost'):
+        logger.warn('Suite variables are received unencrypted, the worker '
+                    'should be served with --certfile')
+
+    def sigterm_handler(num, frame):
+        logger.info('Removing suites on sigterm')
+        worker.close()
+        sys.exit(1)
+    signal.signal(signal.SIGTERM, sigterm_handler)
+
+    logger.info('Suites worker listening on: {0}'.format(server.url))
+    try:
+        server.serve_forever()
+    finally:
+        worker.close()
+
+
+if __name__ == '__main__':
+    main()
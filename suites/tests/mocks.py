@@ -0,0 +1,67 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+
+from suites.suites_runner import Launcher
+from suites.helpers import results_stream
+
+
+class MockSuiteProcess(object):
+
+    def __init__(self, run_for):
+        self._exited = threading.Event()
+        timer = threading.Timer(run_for, self._exited.set)
+        timer.daemon = True
+        timer.start()
+
+    def is_alive(self):
+        return not self._exited.is_set()
+
+    def wait(self):
+        self._exited.wait()
+
+
+class MockLauncher(Launcher):
+    """Runs suites of a worker for the time set in their definition."""
+
+    name = 'mock'
+
+    def __init__(self):
+        super(MockLauncher, self).__init__()
+        self.removed = []
+
+    def prepare(self, suite):
+        suite.suite_reports_dir.makedirs_p()
+
+    def start(self, suite):
+        (suite.suite_reports_dir / '{0}.xml'.format(suite.suite_name))\
+            .write_text('<testsuite name="nosetests" tests="1">'
+                        '<testcase classname="test" name="test_{0}"/>'
+                        '</testsuite>'.format(suite.suite_name))
+        (suite.suite_reports_dir / results_stream.SUITE_RESULTS_FILE)\
+            .write_text(json.dumps({'test': 'test.test_{0}'.format(
+                suite.suite_name), 'outcome': 'passed'}) + '\n')
+        return MockSuiteProcess(suite.suite_def.get('run_for', 0))
+
+    def exit_code(self, suite):
+        return suite.suite_def.get('exit_code', 0)
+
+    def logs(self, suite):
+        return 'logs of {0}'.format(suite.suite_name)
+
+    def remove(self, suite):
+        self.removed.append(suite.suite_name)
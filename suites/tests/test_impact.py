@@ -0,0 +1,239 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import tempfile
+import unittest
+
+import yaml
+from path import path
+from mock import patch
+
+from suites.suites_runner import SuitesRunner
+from suites.helpers import impact
+
+
+class TestImpactIndex(unittest.TestCase):
+
+    modules = {
+        'cosmo_tester/__init__.py': '',
+        'cosmo_tester/framework/__init__.py': '',
+        'cosmo_tester/framework/util.py': """
+def get_resource_path(resource):
+    return resource
+
+def copy_blueprint(name):
+    return get_resource_path(name)
+""",
+        'cosmo_tester/framework/testenv.py':
+            'from cosmo_tester.framework.util import copy_blueprint\n',
+        'cosmo_tester/test_suites/__init__.py': '',
+        'cosmo_tester/test_suites/test_a/__init__.py': '',
+        'cosmo_tester/test_suites/test_a/a_test.py': """
+from cosmo_tester.framework import testenv
+testenv.copy_blueprint('mocks')
+""",
+        'cosmo_tester/test_suites/test_a/b_test.py': """
+import helper
+from cosmo_tester.framework.util import get_resource_path
+get_resource_path('plugins/{0}'.format(helper.NAME))
+""",
+        'cosmo_tester/test_suites/test_a/helper.py': 'NAME = "plugin"\n'
+    }
+
+    suites_yaml = {
+        'handler_configurations': {
+            'lab': {'tags': ['openstack', 'lab'], 'inputs': 'inputs-lab.yaml'},
+            'ec2': {'tags': ['aws'], 'inputs': 'inputs-ec2.yaml'}
+        },
+        'tests': {
+            'group_a': {'tests': ['cosmo_tester/test_suites/test_a -e slow']},
+            'plugin_tests': {'external': {'repo': 'plugin'},
+                             'tests': ['system_tests']}
+        },
+        'test_suites': {
+            'suite1': {'requires': ['openstack'], 'shards': 2,
+                       'tests': ['group_a']},
+            'suite2': {'requires': ['openstack'], 'tests': ['plugin_tests']},
+            'suite3': {'requires': ['openstack'], 'tests': [
+                'cosmo_tester/test_suites/test_a/b_test.py:Test']}
+        }
+    }
+
+    def setUp(self):
+        self.repo_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.repo_dir.rmtree)
+        for module, content in self.modules.items():
+            (self.repo_dir / module).dirname().makedirs_p()
+            (self.repo_dir / module).write_text(content)
+        self.index = impact.ImpactIndex(self.repo_dir).build()
+
+    def _affected(self, changed_file):
+        affected, reason = self.index.affected_tests([changed_file])
+        return sorted(path(m).name for m in affected), reason
+
+    def test_affected_tests(self):
+        self.assertEqual(
+            (['a_test.py'], None),
+            self._affected('cosmo_tester/resources/blueprints/mocks/b.yaml'))
+        self.assertEqual(
+            (['b_test.py'], None),
+            self._affected('cosmo_tester/resources/plugins/plugin/setup.py'))
+        self.assertEqual(
+            (['b_test.py'], None),
+            self._affected('cosmo_tester/test_suites/test_a/helper.py'))
+        self.assertEqual(
+            (['a_test.py', 'b_test.py'], None),
+            self._affected('cosmo_tester/framework/util.py'))
+        self.assertEqual(
+            ([], None),
+            self._affected('cosmo_tester/resources/blueprints/other/b.yaml'))
+        self.assertEqual(
+            (['a_test.py', 'b_test.py'], 'changed: suites/suites_runner.py'),
+            self._affected('suites/suites_runner.py'))
+        self.assertEqual(([], None),
+                         self._affected('suites/suites/suites.yaml'))
+        self.assertEqual(([], None),
+                         self._affected('suites/scheduler_simulator.py'))
+
+    def test_changed_files(self):
+        import sh
+        git = sh.git.bake('-c', 'user.name=test', '-c', 'user.email=test',
+                          _cwd=self.repo_dir)
+        git.init()
+        git.add('.')
+        git.commit('-m', 'base')
+        git.checkout('-b', 'feature')
+        (self.repo_dir / 'cosmo_tester/framework/util.py').write_text('')
+        git.commit('-am', 'feature')
+        git.checkout('master')
+        (self.repo_dir / 'setup.py').write_text('')
+        git.add('setup.py')
+        git.commit('-m', 'master')
+        git.checkout('feature')
+        (self.repo_dir / 'cosmo_tester/test_suites/test_a/helper.py')\
+            .write_text('')
+        (self.repo_dir / 'cosmo_tester/test_suites/test_a/c_test.py')\
+            .write_text('')
+        runner = SuitesRunner.__new__(SuitesRunner)
+        runner.changed_since = 'master'
+        with patch('suites.suites_runner.repo_dir', self.repo_dir):
+            # changes made to master after the branch point are not listed
+            self.assertEqual(
+                ['cosmo_tester/framework/util.py',
+                 'cosmo_tester/test_suites/test_a/c_test.py',
+                 'cosmo_tester/test_suites/test_a/helper.py'],
+                runner.changed_files())
+
+    def test_suites_yaml_changes_since(self):
+        import sh
+        git = sh.git.bake('-c', 'user.name=test', '-c', 'user.email=test',
+                          _cwd=self.repo_dir)
+        suites_yaml_path = self.repo_dir / impact.SUITES_YAML
+        suites_yaml_path.dirname().makedirs_p()
+        suites_yaml_path.write_text(yaml.safe_dump(self.suites_yaml))
+        git.init()
+        git.add('.')
+        git.commit('-m', 'base')
+        git.checkout('-b', 'feature')
+        suites_yaml = copy.deepcopy(self.suites_yaml)
+        suites_yaml['tests']['group_a']['tests'].append('other')
+        suites_yaml_path.write_text(yaml.safe_dump(suites_yaml))
+        runner = SuitesRunner.__new__(SuitesRunner)
+        runner.changed_since = 'master'
+        with patch('suites.suites_runner.repo_dir', self.repo_dir):
+            self.assertIsNone(runner.suites_yaml_changes([]))
+            changes = runner.suites_yaml_changes(runner.changed_files())
+        self.assertEqual(set(['group_a']), changes['tests'])
+        self.assertEqual(set(), changes['test_suites'])
+
+    def test_suites_yaml_changes(self):
+        old = {
+            'variables': {'image': 'a', 'key': 'b'},
+            'handler_properties': {'props': {'image': '{{ image }}'}},
+            'handler_configurations': {
+                'lab': {'tags': ['openstack'], 'properties': 'props'},
+                'ec2': {'tags': ['aws']}
+            },
+            'tests': {'group_a': {'tests': ['a']}},
+            'test_suites': {'suite1': {'requires': ['aws'],
+                                       'tests': ['group_a']}},
+            'files': {'key.pem': {'content': '{{key}}'}}
+        }
+        new = copy.deepcopy(old)
+        new['variables']['image'] = 'c'
+        new['tests']['group_b'] = {'tests': ['b']}
+        changes = impact.suites_yaml_changes(old, new)
+        self.assertEqual({
+            'full_run_reason': None,
+            'handler_configurations': set(['lab']),
+            'tests': set(['group_b']),
+            'test_suites': set()
+        }, changes)
+        new = copy.deepcopy(old)
+        new['variables']['key'] = 'c'
+        self.assertEqual(
+            'changed: suites/suites/suites.yaml files',
+            impact.suites_yaml_changes(old, new)['full_run_reason'])
+        self.assertEqual(set(['suite1']), impact.suites_yaml_changes(
+            None, old)['test_suites'])
+
+    def test_narrow_suites_yaml_changes(self):
+        def narrow(changed_files, **changes):
+            yaml_changes = impact.suites_yaml_changes(None, None)
+            yaml_changes.update(changes)
+            return impact.narrow_test_suites(self.suites_yaml, self.index,
+                                             changed_files, yaml_changes)
+        self.assertEqual({}, narrow([impact.SUITES_YAML]))
+        self.assertEqual(
+            {'suite1': {'requires': ['openstack'], 'tests': ['group_a']}},
+            narrow([impact.SUITES_YAML], tests=set(['group_a'])))
+        self.assertEqual(
+            {'suite2': self.suites_yaml['test_suites']['suite2']},
+            narrow([impact.SUITES_YAML], test_suites=set(['suite2'])))
+        self.assertEqual(self.suites_yaml['test_suites'], narrow(
+            [impact.SUITES_YAML], handler_configurations=set(['lab'])))
+        self.assertEqual({}, narrow(
+            [impact.SUITES_YAML], handler_configurations=set(['ec2'])))
+        self.assertEqual(self.suites_yaml['test_suites'],
+                         narrow(['suites/configurations/inputs-lab.yaml']))
+        self.assertEqual(self.suites_yaml['test_suites'], narrow(
+            [impact.SUITES_YAML], full_run_reason='changed'))
+
+    def test_narrow_test_suites(self):
+        test_suites = impact.narrow_test_suites(
+            self.suites_yaml, self.index,
+            ['cosmo_tester/resources/blueprints/mocks/blueprint.yaml'])
+        self.assertEqual({'suite1': {'requires': ['openstack'], 'tests': [
+            {'tests': ['cosmo_tester/test_suites/test_a/a_test.py -e slow']}
+        ]}}, test_suites)
+        test_suites = impact.narrow_test_suites(
+            self.suites_yaml, self.index, ['cosmo_tester/framework/util.py'])
+        self.assertEqual(['suite1', 'suite2', 'suite3'], sorted(test_suites))
+        self.assertEqual([{'tests': [
+            'cosmo_tester/test_suites/test_a/b_test.py:Test']}],
+            test_suites['suite3']['tests'])
+        self.assertEqual(
+            self.suites_yaml['test_suites'],
+            impact.narrow_test_suites(self.suites_yaml, self.index,
+                                      ['setup.py']))
+        report = impact.impact_report(
+            self.suites_yaml, self.index,
+            ['cosmo_tester/test_suites/test_a/helper.py'])
+        self.assertEqual(['suite1', 'suite3'], report['test_suites'])
+        self.assertEqual(
+            {'tests': ['group_a'], 'test_suites': ['suite1', 'suite3']},
+            report['affected_tests'][
+                'cosmo_tester/test_suites/test_a/b_test.py'])
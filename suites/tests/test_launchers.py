@@ -0,0 +1,107 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from path import path
+from mock import MagicMock, patch
+
+from suites.suites_runner import ContainerEvents
+from suites.suites_runner import ContainerProcess
+from suites.suites_runner import ImageCache
+from suites.suites_runner import SuitesRunner
+from suites.suites_runner import is_pid_of_suites_runner
+
+
+class TestContainerEvents(unittest.TestCase):
+
+    def test_container_exit(self):
+        events = ContainerEvents()
+        process = ContainerProcess('100_suite1', events)
+        with patch.object(ContainerProcess, '_inspect_running',
+                          return_value=True) as inspect_running:
+            self.assertTrue(process.is_alive())
+            events._on_event(
+                '2016-06-01T10:00:00.000000000Z container die 4a3f1b '
+                '(exitCode=0, image=cloudify/test:env, name=100_suite2)')
+            self.assertTrue(process.is_alive())
+            events._on_event(
+                '2016-06-01T10:00:01.000000000Z container die 5b4c2c '
+                '(exitCode=1, image=cloudify/test:env, name=100_suite1)')
+            self.assertFalse(process.is_alive())
+            process.wait()
+            self.assertEqual(2, inspect_running.call_count)
+            events.discard('100_suite1')
+            self.assertTrue(process.is_alive())
+
+    def test_missed_container_exit(self):
+        events = ContainerEvents()
+        process = ContainerProcess('100_suite1', events)
+        with patch.object(ContainerEvents, 'is_alive', True), \
+                patch.object(ContainerProcess, '_inspect_running',
+                             return_value=False):
+            self.assertFalse(process.is_alive())
+
+
+class TestPruneContainers(unittest.TestCase):
+
+    def test_prune_containers(self):
+        listing = MagicMock()
+        listing.stdout = 'c1 100\nc2 200\nc3 100\nc4 300\nc5 \n'
+        checked_pids = []
+
+        def is_pid_of_suites_runner(pid):
+            checked_pids.append(pid)
+            return pid == 200
+
+        with patch('suites.suites_runner.sh') as sh, \
+                patch('suites.suites_runner.is_pid_of_suites_runner',
+                      is_pid_of_suites_runner), \
+                patch('suites.suites_runner.kill_containers') as kill:
+            sh.docker.ps.return_value = listing
+            SuitesRunner.prune_containers()
+        self.assertEqual(1, sh.docker.ps.call_count)
+        self.assertIn('label=cloudify.suites.runner-pid',
+                      sh.docker.ps.call_args[1]['filter'])
+        self.assertEqual([100, 200, 300], checked_pids)
+        kill.assert_called_once_with(['c1', 'c3', 'c4'])
+
+    def test_is_pid_of_suites_runner(self):
+        with patch('suites.suites_runner.SUITES_RUNNER_PROCESS_NAMES',
+                   ['nose']):
+            self.assertTrue(is_pid_of_suites_runner(os.getpid()))
+        self.assertFalse(is_pid_of_suites_runner(os.getpid()))
+        self.assertFalse(is_pid_of_suites_runner(2 ** 22 + 1))
+
+
+class TestImageCache(unittest.TestCase):
+
+    def test_least_recently_used_eviction(self):
+        cache_dir = path(tempfile.mkdtemp())
+        self.addCleanup(cache_dir.rmtree)
+        cache = ImageCache(cache_dir / 'images.json', max_images=2)
+        self.assertEqual([], cache.touch('env-1'))
+        self.assertEqual([], cache.touch('env-2'))
+        self.assertEqual([], cache.touch('env-1'))
+        self.assertEqual(['env-2'], cache.touch('env-3'))
+        self.assertEqual(['env-1'], cache.touch('env-4'))
+        # images used by containers are evicted once no longer used
+        in_use = set(['env-3'])
+        self.assertEqual([], cache.touch('env-5', in_use=in_use.__contains__))
+        in_use.clear()
+        self.assertEqual(['env-3'], cache.touch('env-5',
+                                                in_use=in_use.__contains__))
@@ -0,0 +1,115 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+from path import path
+
+from suites.helpers import rerun
+
+
+class TestRerunFailed(unittest.TestCase):
+
+    report = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="suite1" tests="4" errors="0" failures="1" skip="2">
+<testcase classname="tests.test.Test" name="test_1 @ suite1" time="1.0"/>
+<testcase classname="tests.test.Test" name="test_2 @ suite1" time="1.0">
+<failure type="AssertionError" message="failed"/>
+</testcase>
+<testcase classname="tests.test.Test" name="test_3 @ suite1" time="1.0">
+<skipped message="Test should have run, but did not"/>
+</testcase>
+<testcase classname="tests.test.Test" name="test_4 @ suite1" time="1.0">
+<skipped message="skipped"/>
+</testcase>
+</testsuite>"""
+
+    rerun_report = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="suite1" tests="2" errors="0" failures="0" skip="0">
+<testcase classname="tests.test.Test" name="test_2 @ suite1" time="2.0"/>
+<testcase classname="tests.test.Test" name="test_3 @ suite1" time="3.0"/>
+</testsuite>"""
+
+    suites_yaml = {
+        'tests': {'plugin_tests': {'external': {'repo': 'plugin'},
+                                   'tests': ['plugin_tests']}},
+        'test_suites': {
+            'suite1': {'requires': ['openstack'], 'shards': 2,
+                       'tests': ['tests/test.py', 'plugin_tests']},
+            'suite1_aws': {'requires': ['aws'], 'tests': ['tests/test.py']},
+            'suite2': {'handler_configuration': 'aws',
+                       'tests': ['tests/test.py']}
+        }
+    }
+
+    def setUp(self):
+        self.work_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.work_dir.rmtree)
+        self.previous_dir = self.work_dir / 'previous'
+        self.previous_dir.mkdir()
+        self.reports_dir = self.work_dir / 'reports'
+        self.reports_dir.mkdir()
+        for name in ['suite1-cloudify-system-tests-report.xml',
+                     'suite1-plugin-report.xml',
+                     'suite1_aws-cloudify-system-tests-report.xml']:
+            (self.previous_dir / name).write_text(self.report)
+        (self.previous_dir / 'suite2-docker-container-report.xml').write_text(
+            self.report)
+        self.suite_names = self.suites_yaml['test_suites'].keys()
+
+    def test_rerun_test_suites(self):
+        failed = rerun.failed_tests(self.previous_dir, self.suite_names)
+        failed_tests = ['tests.test:Test.test_2', 'tests.test:Test.test_3']
+        self.assertEqual({
+            'suite1': {'cloudify-system-tests': failed_tests,
+                       'plugin': failed_tests},
+            'suite1_aws': {'cloudify-system-tests': failed_tests},
+            'suite2': None}, failed)
+        test_suites = rerun.rerun_test_suites(self.suites_yaml, failed)
+        self.assertEqual({'requires': ['openstack'], 'tests': [
+            {'tests': failed_tests},
+            {'external': {'repo': 'plugin'}, 'tests': failed_tests}]},
+            test_suites['suite1'])
+        self.assertEqual(self.suites_yaml['test_suites']['suite2'],
+                         test_suites['suite2'])
+
+    def test_merge_rerun_reports(self):
+        import lxml.etree as et
+        report_name = 'suite1-cloudify-system-tests-report.xml'
+        (self.reports_dir / report_name).write_text(self.rerun_report)
+        (self.reports_dir / 'suite2-cloudify-system-tests-report.xml'
+         ).write_text(self.rerun_report)
+        rerun.merge_rerun_reports(
+            self.previous_dir, self.reports_dir, self.suite_names,
+            {'suite1': {'cloudify-system-tests': []}, 'suite2': None})
+        self.assertEqual(
+            sorted(['suite1-cloudify-system-tests-report.xml',
+                    'suite1-plugin-report.xml',
+                    'suite1_aws-cloudify-system-tests-report.xml',
+                    'suite2-cloudify-system-tests-report.xml']),
+            sorted(f.name for f in self.reports_dir.files()))
+        root = et.parse(self.reports_dir / report_name).getroot()
+        self.assertEqual(['test_1 @ suite1', 'test_2 @ suite1',
+                          'test_3 @ suite1', 'test_4 @ suite1'],
+                         [t.get('name') for t in root.findall('testcase')])
+        self.assertEqual(['1.0', '2.0', '3.0', '1.0'],
+                         [t.get('time') for t in root.findall('testcase')])
+        self.assertEqual(('4', '0', '1'), (root.get('tests'),
+                                           root.get('failures'),
+                                           root.get('skip')))
+        self.assertEqual(
+            self.report,
+            (self.reports_dir / 'suite1-plugin-report.xml').text())
@@ -0,0 +1,118 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import tempfile
+import unittest
+
+from path import path
+from mock import patch
+
+from suites.suites_runner import TestSuite
+from suites.suites_runner import ResultsMonitor
+from suites.helpers import results_stream
+from suites.tests.mocks import MockLauncher
+
+
+class TestResultsStream(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.work_dir.rmtree)
+        self.results_path = self.work_dir / results_stream.SUITE_RESULTS_FILE
+
+    def test_read_results(self):
+        self.assertEqual(([], 0), results_stream.read_results(
+            self.results_path))
+        started = json.dumps({'test': 'test.Test.test_1',
+                              'outcome': 'started'})
+        self.results_path.write_text(started + '\n' + started[:5])
+        results, offset = results_stream.read_results(self.results_path)
+        self.assertEqual(['started'], [r['outcome'] for r in results])
+        # the partially written line is read once it is complete
+        self.results_path.write_text(started[5:] + '\n', append=True)
+        results, offset = results_stream.read_results(self.results_path,
+                                                      offset)
+        self.assertEqual(['test.Test.test_1'], [r['test'] for r in results])
+        self.assertEqual(([], offset), results_stream.read_results(
+            self.results_path, offset))
+
+    def test_write_report(self):
+        import lxml.etree as et
+        results = [
+            {'test': 'test.Test.test_1', 'outcome': 'started'},
+            {'test': 'test.Test.test_1', 'outcome': 'failed',
+             'duration': 2, 'type': 'AssertionError', 'message': 'failed',
+             'traceback': 'Traceback'},
+            {'test': 'test.Test.test_2', 'outcome': 'started'}]
+        report = self.work_dir / 'suite1-group1-report.xml'
+        results_stream.write_report(results, report, 'suite1')
+        root = et.parse(report).getroot()
+        self.assertEqual('2', root.get('tests'))
+        self.assertEqual('failed', root.find(
+            'testcase[@name="test_1"]/failure').get('message'))
+        # the test was running when the suite was killed
+        self.assertEqual('TestKilled', root.find(
+            'testcase[@name="test_2"]/error').get('type'))
+
+    def test_timed_out_suite_reports(self):
+        suite = TestSuite(suite_name='suite1',
+                          suite_def={'requires': ['env1']},
+                          suite_work_dir=self.work_dir / 'suite1',
+                          variables={},
+                          launcher=MockLauncher())
+        suite.suite_reports_dir.makedirs()
+        suite.timed_out = True
+        suite.launcher.start(suite)
+        (suite.suite_reports_dir / results_stream.SUITE_RESULTS_FILE)\
+            .write_text(json.dumps({'group': 'group1',
+                                    'test': 'test.Test.test_2',
+                                    'outcome': 'started'}) + '\n')
+        monitor = ResultsMonitor([suite], self.work_dir / 'live.jsonl')
+        self.assertEqual(1, len(monitor.poll(suite)))
+        self.assertIn('"suite": "suite1"',
+                      (self.work_dir / 'live.jsonl').text())
+        reports_dir = self.work_dir / 'xunit-reports'
+        reports_dir.makedirs()
+        with patch('suites.suites_runner.reports_dir', reports_dir), \
+                patch('suites.suites_runner.path.text',
+                      return_value='{{ error_type }}'):
+            suite.copy_xunit_reports()
+        # reports of the tests that ran before the suite timed out are kept
+        self.assertEqual(['suite1-docker-container-report.xml',
+                          'suite1-group1-report.xml', 'suite1.xml'],
+                         sorted(f.name for f in reports_dir.files()))
+        self.assertIn('TestKilled',
+                      (reports_dir / 'suite1-group1-report.xml').text())
+
+    def test_cancelled_running_suite_reports(self):
+        suite = TestSuite(suite_name='suite1',
+                          suite_def={'requires': ['env1']},
+                          suite_work_dir=self.work_dir / 'suite1',
+                          variables={},
+                          launcher=MockLauncher())
+        suite.suite_reports_dir.makedirs()
+        suite.process = suite.launcher.start(suite)
+        suite.cancelled = 'too many failed suites'
+        reports_dir = self.work_dir / 'xunit-reports'
+        reports_dir.makedirs()
+        with patch('suites.suites_runner.reports_dir', reports_dir), \
+                patch('suites.suites_runner.path.text',
+                      return_value='{{ error_type }}'):
+            reports = suite.copy_xunit_reports()
+        self.assertEqual(['suite1-docker-container-report.xml', 'suite1.xml'],
+                         sorted(r.name for r in reports))
+        self.assertEqual('TestSuiteCancelled', (
+            reports_dir / 'suite1-docker-container-report.xml').text())
@@ -0,0 +1,64 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import StringIO
+import sys
+import tempfile
+import unittest
+
+import nose
+from nose.config import Config
+from nose.plugins.manager import PluginManager
+from path import path
+
+from cosmo_tester.framework import results_streamer
+from suites.helpers import results_stream
+
+
+class TestResultsStreamer(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.work_dir.rmtree)
+        self.results_path = self.work_dir / results_stream.SUITE_RESULTS_FILE
+
+    def test_results_streamer(self):
+        test_module = self.work_dir / 'test_streamed.py'
+        test_module.write_text(
+            'import unittest\n'
+            'class StreamedTest(unittest.TestCase):\n'
+            '    def test_a(self):\n'
+            '        pass\n'
+            '    def test_b(self):\n'
+            '        self.fail("b failed")\n'
+            '    def test_c(self):\n'
+            '        raise unittest.SkipTest("c skipped")\n')
+        self.addCleanup(sys.modules.pop, 'test_streamed', None)
+        plugins = PluginManager(plugins=[results_streamer.ResultsStreamer()])
+        nose.run(argv=['nosetests', test_module,
+                       '--with-resultsstreamer',
+                       '--results-stream-path', self.results_path,
+                       '--results-stream-group', 'group1'],
+                 config=Config(stream=StringIO.StringIO(), plugins=plugins))
+        results, offset = results_stream.read_results(self.results_path)
+        self.assertEqual(self.results_path.size, offset)
+        self.assertEqual(
+            [('test_a', 'started'), ('test_a', 'passed'),
+             ('test_b', 'started'), ('test_b', 'failed'),
+             ('test_c', 'started'), ('test_c', 'skipped')],
+            [(r['test'].rsplit('.', 1)[1], r['outcome']) for r in results])
+        self.assertEqual(set(['group1']), set(r['group'] for r in results))
+        self.assertEqual('AssertionError: b failed', results[3]['message'])
+        self.assertIn('Traceback', results[3]['traceback'])
@@ -27,6 +27,15 @@ from mock import patch
 from suites.suites_runner import TestSuite
 from suites.suites_runner import SuitesScheduler
 from suites.suites_runner import FileEnvironments
+from suites.suites_runner import InMemoryEnvironments
+from suites.suites_runner import SqliteEnvironments
+from suites.suites_runner import Launcher
+from suites.suites_runner import SuitesRunner
+from suites.suites_runner import HandlerBootstrapFailures
+from suites.suites_runner import FailureRatio
+from suites.helpers.suites_history import SuitesHistory
+from suites.scheduler_simulator import SimulatedClock
+from suites.scheduler_simulator import SimulatedTestSuite
 
 
 logger = logging.getLogger('suites_scheduler')
@@ -39,14 +48,20 @@ class MockTestSuite(TestSuite):
         super(MockTestSuite, self).__init__(*args, **kwargs)
         self._running = False
         self.run_for = 0
+        self.launch_for = 0
+        self.launch_fails = False
 
     def _do_something(self):
         deadline = time.time() + self.run_for
         while time.time() < deadline and self._running:
             time.sleep(1)
         self._running = False
+        self._notify_exit()
 
     def run(self):
+        time.sleep(self.launch_for)
+        if self.launch_fails:
+            raise RuntimeError('launch failed')
         self._running = True
         t = threading.Thread(target=self._do_something)
         t.start()
@@ -65,10 +80,14 @@ class TestSuiteScheduler(unittest.TestCase):
                         suite_name,
                         requires=None,
                         handler_configuration=None,
-                        run_for=0):
+                        run_for=0,
+                        launch_for=0,
+                        exclusive=False):
         suite_def = {}
         if requires:
             suite_def['requires'] = requires
+        if exclusive:
+            suite_def['exclusive'] = True
         if handler_configuration:
             suite_def['handler_configuration'] = handler_configuration
         mock_test_suite = MockTestSuite(
@@ -77,6 +96,7 @@ class TestSuiteScheduler(unittest.TestCase):
             suite_work_dir=path('/tmp'),
             variables={})
         mock_test_suite.run_for = run_for
+        mock_test_suite.launch_for = launch_for
         return mock_test_suite
 
     def test_run_suite(self):
@@ -208,6 +228,63 @@ class TestSuiteScheduler(unittest.TestCase):
         self.assertTrue(suites[0].timed_out)
         self.assertEqual(scheduler.timed_out_suites, suites)
 
+    def test_timed_out_suite_at_deadline(self):
+        clock = SimulatedClock()
+        suites = [SimulatedTestSuite(suite_name='suite1',
+                                     suite_def={'requires': ['env1']},
+                                     clock=clock,
+                                     duration=100)]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1']}
+        }
+        timeouts = []
+        wait = clock.wait
+
+        def counted_wait(events, timeout):
+            timeouts.append(timeout)
+            # waiting for a suite that reached its timeout busy loops
+            self.assertLess(len(timeouts), 10)
+            wait(events, timeout)
+        clock.wait = counted_wait
+        scheduler = SuitesScheduler(suites,
+                                    handler_configurations,
+                                    scheduling_interval=60,
+                                    suite_timeout=50,
+                                    event_driven=True,
+                                    clock=clock)
+        scheduler.run()
+        self.assertEqual(scheduler.timed_out_suites, suites)
+        self.assertEqual(50, suites[0].running_time)
+        # the scheduler wakes up once, right at the suite timeout
+        self.assertEqual([50], timeouts)
+
+    def test_timed_out_suite_launch(self):
+        launch_time = 3
+        suites = [
+            self._new_test_suite('suite1',
+                                 requires=['env1'],
+                                 launch_for=launch_time),
+            self._new_test_suite('suite2', requires=['env1'])
+        ]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1']}
+        }
+        scheduler = SuitesScheduler(
+            suites,
+            handler_configurations,
+            after_suite_callback=MockTestSuite.after_suite,
+            suite_timeout=1,
+            event_driven=True,
+            launch_workers=2)
+        with patch.object(MockTestSuite, 'copy_xunit_reports'), \
+                patch.object(MockTestSuite, 'kill') as kill:
+            scheduler.run()
+        self.assertEqual(scheduler.timed_out_suites, [suites[0]])
+        # the environment is released once the launch ended
+        self.assertTrue(
+            suites[1].started >= suites[0].started + launch_time)
+        self.assertEqual(2, kill.call_count)
+
     def test_failed_suite(self):
         suites = [
             self._new_test_suite('suite1', requires=['env1'])
@@ -223,6 +300,300 @@ class TestSuiteScheduler(unittest.TestCase):
         scheduler.run()
         self.assertEqual(scheduler.failed_suites, suites)
 
+    def test_event_driven_suite_handoff(self):
+        scheduling_interval = 60
+        suites = [
+            self._new_test_suite('suite1', requires=['env1'], run_for=1),
+            self._new_test_suite('suite2', requires=['env1'], run_for=1)
+        ]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1']}
+        }
+        scheduler = SuitesScheduler(
+            suites,
+            handler_configurations,
+            scheduling_interval=scheduling_interval,
+            event_driven=True)
+        start = time.time()
+        scheduler.run()
+        delta = time.time() - start
+        self.assertTrue(
+            delta < scheduling_interval,
+            msg='Scheduler should not wait for the scheduling interval but '
+                'ran for {0} seconds.'.format(delta))
+        self.assertTrue(suites[1].started >= suites[0].terminated)
+
+    def test_event_driven_timed_out_suite(self):
+        suite_time = 10
+        suites = [
+            self._new_test_suite('suite1',
+                                 requires=['env1'],
+                                 run_for=suite_time)
+        ]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1']}
+        }
+        scheduler = SuitesScheduler(
+            suites,
+            handler_configurations,
+            scheduling_interval=60,
+            suite_timeout=1,
+            event_driven=True)
+        start = time.time()
+        scheduler.run()
+        delta = time.time() - start
+        self.assertTrue(delta < suite_time)
+        self.assertTrue(suites[0].timed_out)
+        self.assertEqual(scheduler.timed_out_suites, suites)
+
+    def test_concurrent_suite_launch(self):
+        launch_time = 3
+        suites = [
+            self._new_test_suite('suite1', requires=['env1'],
+                                 launch_for=launch_time),
+            self._new_test_suite('suite2', requires=['env2'],
+                                 launch_for=launch_time)
+        ]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1']},
+            'config2': {'env': 'env2_id', 'tags': ['env2']}
+        }
+        scheduler = SuitesScheduler(
+            suites,
+            handler_configurations,
+            event_driven=True,
+            launch_workers=2)
+        start = time.time()
+        scheduler.run()
+        delta = time.time() - start
+        self.assertTrue(
+            delta < 2 * launch_time,
+            msg='Suites should be launched concurrently but scheduler ran '
+                'for {0} seconds.'.format(delta))
+        self.assertFalse(suites[0].starting)
+        self.assertFalse(suites[1].starting)
+
+    def test_failed_suite_launch(self):
+        suites = [
+            self._new_test_suite('suite1', requires=['env1']),
+            self._new_test_suite('suite2', requires=['env1'])
+        ]
+        suites[0].launch_fails = True
+        work_dir = path(tempfile.mkdtemp())
+        self.addCleanup(work_dir.rmtree)
+        for suite in suites:
+            suite.suite_work_dir = work_dir / suite.suite_name
+            suite.suite_reports_dir = suite.suite_work_dir / 'xunit-reports'
+        reports_dir = work_dir / 'xunit-reports'
+        reports_dir.makedirs()
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1']}
+        }
+        scheduler = SuitesScheduler(
+            suites,
+            handler_configurations,
+            after_suite_callback=MockTestSuite.after_suite,
+            event_driven=True,
+            launch_workers=2)
+        with patch('suites.suites_runner.reports_dir', reports_dir), \
+                patch('suites.suites_runner.path.text',
+                      return_value='{{ error_type }}'), \
+                patch.object(Launcher, 'logs', return_value='') as logs, \
+                patch.object(MockTestSuite, 'kill') as kill, \
+                patch.object(Launcher, 'exit_code', return_value=0):
+            # suites whose exit code can not be read are failed
+            scheduler.run()
+        self.assertIsNotNone(suites[0].launch_error)
+        self.assertEqual(scheduler.failed_suites, [suites[0]])
+        self.assertTrue(suites[1].started >= suites[0].terminated)
+        # there are no logs of a suite container that failed to launch
+        self.assertNotIn(suites[0], [c[0][0] for c in logs.call_args_list])
+        self.assertEqual(2, kill.call_count)
+        self.assertEqual('TestSuiteLaunchError', (
+            reports_dir / 'suite1-docker-container-report.xml').text())
+
+    def test_longest_suites_first(self):
+        history_dir = path(tempfile.mkdtemp())
+        self.addCleanup(history_dir.rmtree)
+        history = SuitesHistory(history_dir / 'history.json')
+        suites = [
+            self._new_test_suite('suite1', requires=['env1']),
+            self._new_test_suite('suite2', requires=['env1']),
+            self._new_test_suite('suite3', requires=['env1'])
+        ]
+        for suite, running_time in zip(suites[:2], [100, 300]):
+            suite.started, suite.terminated = 0, running_time
+            history.record(suite)
+            suite.started, suite.terminated = None, None
+        suites[1].failed = True
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1']}
+        }
+        scheduler = SuitesScheduler(
+            suites,
+            handler_configurations,
+            optimize=True,
+            history=history,
+            default_duration=200)
+        scheduler.run()
+        self.assertTrue(suites[1].terminated <= suites[2].started)
+        self.assertTrue(suites[2].terminated <= suites[0].started)
+        self.assertEqual(2, len(history.running_times(suites[0])))
+        # running times of failed suites are not recorded
+        self.assertEqual(1, len(history.running_times(suites[1])))
+
+    def test_scarce_environments_assignment(self):
+        suites = [
+            self._new_test_suite('suite1', requires=['env1'], run_for=3),
+            self._new_test_suite('suite2', requires=['env2'], run_for=3),
+            self._new_test_suite('suite3', requires=['env1'], run_for=3)
+        ]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1', 'env2']},
+            'config2': {'env': 'env2_id', 'tags': ['env1']},
+            'config3': {'env': 'env3_id', 'tags': ['env1']}
+        }
+        scheduler = SuitesScheduler(suites, handler_configurations)
+        scheduler.run()
+        self.assertEqual('config1', suites[1].handler_configuration)
+        self.assertNotEqual('config1', suites[0].handler_configuration)
+        self.assertNotEqual('config1', suites[2].handler_configuration)
+        for suite in suites:
+            self.assertTrue(suite.started < suites[0].terminated)
+
+    def test_environment_capacity(self):
+        suites = [
+            self._new_test_suite('suite1', requires=['env1'], run_for=3),
+            self._new_test_suite('suite2', requires=['env1'], run_for=3),
+            self._new_test_suite('suite3', requires=['env1'], run_for=1)
+        ]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1'], 'capacity': 2}
+        }
+        scheduler = SuitesScheduler(suites,
+                                    handler_configurations,
+                                    event_driven=True)
+        scheduler.run()
+        self.assertTrue(suites[1].started < suites[0].terminated)
+        self.assertTrue(suites[2].started >= min(suites[0].terminated,
+                                                 suites[1].terminated))
+
+    def test_exclusive_suite(self):
+        suites = [
+            self._new_test_suite('suite1', requires=['env1'], run_for=1),
+            self._new_test_suite('suite2', requires=['env1'], run_for=1,
+                                 exclusive=True),
+            self._new_test_suite('suite3', requires=['env1'], run_for=1)
+        ]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1'], 'capacity': 2}
+        }
+        # another runner holds one slot, the exclusive suite waits for it
+        # and the environment is drained meanwhile
+        environments = InMemoryEnvironments()
+        environments.lock('env1_id', capacity=2)
+        timer = threading.Timer(2, environments.release, ('env1_id',))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        scheduler = SuitesScheduler(suites,
+                                    handler_configurations,
+                                    environments=environments,
+                                    event_driven=True)
+        scheduler.run()
+        self.assertTrue(suites[0].started >= suites[1].terminated)
+        self.assertTrue(suites[2].started >= suites[1].terminated)
+        self.assertTrue(suites[2].started < suites[0].terminated)
+        # suites sharing the environment get their own resources prefix
+        prefixes = [s.suite_def.get('resources_prefix') for s in suites]
+        self.assertIsNone(prefixes[1])
+        self.assertTrue(prefixes[0] and prefixes[2])
+        self.assertNotEqual(prefixes[0], prefixes[2])
+
+    def test_shared_environment_validation(self):
+        suites_runner = SuitesRunner(variables_path=None, descriptor=None)
+        suites_runner.suites_yaml = {
+            'test_suites': {},
+            'handler_configurations': {
+                'config1': {'env': 'env1_id', 'capacity': 2}
+            }
+        }
+        self.assertRaisesRegexp(AssertionError, 'skip_cleanup',
+                                suites_runner.validate)
+        suites_runner.suites_yaml['handler_configurations']['config1'][
+            'skip_cleanup'] = True
+        suites_runner.validate()
+
+
+class TestCancellationPolicies(unittest.TestCase):
+
+    def _run(self, suites, handler_configurations, policies):
+        clock = SimulatedClock()
+        test_suites = [SimulatedTestSuite(suite_name=name,
+                                          suite_def=suite_def,
+                                          clock=clock,
+                                          duration=duration,
+                                          fails_at=fails_at)
+                       for name, suite_def, duration, fails_at in suites]
+        environments = InMemoryEnvironments()
+
+        def after_suite(suite):
+            if suite.cancelled:
+                suite.terminate()
+            # simulated suites fail before their tests
+            suite.failed_before_tests = bool(suite.failed)
+
+        scheduler = SuitesScheduler(test_suites,
+                                    handler_configurations,
+                                    after_suite_callback=after_suite,
+                                    environments=environments,
+                                    event_driven=True,
+                                    clock=clock,
+                                    policies=policies)
+        scheduler.run()
+        self.assertEqual({}, environments._locked_slots)
+        return scheduler, dict((s.suite_name, s) for s in test_suites)
+
+    def test_handler_bootstrap_failures(self):
+        handler_configurations = {
+            'os': {'env': 'os_env', 'tags': ['os'],
+                   'handler': 'openstack_handler'},
+            'aws': {'env': 'aws_env', 'tags': ['aws'],
+                    'handler': 'ec2_handler'}
+        }
+        suites = [('os_{0}'.format(i), {'requires': ['os']}, 10 + i, 0.1)
+                  for i in range(4)]
+        suites += [('aws_{0}'.format(i), {'requires': ['aws']}, 10, None)
+                   for i in range(3)]
+        scheduler, test_suites = self._run(
+            suites, handler_configurations, [HandlerBootstrapFailures(2)])
+        self.assertEqual(['os_2', 'os_3'], sorted(
+            s.suite_name for s in scheduler.cancelled_suites))
+        self.assertIn('openstack_handler', test_suites['os_3'].cancelled)
+        self.assertIsNone(test_suites['os_3'].handler_configuration)
+        self.assertEqual(2, len(scheduler.failed_suites))
+        for i in range(3):
+            self.assertIsNone(test_suites['aws_{0}'.format(i)].cancelled)
+            self.assertFalse(test_suites['aws_{0}'.format(i)].failed)
+
+    def test_failure_ratio(self):
+        handler_configurations = {
+            'os': {'env': 'os_env', 'tags': ['os'], 'capacity': 3}
+        }
+        suites = [('failing_0', {'requires': ['os']}, 10, 0.5),
+                  ('failing_1', {'requires': ['os']}, 10, 0.5),
+                  ('long', {'requires': ['os']}, 100, None),
+                  ('waiting', {'requires': ['os']}, 10, None)]
+        scheduler, test_suites = self._run(
+            suites, handler_configurations,
+            [FailureRatio(0.5, min_suites=2)])
+        self.assertEqual(['long', 'waiting'], sorted(
+            s.suite_name for s in scheduler.cancelled_suites))
+        # the running suite is terminated when the run is cancelled
+        self.assertEqual(5, test_suites['long'].terminated)
+        self.assertFalse(test_suites['long'].is_running)
+        self.assertEqual(test_suites['waiting'].started,
+                         test_suites['waiting'].terminated)
+
 
 class TestFileEnvironments(unittest.TestCase):
 
@@ -280,3 +651,92 @@ class TestFileEnvironments(unittest.TestCase):
 
         for env in unavailable_envs:
             self.assertTrue(self.environments.lock(env))
+
+    def test_capacity(self):
+        environments = self.environments
+        self.assertTrue(environments.lock('ENV', capacity=2))
+        self.assertFalse(environments.lock('ENV', slots=2, capacity=2))
+        self.assertTrue(environments.lock('ENV', capacity=2))
+        self.assertFalse(environments.lock('ENV', capacity=2))
+        environments.release('ENV')
+        environments.release('ENV')
+        self.assertTrue(environments.lock('ENV', slots=2, capacity=2))
+        self.assertFalse(environments.lock('ENV', capacity=2))
+
+    def test_single_pid_locks(self):
+        with open(self.environments_path, 'w') as f:
+            f.write('{"ENV": %d}' % os.getpid())
+        self.assertFalse(self.environments.lock('ENV'))
+        self.environments.release('ENV')
+        self.assertTrue(self.environments.lock('ENV'))
+
+
+class TestSqliteEnvironments(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.db_dir.rmtree)
+        self.db_path = self.db_dir / 'environments.db'
+
+    def _environments(self, **kwargs):
+        environments = SqliteEnvironments(self.db_path, **kwargs)
+        self.addCleanup(environments.close)
+        return environments
+
+    def test_lock_and_release(self):
+        environments = self._environments()
+        env_id = 'ENV'
+        self.assertTrue(environments.lock(env_id))
+        self.assertFalse(environments.lock(env_id))
+        environments.release(env_id)
+        self.assertTrue(environments.lock(env_id))
+        self.assertEqual(['lock', 'release', 'lock'],
+                         [h['event'] for h in reversed(
+                             environments.history(env_id))])
+
+    def test_other_owner(self):
+        environments = self._environments()
+        self.assertTrue(environments.lock('ENV'))
+        with patch('os.getpid', lambda: 1):
+            self.assertFalse(environments.lock('ENV'))
+            # releasing an env locked by another owner has no effect
+            environments.release('ENV')
+        self.assertFalse(environments.lock('ENV'))
+
+    def test_lease_expiry_and_heartbeat(self):
+        environments = self._environments(lease_ttl=1,
+                                          heartbeat_interval=0.2)
+        self.assertTrue(environments.lock('ENV1'))
+        time.sleep(1.5)
+        with patch('os.getpid', lambda: 1):
+            # heartbeat keeps the lease of a live owner
+            self.assertFalse(environments.lock('ENV1'))
+        environments.close()
+        time.sleep(1.5)
+        with patch('os.getpid', lambda: 1):
+            self.assertTrue(environments.lock('ENV1'))
+
+    def test_prune(self):
+        environments = self._environments()
+        non_suite_runner_pid = 2 ** 22 + 1
+        with patch('os.getpid', lambda: non_suite_runner_pid):
+            self.assertTrue(environments.lock('ENV1'))
+        self.assertTrue(environments.lock('ENV2'))
+        environments.prune()
+        self.assertTrue(environments.lock('ENV1'))
+        self.assertFalse(environments.lock('ENV2'))
+        environments.prune(include_self=True)
+        with patch('os.getpid', lambda: 1):
+            self.assertTrue(environments.lock('ENV2'))
+
+    def test_capacity(self):
+        environments = self._environments()
+        self.assertTrue(environments.lock('ENV', capacity=3))
+        with patch('os.getpid', lambda: 1):
+            self.assertTrue(environments.lock('ENV', capacity=3))
+            self.assertFalse(environments.lock('ENV', slots=2, capacity=3))
+        environments.release('ENV')
+        self.assertTrue(environments.lock('ENV', slots=2, capacity=3))
+        self.assertFalse(environments.lock('ENV', capacity=3))
+        environments.release('ENV', slots=2)
+        self.assertTrue(environments.lock('ENV', capacity=2))
@@ -0,0 +1,65 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from suites.scheduler_simulator import SimulatedClock
+from suites.scheduler_simulator import generate_workload
+from suites.scheduler_simulator import simulate
+
+
+class TestSchedulerSimulator(unittest.TestCase):
+
+    def test_simulated_clock(self):
+        clock = SimulatedClock()
+        calls = []
+        clock.call_at(20, lambda: calls.append(clock.time()))
+        clock.call_at(10, lambda: calls.append(clock.time()))
+        clock.sleep(5)
+        self.assertEqual(5, clock.time())
+        self.assertEqual([], calls)
+        clock.sleep(30)
+        self.assertEqual([10, 20], calls)
+        self.assertEqual(35, clock.time())
+
+    def test_benchmark(self):
+        handler_configurations, suites = generate_workload(suites_count=500,
+                                                           seed=1)
+        failing_suites = len([s for s in suites if s['fails_at']])
+        metrics = simulate(handler_configurations, suites)
+        self.assertEqual(500, metrics['suites'])
+        self.assertEqual(failing_suites, metrics['failed_suites'])
+        self.assertEqual(0, metrics['timed_out_suites'])
+        # the schedule should end close to the busiest pool lower bound
+        self.assertGreater(metrics['efficiency'], 0.95)
+        self.assertLessEqual(metrics['queue_wait']['median'],
+                             metrics['queue_wait']['p90'])
+        self.assertLess(metrics['simulation_time'], 60)
+
+    def test_exclusive_suites_and_timeouts(self):
+        handler_configurations, suites = generate_workload(
+            suites_count=100,
+            pools={'openstack': (3, 3)},
+            exclusive_ratio=0.1,
+            failure_rate=0,
+            seed=2)
+        metrics = simulate(handler_configurations,
+                           suites,
+                           event_driven=False,
+                           suite_timeout=60 * 60)
+        self.assertEqual(
+            len([s for s in suites if s['duration'] >= 60 * 60]),
+            metrics['timed_out_suites'])
+        self.assertGreater(metrics['utilization'], 0.5)
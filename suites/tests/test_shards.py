@@ -0,0 +1,58 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+from path import path
+from mock import MagicMock, patch
+
+from suites.suites_runner import SuiteShards
+from suites.helpers import xunit_reports
+
+
+class TestSuiteShards(unittest.TestCase):
+
+    def test_merge_shard_reports(self):
+        work_dir = path(tempfile.mkdtemp())
+        self.addCleanup(work_dir.rmtree)
+        suite_shards = SuiteShards('suite1', 2)
+        suite_def = {'requires': ['openstack'], 'shards': 2}
+        test_suites = suite_shards.create_shards(
+            suite_def, work_dir, variables={}, launcher=MagicMock())
+        self.assertEqual(['suite1_shard_1', 'suite1_shard_2'],
+                         [s.suite_name for s in test_suites])
+        self.assertEqual(work_dir / 'suite1_shard_2',
+                         test_suites[1].suite_work_dir)
+        self.assertEqual([0, 1], [s.shard['index'] for s in test_suites])
+        self.assertEqual('suite1', test_suites[1].unsharded_name)
+        self.assertNotIn('shards', test_suites[0].suite_def)
+        for index, suite in enumerate(test_suites):
+            report = work_dir / '{0}-cloudify-system-tests-report.xml'.format(
+                suite.suite_name)
+            report.write_text(
+                '<testsuite name="nosetests" tests="1"><testcase '
+                'classname="test.Test" name="test_{0}" time="1.0"/>'
+                '</testsuite>'.format(index))
+            suite.xunit_reports = [report]
+        with patch('suites.suites_runner.reports_dir', work_dir):
+            suite_shards.shard_done(test_suites[0])
+            self.assertEqual(2, len(work_dir.files('*.xml')))
+            suite_shards.shard_done(test_suites[1])
+        report = work_dir / 'suite1-cloudify-system-tests-report.xml'
+        self.assertEqual([report], work_dir.files('*.xml'))
+        self.assertEqual({'test.Test.test_0': 1.0, 'test.Test.test_1': 1.0},
+                         xunit_reports.test_durations(report))
+        self.assertEqual(2, xunit_reports.report_stats(report)['tests'])
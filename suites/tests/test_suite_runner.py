@@ -0,0 +1,168 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from path import path
+from mock import MagicMock, patch
+
+from suites import suite_runner
+from suites.helpers import timeline
+
+
+class MockNose(object):
+    """Records the nose processes started by the suite runner and how
+    many of them ran at the same time."""
+
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def bake(self, **kwargs):
+        return lambda *args, **call_kwargs: self(
+            *args, **dict(kwargs, **call_kwargs))
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.2)
+        with self._lock:
+            self.running -= 1
+        return MagicMock()
+
+
+class TestSuiteRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.work_dir.rmtree)
+        self.nose = MockNose()
+        for target, value in [
+                ('nosetests', self.nose),
+                ('sh_bake', lambda command, output_prefix: self.nose),
+                ('suite_reports_dir', self.work_dir / 'xunit-reports'),
+                ('_process_variables', lambda suites_yaml, d: d)]:
+            patcher = patch('suites.suite_runner.{0}'.format(target), value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _runner(self, tests, **test_suite):
+        runner = suite_runner.SuiteRunner.__new__(suite_runner.SuiteRunner)
+        runner.work_dir = self.work_dir
+        runner.test_suite_name = 'suite1'
+        runner.test_suite = dict(test_suite, tests=tests)
+        runner.suites_yaml = {'tests': {}}
+        runner.timeline = timeline.Timeline('suite1')
+        runner._clone_and_checkout_repo = MagicMock()
+        runner._bootstrap_shared_manager = MagicMock(
+            return_value=self.work_dir / 'parallel-groups-shared-manager.yaml')
+        runner._teardown_shared_manager = MagicMock(return_value=True)
+        return runner
+
+    def test_parallel_safe_groups(self):
+        def external(repo, parallel_safe=True):
+            return {'external': {'repo': repo, 'branch': 'master'},
+                    'tests': ['system_tests'],
+                    'parallel_safe': parallel_safe}
+        runner = self._runner(
+            ['cosmo_tester/test_suites/test_blueprints',
+             'blueprints_a',
+             'blueprints_b',
+             'plugin_a',
+             external('repo-b'),
+             # parallel safe groups of a repository run concurrently even
+             # if other tests of the repository do not
+             external('repo-b', parallel_safe=False)],
+            max_parallel_groups=2)
+        runner.suites_yaml['tests'] = {
+            'blueprints_a': {
+                'tests': ['cosmo_tester/test_suites/test_a'],
+                'parallel_safe': True},
+            'blueprints_b': {
+                'tests': ['cosmo_tester/test_suites/test_b'],
+                'parallel_safe': True},
+            'plugin_a': external('repo-a')}
+        runner.run_nose()
+        groups = [call['results_stream_group'] for call in self.nose.calls]
+        self.assertEqual(set(['cloudify-system-tests', 'repo-b']),
+                         set(groups[:2]))
+        self.assertEqual(['blueprints_a', 'blueprints_b', 'plugin_a',
+                          'repo-b-5'], sorted(groups[2:]))
+        self.assertEqual(2, self.nose.max_running)
+        cwds = dict((call['results_stream_group'], call['_cwd'].name)
+                    for call in self.nose.calls)
+        self.assertEqual('cloudify-system-tests', cwds['blueprints_b'])
+        self.assertEqual('repo-a', cwds['plugin_a'])
+        self.assertEqual('repo-b', cwds['repo-b-5'])
+        self.assertEqual(
+            ['suite1-{0}-report.xml'.format(group) for group in groups],
+            [call['xunit_file'].name for call in self.nose.calls])
+        # parallel safe groups share a single manager
+        runner._bootstrap_shared_manager.assert_called_once_with(
+            'parallel-groups')
+        runner._teardown_shared_manager.assert_called_once_with(
+            'parallel-groups')
+        envs = [call['_env'] for call in self.nose.calls[2:]]
+        self.assertEqual(set([runner._bootstrap_shared_manager()]),
+                         set(env['HANDLER_CONFIGURATION'] for env in envs))
+        self.assertEqual(4, len(set(env[suite_runner.shards.TEST_ID_SUFFIX]
+                                    for env in envs)))
+        self.assertEqual(4, len(set(env['TMPDIR'] for env in envs)))
+        for call in self.nose.calls[:2]:
+            self.assertNotIn('_env', call)
+
+    def test_share_environment(self):
+        runner = self._runner([], resources_prefix='s123456-')
+        runner.inputs_path = self.work_dir / 'inputs.yaml'
+        runner.inputs_path.write_text('resources_prefix: system-tests-\n')
+        runner.handler_configuration = {'clean_env_on_init': True}
+        runner._share_environment()
+        self.assertEqual({
+            'clean_env_on_init': False,
+            'inputs_override': {'resources_prefix': 's123456-system-tests-'}
+        }, runner.handler_configuration)
+
+    def test_shared_manager_bootstrap_failure(self):
+        runner = self._runner([
+            {'external': {'repo': 'repo-a', 'branch': 'master'},
+             'tests': ['system_tests'],
+             'parallel_safe': True}])
+        runner._bootstrap_shared_manager.return_value = None
+        self.assertRaisesRegexp(AssertionError, 'repo-a', runner.run_nose)
+        self.assertEqual([], self.nose.calls)
+        self.assertFalse(runner._teardown_shared_manager.called)
+
+    def test_wheelhouse_keyed_by_requirements(self):
+        wheelhouse = self.work_dir / 'wheelhouse'
+        wheelhouse.makedirs()
+        requirements = self.work_dir / 'requirements.txt'
+        requirements.write_text('requests\n')
+        with patch.dict(os.environ, {suite_runner.WHEELHOUSE_DIR: wheelhouse}):
+            keyed = suite_runner._wheelhouse_dir([requirements])
+            self.assertEqual(wheelhouse, path(keyed).dirname())
+            self.assertTrue(path(keyed).isdir())
+            self.assertEqual(keyed, suite_runner._wheelhouse_dir(
+                [requirements]))
+            requirements.write_text('requests==2.10.0\n')
+            self.assertNotEqual(keyed, suite_runner._wheelhouse_dir(
+                [requirements]))
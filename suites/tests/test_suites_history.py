@@ -0,0 +1,64 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+from path import path
+
+from suites.suites_runner import TestSuite
+from suites.helpers.suites_history import SuitesHistory
+
+
+class TestSuitesHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.history_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.history_dir.rmtree)
+        self.history_path = self.history_dir / 'history.json'
+
+    def _suite(self, running_time, descriptor='suite1'):
+        suite = TestSuite(suite_name='suite1',
+                          suite_def={'descriptor': descriptor},
+                          suite_work_dir=path('/tmp'),
+                          variables={})
+        suite.started, suite.terminated = 0, running_time
+        return suite
+
+    def test_estimate(self):
+        history = SuitesHistory(self.history_path, max_records=2)
+        self.assertEqual(10, history.estimate(self._suite(0), default=10))
+        for running_time in [100, 200, 400]:
+            history.record(self._suite(running_time))
+        self.assertEqual(300, history.estimate(self._suite(0)))
+        self.assertIsNone(history.estimate(self._suite(0, 'other')))
+        reloaded_history = SuitesHistory(self.history_path)
+        self.assertEqual([200, 400],
+                         reloaded_history.running_times(self._suite(0)))
+
+    def test_test_durations(self):
+        history = SuitesHistory(self.history_path, max_records=2)
+        suite = self._suite(0)
+        for duration in [10, 20, 40]:
+            history.record_test_durations(suite, {'test.Test.test_1':
+                                                  duration})
+        shard = TestSuite(suite_name='suite1_shard_2',
+                          suite_def={'descriptor': 'suite1',
+                                     'shard': {'suite': 'suite1'}},
+                          suite_work_dir=path('/tmp'),
+                          variables={})
+        self.assertEqual({'test.Test.test_1': 30},
+                         SuitesHistory(self.history_path).test_durations(
+                             shard))
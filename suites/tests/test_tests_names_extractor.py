@@ -0,0 +1,105 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import optparse
+import sys
+import tempfile
+import unittest
+
+from path import path
+from nose.loader import TestLoader
+
+from cosmo_tester.framework import tests_names_extractor
+
+
+class TestTestsNamesExtractor(unittest.TestCase):
+
+    def test_partition(self):
+        tests = ['t{0}'.format(i) for i in range(10)]
+        durations = dict(('t{0}'.format(i), i + 1) for i in range(9))
+        partition = tests_names_extractor.partition
+        shards = partition(tests, 3, durations)
+        self.assertEqual(sorted(tests), sorted(sum(shards, [])))
+        # t9 has no recorded duration and takes the mean of 5
+        loads = [sum(durations.get(t, 5) for t in shard)
+                 for shard in shards]
+        self.assertLessEqual(max(loads) - min(loads), 1)
+        self.assertEqual(shards,
+                         partition(list(reversed(tests)), 3, durations))
+        self.assertEqual([['t0'], []], partition(['t0'], 2))
+
+    def test_tests_names_extractor(self):
+        work_dir = path(tempfile.mkdtemp())
+        self.addCleanup(work_dir.rmtree)
+        ran = []
+
+        class ShardedTest(unittest.TestCase):
+            def test_a(self):
+                ran.append('a')
+
+            def test_b(self):
+                ran.append('b')
+
+            def test_c(self):
+                ran.append('c')
+
+        def run_shard(index, durations):
+            durations_path = work_dir / 'durations.json'
+            durations_path.write_text(json.dumps(dict(
+                ('{0}.ShardedTest.{1}'.format(__name__, name), duration)
+                for name, duration in durations.items())))
+            plugin = tests_names_extractor.TestsNamesExtractor()
+            parser = optparse.OptionParser()
+            plugin.options(parser, {})
+            options, _ = parser.parse_args([
+                '--with-testnameextractor',
+                '--tests-list-path', work_dir / 'tests_list.json',
+                '--shard-index', str(index),
+                '--shard-count', '2',
+                '--test-durations-path', durations_path])
+            plugin.configure(options, None)
+            suite = TestLoader().loadTestsFromTestCase(ShardedTest)
+            plugin.prepareTest(suite)
+            del ran[:]
+            suite(unittest.TestResult())
+            with open(work_dir / 'tests_list.json') as f:
+                return [t['test_name'] for t in json.load(f)]
+
+        # the manifest is written before tests run and lists the tests
+        # that run, which are loaded once
+        self.assertEqual(['test_a'], run_shard(0, {'test_a': 10,
+                                                   'test_b': 5,
+                                                   'test_c': 4}))
+        self.assertEqual(['a'], ran)
+        self.assertEqual(['test_b', 'test_c'], run_shard(1, {'test_a': 10,
+                                                             'test_b': 5,
+                                                             'test_c': 4}))
+        self.assertEqual(['b', 'c'], ran)
+
+    def test_process_units(self):
+        module = type(sys)('fixtures_test_module')
+        self.addCleanup(sys.modules.pop, module.__name__, None)
+        sys.modules[module.__name__] = module
+        tests = [{'test_module': module.__name__,
+                  'test_class': 'Test{0}'.format(i % 2),
+                  'test_name': 'test_{0}'.format(i)} for i in range(4)]
+        units = [tests_names_extractor.test_unit(t) for t in tests]
+        self.assertEqual(['fixtures_test_module.Test0',
+                          'fixtures_test_module.Test1'], sorted(set(units)))
+        # tests of modules with module fixtures run in a single process
+        module.setUpModule = lambda: None
+        self.assertEqual(set(['fixtures_test_module']), set(
+            tests_names_extractor.test_unit(t) for t in tests))
@@ -0,0 +1,88 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+from path import path
+
+from suites.helpers import timeline
+
+
+class TestTimeline(unittest.TestCase):
+
+    def setUp(self):
+        self.timelines_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.timelines_dir.rmtree)
+
+    def _timeline(self, name, env, phases):
+        suite_timeline = timeline.Timeline(name)
+        suite_timeline.env = env
+        for phase, start, end in phases:
+            suite_timeline.add(phase, start, end)
+        return suite_timeline
+
+    def test_phases(self):
+        phases_path = self.timelines_dir / 'timeline.jsonl'
+        container_timeline = timeline.Timeline('suite1',
+                                               phases_path=phases_path)
+        with container_timeline.phase('run_tests', group='tests'):
+            pass
+        suite_timeline = self._timeline('suite1', 'env1',
+                                        [('queued', 0, 10)])
+        suite_timeline.load(phases_path)
+        suite_timeline.load(self.timelines_dir / 'missing.jsonl')
+        result = suite_timeline.to_dict()
+        self.assertEqual('env1', result['env'])
+        self.assertEqual(['queued', 'run_tests'],
+                         [p['name'] for p in result['phases']])
+        self.assertEqual(10, result['phases'][0]['duration'])
+        self.assertEqual({'group': 'tests'}, result['phases'][1]['args'])
+
+    def test_run_summary_and_trace(self):
+        timelines = [
+            self._timeline('suite1', 'env1', [('queued', 0, 10),
+                                              ('running', 10, 100)]),
+            self._timeline('suite2', 'env1', [('queued', 0, 100),
+                                              ('running', 100, 150),
+                                              ('pip_install', 100, 110),
+                                              ('pip_install', 110, 130)]),
+            self._timeline('suite3', None, [])
+        ]
+        summary = timeline.run_summary(timelines)
+        self.assertEqual(150, summary['duration'])
+        self.assertEqual(2, summary['phases']['running']['count'])
+        self.assertEqual(140, summary['phases']['running']['total'])
+        self.assertEqual('suite1',
+                         summary['phases']['running']['slowest_suite'])
+        self.assertEqual(55, summary['phases']['queued']['mean'])
+        self.assertEqual(100, summary['suites']['suite1']['duration'])
+        self.assertEqual(30,
+                         summary['suites']['suite2']['phases']['pip_install'])
+        self.assertEqual(2, summary['phases']['pip_install']['count'])
+        self.assertNotIn('suite3', summary['suites'])
+
+        events = timeline.chrome_trace(timelines)['traceEvents']
+        processes = [e['args']['name'] for e in events
+                     if e['name'] == 'process_name']
+        self.assertEqual(['env1', 'unassigned'], processes)
+        phases = [e for e in events if e['ph'] == 'X']
+        self.assertEqual(6, len(phases))
+        self.assertEqual(set([1]), set(e['pid'] for e in phases))
+        self.assertEqual(90000000, phases[1]['dur'])
+
+        timeline.write_run_timelines(timelines, self.timelines_dir)
+        self.assertTrue((self.timelines_dir / 'summary.json').isfile())
+        self.assertTrue((self.timelines_dir / 'trace.json').isfile())
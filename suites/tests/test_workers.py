@@ -0,0 +1,205 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import threading
+import unittest
+
+import requests
+from path import path
+from mock import MagicMock, patch
+
+from suites.suites_runner import TestSuite
+from suites.suites_runner import SuitesScheduler
+from suites.suites_runner import RemoteLauncher
+from suites.suites_runner import RemoteProcess
+from suites.suites_runner import WORKER_REQUEST_RETRIES
+from suites.suites_runner import archive_suite_files
+from suites.suites_runner import SuitesWorker
+from suites.helpers.workers import START_REQUEST_TIMEOUT
+from suites.helpers.workers import WorkerClient
+from suites.helpers.workers import WorkerError
+from suites.helpers.workers import WorkerServer
+from suites.tests.mocks import MockLauncher
+
+
+class TestRemoteLauncher(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.work_dir.rmtree_p)
+        self.launchers = []
+        self.workers = []
+        for i in range(2):
+            launcher = MockLauncher()
+            server = WorkerServer(SuitesWorker(
+                self.work_dir / 'worker{0}'.format(i), launcher),
+                '127.0.0.1', 0, token='token')
+            server.start()
+            self.addCleanup(server.stop)
+            self.launchers.append(launcher)
+            self.workers.append(WorkerClient(server.url, token='token'))
+
+    def _suite(self, suite_name, launcher, run_for, exit_code=0):
+        return TestSuite(suite_name=suite_name,
+                         suite_def={'requires': ['env1'],
+                                    'run_for': run_for,
+                                    'exit_code': exit_code},
+                         suite_work_dir=self.work_dir / 'coordinator' /
+                         suite_name,
+                         variables={},
+                         launcher=launcher)
+
+    def test_suites_run_on_workers(self):
+        launcher = RemoteLauncher(self.workers)
+        test_suites = [
+            self._suite('suite1', launcher, run_for=1),
+            self._suite('suite2', launcher, run_for=1, exit_code=3)]
+        handler_configurations = {
+            'config1': {'env': 'env1_id', 'tags': ['env1']},
+            'config2': {'env': 'env2_id', 'tags': ['env1']}
+        }
+        reports_dir = self.work_dir / 'xunit-reports'
+        reports_dir.makedirs()
+        scheduler = SuitesScheduler(test_suites,
+                                    handler_configurations,
+                                    scheduling_interval=5,
+                                    after_suite_callback=TestSuite.after_suite,
+                                    suite_timeout=30,
+                                    event_driven=True,
+                                    launch_workers=2)
+        with patch('suites.suites_runner.reports_dir', reports_dir):
+            scheduler.run()
+        self.assertEqual([test_suites[1]], scheduler.failed_suites)
+        self.assertEqual(3, test_suites[1].exit_code)
+        # each suite ran on its own worker and was removed from it
+        self.assertEqual([['suite1'], ['suite2']],
+                         sorted(mock.removed for mock in self.launchers))
+        self.assertIn('test_suite1 @ suite1',
+                      (reports_dir / 'suite1.xml').text())
+        self.assertIn('test_suite2 @ suite2',
+                      (reports_dir / 'suite2.xml').text())
+
+    def test_results(self):
+        launcher = RemoteLauncher(self.workers[:1])
+        suite = self._suite('suite1', launcher, run_for=0)
+        suite.handler_configuration = ('config1', {'env': 'env1_id',
+                                                   'tags': ['env1']})
+        suite.run()
+        suite.process.wait()
+        self.assertEqual('passed', suite.poll_results()[0]['outcome'])
+        self.assertEqual([], suite.poll_results())
+        self.assertEqual(1, len(suite.results))
+
+    def test_runs_prepared_once(self):
+        prepare_run = MagicMock(return_value='cloudify/test:env-1')
+        worker = SuitesWorker(self.work_dir / 'worker', MockLauncher(),
+                              prepare_run=prepare_run)
+        self.addCleanup(worker.close)
+        files = archive_suite_files()
+        for suite_name in ['suite1', 'suite2']:
+            worker.start(suite_name, {}, {}, run_id='run1',
+                         repos=[['cloudify-cosmo', 'cloudify-cli']],
+                         files=files)
+        prepare_run.assert_called_once_with(
+            'run1', [('cloudify-cosmo', 'cloudify-cli')], files)
+        suite = worker._suite('suite2')
+        self.assertEqual('cloudify/test:env-1', suite.image)
+        # suite files of the coordinator are used instead of the worker's
+        suite.suite_work_dir.rmtree_p()
+        suite.create_env()
+        self.assertTrue((suite.suite_work_dir / 'suite_runner.py').isfile())
+        self.assertTrue((suite.suite_work_dir / 'helpers').isdir())
+        self.assertEqual([], list(suite.suite_work_dir.walkfiles('*.pyc')))
+
+    def test_removed_while_starting(self):
+        preparing = threading.Event()
+        prepared = threading.Event()
+
+        def prepare_run(run_id, repos, files):
+            preparing.set()
+            prepared.wait(30)
+            return 'cloudify/test:env-1'
+        launcher = MockLauncher()
+        worker = SuitesWorker(self.work_dir / 'worker', launcher,
+                              prepare_run=prepare_run)
+        self.addCleanup(worker.close)
+        errors = []
+
+        def start():
+            try:
+                worker.start('suite1', {}, {}, run_id='run1')
+            except RuntimeError as e:
+                errors.append(e)
+        thread = threading.Thread(target=start)
+        thread.start()
+        self.assertTrue(preparing.wait(30))
+        # the coordinator gave up on the start
+        worker.remove('suite1')
+        prepared.set()
+        thread.join(30)
+        self.assertEqual(1, len(errors))
+        self.assertRaises(KeyError, worker._suite, 'suite1')
+        self.assertEqual(['suite1'], launcher.removed)
+        self.assertFalse((self.work_dir / 'worker' / 'suite1').exists())
+
+    def test_start_request_timeout(self):
+        with patch('requests.request') as request:
+            request.return_value.status_code = 200
+            self.workers[0].start('suite1', {}, {})
+        self.assertEqual(START_REQUEST_TIMEOUT,
+                         request.call_args[1]['timeout'])
+
+    def test_close_removes_suites(self):
+        launcher = RemoteLauncher(self.workers)
+        for suite_name in ['suite1', 'suite2']:
+            self._suite(suite_name, launcher, run_for=30).run()
+        launcher.close()
+        self.assertEqual([['suite1'], ['suite2']],
+                         sorted(mock.removed for mock in self.launchers))
+        self.assertRaises(WorkerError, self.workers[0].wait, 'suite1', 0)
+
+    def test_worker_request_failures(self):
+        worker = MagicMock()
+        worker.wait.side_effect = [requests.ConnectionError('unreachable'),
+                                   {'running': True}]
+        process = RemoteProcess(worker, 'suite1', retry_interval=0)
+        # a transient error does not end the suite
+        self.assertTrue(process.is_alive())
+        self.assertTrue(process.is_alive())
+        worker.wait.side_effect = WorkerError('worker restarted')
+        for _ in range(WORKER_REQUEST_RETRIES - 1):
+            self.assertTrue(process.is_alive())
+        self.assertFalse(process.is_alive())
+        self.assertEqual(2 + WORKER_REQUEST_RETRIES, worker.wait.call_count)
+
+    def test_worker_authentication(self):
+        worker = WorkerClient(self.workers[0].url, token='other')
+        self.assertRaisesRegexp(WorkerError, 'status=401', worker.start,
+                                'suite1', {}, {})
+        self.assertEqual([], self.launchers[0].removed)
+
+    def test_invalid_suite_name(self):
+        self.work_dir.joinpath('worker0').makedirs_p()
+        for suite_name in ['..', '.', 'a b']:
+            self.assertRaises(WorkerError, self.workers[0].start,
+                              suite_name, {}, {})
+        self.assertRaises(ValueError, SuitesWorker(
+            self.work_dir / 'worker0', self.launchers[0]).start,
+            '..', {}, {})
+        self.assertTrue(self.work_dir.joinpath('worker0').isdir())
+
+    def test_unknown_suite(self):
+        self.assertRaises(Exception, self.workers[0].wait, 'suite1', 0)
@@ -0,0 +1,100 @@
+########
+# Copyright (c) 2016 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+from path import path
+
+from suites.helpers import xunit_reports
+
+
+class TestXunitReports(unittest.TestCase):
+
+    report = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="nosetests" tests="3" errors="1" failures="1" skip="0">
+<testcase classname="test.Test" name="test_1" time="1.0"/>
+<testcase classname="test.Test" name="test_2" time="2.0">
+<failure type="AssertionError" message="failed"><![CDATA[trace]]></failure>
+<system-out><![CDATA[<output> & more]]></system-out>
+</testcase>
+<testcase classname="test.Test" name="test_3" time="3.0">
+<error type="Exception" message="error"/>
+</testcase>
+</testsuite>"""
+
+    def setUp(self):
+        self.reports_dir = path(tempfile.mkdtemp())
+        self.addCleanup(self.reports_dir.rmtree)
+        self.source = self.reports_dir / 'source.xml'
+        self.source.write_text(self.report)
+
+    def test_rewrite_report(self):
+        import lxml.etree as et
+        destination = self.reports_dir / 'destination.xml'
+        xunit_reports.rewrite_report(self.source, destination, 'suite1')
+        content = destination.text()
+        self.assertIn('<![CDATA[<output> & more]]>', content)
+        root = et.parse(destination).getroot()
+        self.assertEqual('3', root.get('tests'))
+        self.assertEqual(['test_1 @ suite1', 'test_2 @ suite1',
+                          'test_3 @ suite1'],
+                         [t.get('name') for t in root.findall('testcase')])
+        self.assertEqual('trace', root.find('testcase/failure').text)
+
+    def test_test_durations(self):
+        self.assertEqual({'test.Test.test_1': 1.0},
+                         xunit_reports.test_durations(self.source))
+
+    def test_merged_report(self):
+        import lxml.etree as et
+        merged_path = self.reports_dir / 'merged.xml'
+        merged = xunit_reports.MergedReport(merged_path, name='run')
+        merged.append(self.source)
+        merged.append(self.source)
+        stats = merged.finalize()
+        self.assertEqual({'tests': 6, 'errors': 2, 'failures': 2,
+                          'skip': 0}, stats)
+        root = et.parse(merged_path).getroot()
+        self.assertEqual('testsuites', root.tag)
+        self.assertEqual('6', root.get('tests'))
+        self.assertEqual(2, len(root.findall('testsuite')))
+        self.assertEqual(6, len(root.findall('testsuite/testcase')))
+        self.assertFalse(path(merged_path + '.parts').exists())
+        self.assertEqual(stats, merged.finalize())
+        self.assertEqual(6, len(et.parse(merged_path).getroot().findall(
+            'testsuite/testcase')))
+
+    def test_add_missing_tests(self):
+        import lxml.etree as et
+        expected = [('test.Test', 'test_{0}'.format(i)) for i in range(1, 6)]
+        missing = xunit_reports.add_missing_tests(self.source, expected,
+                                                  name='suite1')
+        self.assertEqual([('test.Test', 'test_4'), ('test.Test', 'test_5')],
+                         missing)
+        self.assertIn('<![CDATA[<output> & more]]>', self.source.text())
+        root = et.parse(self.source).getroot()
+        self.assertEqual('5', root.get('tests'))
+        self.assertEqual('2', root.get('skip'))
+        self.assertEqual(xunit_reports.MISSING_TEST_MESSAGE, root.find(
+            'testcase[@name="test_5"]/skipped').get('message'))
+        self.assertEqual([], xunit_reports.add_missing_tests(
+            self.source, expected, name='suite1'))
+        self.assertEqual([], self.reports_dir.files('*.tmp'))
+        self.assertEqual([], self.reports_dir.files('*.body'))
+        # the run crashed before writing its report
+        crashed = self.reports_dir / 'crashed.xml'
+        xunit_reports.add_missing_tests(crashed, expected, name='suite1')
+        self.assertEqual('5', et.parse(crashed).getroot().get('skip'))